@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from core.config import settings
+from ai.concurrency import GenerationOverloaded
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpen(GenerationOverloaded):
+    """Raised instead of calling the LLM while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for the LLM call path.
+    Every call records (time, latency, ok). Once the window holds min_calls
+    samples and either the error rate or the share of calls slower than
+    slow_call_seconds reaches its threshold, the circuit opens and calls
+    fail fast with CircuitOpen for open_seconds. It then lets half_open_calls
+    probes through; one failed probe re-opens it, all succeeding closes it.
+    Only outcomes recorded with probe=True (what allow() returned) count while
+    half-open; calls admitted before the trip only feed the window.
+    A probe that ends without an outcome (cancelled) must be handed back with
+    release(); probes still unreported after open_seconds re-open the circuit.
+
+    The same window feeds the latency percentiles used to time hedged requests.
+    """
+
+    def __init__(
+        self,
+        window_seconds: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_calls: Optional[int] = None,
+        clock=time.monotonic,
+    ):
+        self.window_seconds = window_seconds if window_seconds is not None else settings.CIRCUIT_WINDOW_SECONDS
+        self.min_calls = min_calls if min_calls is not None else settings.CIRCUIT_MIN_CALLS
+        self.error_rate = error_rate if error_rate is not None else settings.CIRCUIT_ERROR_RATE
+        self.slow_call_seconds = slow_call_seconds if slow_call_seconds is not None else settings.CIRCUIT_SLOW_CALL_SECONDS
+        self.slow_call_rate = slow_call_rate if slow_call_rate is not None else settings.CIRCUIT_SLOW_CALL_RATE
+        self.open_seconds = open_seconds if open_seconds is not None else settings.CIRCUIT_OPEN_SECONDS
+        self.half_open_calls = half_open_calls if half_open_calls is not None else settings.CIRCUIT_HALF_OPEN_CALLS
+        self._clock = clock
+
+        self.state = CIRCUIT_CLOSED
+        self._opened_at = 0.0
+        self._half_opened_at = 0.0
+        self._probes = 0            # half-open calls admitted
+        self._probe_successes = 0
+        self._calls = deque()       # (timestamp, kind, latency, ok)
+
+        self.trips = 0
+        self.short_circuited = 0
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def allow(self) -> bool:
+        """
+        Raise CircuitOpen if a call must not go out right now. Returns True if
+        the call is a half-open probe, which must then be record()ed or release()d.
+        """
+        if self.state == CIRCUIT_CLOSED:
+            return False
+        now = self._clock()
+        if self.state == CIRCUIT_OPEN and now - self._opened_at >= self.open_seconds:
+            self.state = CIRCUIT_HALF_OPEN
+            self._half_opened_at = now
+            self._probes = 0
+            self._probe_successes = 0
+        if self.state == CIRCUIT_HALF_OPEN:
+            if self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            if now - self._half_opened_at >= self.open_seconds:
+                # Probes that never reported: open again instead of waiting on them forever
+                self._trip(now)
+        self.short_circuited += 1
+        raise CircuitOpen("Meal plan generation is temporarily unavailable (LLM circuit open), please retry shortly")
+
+    def release(self, probe: bool):
+        """Hand back a probe admitted by allow() that ended without an outcome"""
+        if probe and self.state == CIRCUIT_HALF_OPEN and self._probes > self._probe_successes:
+            self._probes -= 1
+
+    def record(self, latency: float, ok: bool, kind: str = "plan", probe: bool = False):
+        """Outcome of a call; probe is what allow() returned for it"""
+        now = self._clock()
+        self._calls.append((now, kind, latency, ok))
+        self._prune(now)
+
+        failed = not ok or latency > self.slow_call_seconds
+        if self.state == CIRCUIT_HALF_OPEN:
+            if not probe:
+                # A straggler admitted before the trip says nothing about recovery
+                return
+            if failed:
+                self._trip(now)
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self.state = CIRCUIT_CLOSED
+                    self._calls.clear()
+            return
+
+        if self.state == CIRCUIT_CLOSED and len(self._calls) >= self.min_calls:
+            errors = sum(1 for _, _, _, call_ok in self._calls if not call_ok)
+            slow = sum(1 for _, _, call_latency, _ in self._calls if call_latency > self.slow_call_seconds)
+            total = len(self._calls)
+            if errors / total >= self.error_rate or slow / total >= self.slow_call_rate:
+                self._trip(now)
+
+    def _trip(self, now: float):
+        self.state = CIRCUIT_OPEN
+        self._opened_at = now
+        self.trips += 1
+
+    def latency_percentile(self, pct: float, kind: str = "plan") -> Optional[float]:
+        """Latency percentile of successful calls of this kind in the window, None if too few samples"""
+        self._prune(self._clock())
+        latencies = sorted(latency for _, call_kind, latency, ok in self._calls if ok and call_kind == kind)
+        if len(latencies) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(latencies) - 1, max(0, round(pct / 100 * len(latencies)) - 1))
+        return latencies[index]
+
+    def stats(self) -> dict:
+        self._prune(self._clock())
+        total = len(self._calls)
+        errors = sum(1 for _, _, _, ok in self._calls if not ok)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_error_rate": errors / total if total else 0.0,
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+        }
+
+
+async def hedged(call, delay: Optional[float]):
+    """
+    Await call(False); if it has not finished after delay seconds, start a
+    second call(True) and return whichever finishes first, cancelling the other.
+    Returns (result, hedged) where hedged says whether a second call was fired.
+    A failure of one attempt is only raised once both have failed.
+    """
+    first = asyncio.ensure_future(call(False))
+    if delay is None:
+        return await first, False
+
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except asyncio.CancelledError:
+        # asyncio.wait does not cancel what it waits on
+        first.cancel()
+        raise
+    if done:
+        return first.result(), False
+
+    second = asyncio.ensure_future(call(True))
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), True
+        # Both failed: surface the original attempt's error
+        raise first.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# Global breaker for every LLM call in this process
+llm_breaker = CircuitBreaker()
@@ -1,62 +1,732 @@
-import pandas as pd
+"""
+Build final_ingredients.csv (description, then one column per nutrient in
+the catalogue, see ai/nutrients.py) from the USDA FoodData Central food.csv
+and food_nutrient.csv files. Run it from the folder holding the CSV files:
+
+    python clean_data.py                         # streaming, bounded memory
+    python clean_data.py --mode memory           # load everything with pandas at once
+    python clean_data.py --mode parallel         # shard the files across a process pool
+    python clean_data.py --catalogue mine.json   # extract a custom set of nutrients
+
+Next to the CSV it writes final_ingredients.foodtable, the memory-mapped
+columnar copy the planner loads at startup (see ai/food_table.py).
+
+Chunked runs also record a manifest (input checksums plus a hash of every
+food's nutrient rows and description). With a new USDA release,
+
+    python clean_data.py --incremental
+
+skips the run if the inputs are unchanged, otherwise recomputes only the
+foods whose hashes changed and patches the outputs.
+"""
+import argparse
+import hashlib
+import io
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
 
-# 1. Setup file names
+try:
+    from ai.food_table import write_food_table, patch_food_table
+    from ai.nutrients import DEFAULT_CATALOGUE, load_catalogue
+except ImportError:  # run from inside the ai folder
+    from food_table import write_food_table, patch_food_table
+    from nutrients import DEFAULT_CATALOGUE, load_catalogue
+
+# Input and output file names
 # Windows sometimes hides the .csv extension, but pandas needs it.
-food_file = 'food.csv'
-nutrient_file = 'food_nutrient.csv'
+FOOD_FILE = 'food.csv'
+NUTRIENT_FILE = 'food_nutrient.csv'
+OUTPUT_FILE = 'final_ingredients.csv'
+TABLE_FILE = 'final_ingredients.foodtable'
+
+CHUNK_ROWS = 1_000_000
+
+# Compact dtypes for the only columns we read
+NUTRIENT_DTYPES = {'fdc_id': 'int32', 'nutrient_id': 'int32', 'amount': 'float64'}
+
+MANIFEST_VERSION = 2
+
+
+def nutrient_columns(catalogue=DEFAULT_CATALOGUE) -> list:
+    return [nutrient.name for nutrient in catalogue]
+
+
+def output_columns(catalogue=DEFAULT_CATALOGUE) -> list:
+    return ['description'] + nutrient_columns(catalogue)
+
+
+def _column_lookup(catalogue) -> np.ndarray:
+    """Array mapping nutrient_id to its catalogue column, -1 for nutrients we skip"""
+    lookup = np.full(max(nutrient.id for nutrient in catalogue) + 1, -1, dtype=np.int64)
+    lookup[[nutrient.id for nutrient in catalogue]] = np.arange(len(catalogue))
+    return lookup
+
+
+def _catalogue_rows(chunk: pd.DataFrame, lookup: np.ndarray):
+    """(mask, columns): rows of catalogue nutrients with an amount, and their matrix column"""
+    nutrient_ids = chunk['nutrient_id'].to_numpy()
+    columns = np.full(len(nutrient_ids), -1, dtype=np.int64)
+    known = (nutrient_ids >= 0) & (nutrient_ids < len(lookup))
+    columns[known] = lookup[nutrient_ids[known]]
+    mask = (columns >= 0) & chunk['amount'].notna().to_numpy()
+    return mask, columns[mask]
+
+
+class NutrientSums:
+    """
+    Running per-(food, nutrient) sums and counts in dense foods x nutrients
+    arrays. A food gets a row the first time it is seen and an array indexed
+    by fdc_id finds that row again, so folding in a chunk is one scatter-add
+    whatever the number of nutrients. Memory grows with the number of foods.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.rows = 0
+        self.row_of = np.full(0, -1, dtype=np.int32)  # fdc_id -> row, -1 if unseen
+        self.fdc_ids = np.zeros(0, dtype=np.int32)
+        self.sums = np.zeros((0, width))
+        self.counts = np.zeros((0, width), dtype=np.int32)
+
+    def _reserve(self, rows: int):
+        if rows <= len(self.fdc_ids):
+            return
+        capacity = max(rows, 2 * len(self.fdc_ids))
+        self.fdc_ids = np.resize(self.fdc_ids, capacity)
+        self.sums = np.concatenate([self.sums, np.zeros((capacity - len(self.sums), self.width))])
+        self.counts = np.concatenate([self.counts, np.zeros((capacity - len(self.counts), self.width), dtype=np.int32)])
+
+    def add(self, fdc_ids: np.ndarray, columns: np.ndarray, amounts: np.ndarray):
+        if not len(fdc_ids):
+            return
+        rows = self._rows_for(fdc_ids)
+        np.add.at(self.sums, (rows, columns), amounts)
+        np.add.at(self.counts, (rows, columns), 1)
+
+    def merge(self, part: tuple):
+        """
+        Add the compact() sums of a later part of the file. Adding parts in
+        file order gives exactly the sums of one serial pass.
+        """
+        fdc_ids, sums, counts = part
+        if not len(fdc_ids):
+            return
+        rows = self._rows_for(fdc_ids)
+        # fdc_ids are unique within a part, so plain fancy-index adds are safe
+        self.sums[rows] += sums
+        self.counts[rows] += counts
+
+    def compact(self) -> tuple:
+        """(fdc_ids, sums, counts) of the rows in use, cheap to pickle"""
+        return self.fdc_ids[:self.rows], self.sums[:self.rows], self.counts[:self.rows]
+
+    def _rows_for(self, fdc_ids: np.ndarray) -> np.ndarray:
+        """Row of every fdc_id, adding rows for foods not seen before"""
+        top = int(fdc_ids.max())
+        if top >= len(self.row_of):
+            grown = np.full(max(top + 1, 2 * len(self.row_of)), -1, dtype=np.int32)
+            grown[:len(self.row_of)] = self.row_of
+            self.row_of = grown
+
+        rows = self.row_of[fdc_ids]
+        unseen = rows < 0
+        if unseen.any():
+            fresh = np.unique(fdc_ids[unseen])
+            self._reserve(self.rows + len(fresh))
+            self.row_of[fresh] = np.arange(self.rows, self.rows + len(fresh))
+            self.fdc_ids[self.rows:self.rows + len(fresh)] = fresh
+            self.rows += len(fresh)
+            rows = self.row_of[fdc_ids]
+        return rows
+
+    def subset(self, fdc_ids) -> 'NutrientSums':
+        """The sums of just these foods (those that were seen)"""
+        fdc_ids = np.asarray(fdc_ids, dtype=np.int64)
+        fdc_ids = fdc_ids[fdc_ids < len(self.row_of)]
+        rows = self.row_of[fdc_ids]
+        rows = rows[rows >= 0]
+        part = NutrientSums(self.width)
+        part.rows = len(rows)
+        part.fdc_ids = self.fdc_ids[rows]
+        part.sums = self.sums[rows]
+        part.counts = self.counts[rows]
+        return part
 
-print("--- STARTING DATA CLEANING ---")
 
-# 2. Load the Food Names
-if os.path.exists(food_file):
-    print(f"Loading {food_file}...")
+def scatter(sums: NutrientSums, catalogue=DEFAULT_CATALOGUE) -> pd.DataFrame:
+    """
+    Vectorized pivot: a dense float32 foods x nutrients matrix of means
+    (the same mean over duplicate rows pivot_table computed), 0 where a food
+    has no value, with foods sorted by fdc_id.
+    """
+    order = np.argsort(sums.fdc_ids[:sums.rows], kind='stable')
+    totals, counts = sums.sums[order], sums.counts[order]
+    matrix = np.zeros(totals.shape, dtype=np.float32)
+    np.divide(totals, counts, out=matrix, where=counts > 0, casting='unsafe')
+    index = pd.Index(sums.fdc_ids[order].astype(np.int64), name='fdc_id')
+    return pd.DataFrame(matrix, index=index, columns=nutrient_columns(catalogue))
+
+
+def pivot_in_memory(nutrient_file: str, stats: dict, catalogue=DEFAULT_CATALOGUE) -> pd.DataFrame:
+    """Reference path: read the whole file at once, then scatter it"""
     # encoding='latin1' helps prevent errors with special characters
-    foods = pd.read_csv(food_file, encoding='latin1')
-else:
-    print(f"ERROR: Could not find {food_file}. Make sure this script is in the same folder.")
-    exit()
-
-# 3. Load the Nutrient Data (The Big File)
-if os.path.exists(nutrient_file):
-    print(f"Loading {nutrient_file}... (This might take a few seconds)")
     nutrients = pd.read_csv(nutrient_file, encoding='latin1')
-else:
-    print(f"ERROR: Could not find {nutrient_file}.")
-    exit()
-
-# 4. Filter for specific Macro Nutrients
-# We only want: Calories (1008), Protein (1003), Fat (1004), Carbs (1005)
-target_ids = [1008, 1003, 1004, 1005]
-filtered = nutrients[nutrients['nutrient_id'].isin(target_ids)]
-
-# 5. Pivot: Turn rows into columns
-print("Organizing data...")
-pivot = filtered.pivot_table(
-    index='fdc_id', 
-    columns='nutrient_id', 
-    values='amount'
-).reset_index()
-
-# 6. Rename columns to be human-readable
-pivot.rename(columns={
-    1008: 'calories',
-    1003: 'protein',
-    1004: 'fat',
-    1005: 'carbs'
-}, inplace=True)
-
-# 7. Merge Food Names with Nutrient Data
-print("Merging names with numbers...")
-final_df = pd.merge(pivot, foods[['fdc_id', 'description']], on='fdc_id', how='left')
-
-# 8. Clean up (Fill empty values with 0, reorder columns)
-final_df.fillna(0, inplace=True)
-final_df = final_df[['description', 'calories', 'protein', 'fat', 'carbs']]
-
-# 9. Save the result
-output_file = 'final_ingredients.csv'
-final_df.to_csv(output_file, index=False)
-
-print(f"✅ DONE! Saved clean data to: {output_file}")
-print(f"Total foods processed: {len(final_df)}")
\ No newline at end of file
+    stats['rows'] = len(nutrients)
+    mask, columns = _catalogue_rows(nutrients, _column_lookup(catalogue))
+    sums = NutrientSums(len(catalogue))
+    sums.add(nutrients['fdc_id'].to_numpy()[mask], columns, nutrients['amount'].to_numpy(dtype=np.float64)[mask])
+    return scatter(sums, catalogue)
+
+
+def pivot_chunked(nutrient_file: str, stats: dict, chunk_rows: int = CHUNK_ROWS, catalogue=DEFAULT_CATALOGUE) -> pd.DataFrame:
+    """
+    Streaming path: read chunk_rows rows at a time with only the needed
+    columns, filter each chunk to the catalogue nutrients and scatter-add
+    it into per-(fdc_id, nutrient) sums and counts. Memory is bounded by the
+    number of foods, not by the size of the file.
+    """
+    sums, _ = scan_chunked(nutrient_file, stats, chunk_rows, catalogue=catalogue)
+    return scatter(sums, catalogue)
+
+
+def scan_chunked(nutrient_file: str, stats: dict, chunk_rows: int = CHUNK_ROWS, with_hashes: bool = False,
+                 catalogue=DEFAULT_CATALOGUE):
+    """
+    The streaming pass behind pivot_chunked. Returns the NutrientSums and,
+    with with_hashes, a per-fdc_id hash of the food's catalogue nutrient
+    rows (an order-independent sum of row hashes).
+    """
+    reader = pd.read_csv(
+        nutrient_file,
+        encoding='latin1',
+        usecols=list(NUTRIENT_DTYPES),
+        dtype=NUTRIENT_DTYPES,
+        chunksize=chunk_rows
+    )
+    sums, hashes, stats['rows'] = _scan(reader, catalogue, with_hashes, chunk_rows)
+    return sums, hashes
+
+
+def _scan(chunks, catalogue, with_hashes: bool, fold_rows: int):
+    """Fold an iterator of nutrient row chunks into (NutrientSums, hashes or None, rows read)"""
+    lookup = _column_lookup(catalogue)
+    sums = NutrientSums(len(catalogue))
+    hash_partials = []
+    hash_rows = 0
+    rows = 0
+
+    for chunk in chunks:
+        rows += len(chunk)
+        mask, columns = _catalogue_rows(chunk, lookup)
+        if not len(columns):
+            continue
+        sums.add(chunk['fdc_id'].to_numpy()[mask], columns, chunk['amount'].to_numpy()[mask])
+        if with_hashes:
+            # uint64 sums wrap around, which keeps them order-independent
+            kept = chunk[mask]
+            row_hashes = pd.util.hash_pandas_object(kept[['nutrient_id', 'amount']], index=False)
+            hash_partials.append(row_hashes.groupby(kept['fdc_id'].to_numpy(), sort=False).sum())
+            hash_rows += len(hash_partials[-1])
+            if hash_rows >= fold_rows:
+                hash_partials = [_sum_hashes(hash_partials)]
+                hash_rows = len(hash_partials[0])
+
+    return sums, _sum_hashes(hash_partials) if with_hashes else None, rows
+
+
+def _sum_hashes(partials: list) -> pd.Series:
+    if partials:
+        hashes = pd.concat(partials).groupby(level=0).sum().sort_index()
+    else:
+        hashes = pd.Series([], dtype='uint64')
+    hashes.index.name = 'fdc_id'
+    return hashes
+
+
+def shard_ranges(path: str, shards: int) -> list:
+    """
+    Split a CSV after its header line into up to shards (start, end) byte
+    ranges of about equal size, each starting and ending on a line boundary.
+    Assumes no quoted field spans lines, which holds for the FDC files.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        bounds = [f.tell()]
+        for shard in range(1, shards):
+            target = bounds[0] + (size - bounds[0]) * shard // shards
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()  # on to the start of the next line
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _bytes_per_row(path: str, sample_rows: int = 1000) -> float:
+    with open(path, 'rb') as f:
+        f.readline()
+        lines = [line for line in (f.readline() for _ in range(sample_rows)) if line]
+    return sum(map(len, lines)) / len(lines) if lines else 1.0
+
+
+def _range_chunks(path: str, start: int, end: int, block_bytes: int, **read_csv_args):
+    """DataFrames of the lines in [start, end) of a CSV, about block_bytes at a time"""
+    names = pd.read_csv(path, nrows=0, encoding='latin1').columns.tolist()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            block = f.read(min(block_bytes, end - f.tell()))
+            if f.tell() < end:
+                block += f.readline()  # finish the line the block stopped in
+            if block.strip():
+                yield pd.read_csv(io.BytesIO(block), header=None, names=names, encoding='latin1', **read_csv_args)
+
+
+def _scan_shard(task: tuple):
+    nutrient_file, start, end, block_bytes, catalogue, with_hashes, fold_rows = task
+    chunks = _range_chunks(nutrient_file, start, end, block_bytes, usecols=list(NUTRIENT_DTYPES), dtype=NUTRIENT_DTYPES)
+    sums, hashes, rows = _scan(chunks, catalogue, with_hashes, fold_rows)
+    return sums.compact(), hashes, rows
+
+
+def scan_parallel(nutrient_file: str, stats: dict, chunk_rows: int = CHUNK_ROWS, with_hashes: bool = False,
+                  catalogue=DEFAULT_CATALOGUE, pool=None, workers: int = None):
+    """
+    scan_chunked split across a process pool: every worker folds one byte
+    range of the file into its own NutrientSums, and the parts are merged
+    in file order so the sums are exactly those of the serial pass.
+    """
+    workers = workers or os.cpu_count() or 1
+    block_bytes = max(1, int(chunk_rows * _bytes_per_row(nutrient_file)))
+    tasks = [
+        (nutrient_file, start, end, block_bytes, catalogue, with_hashes, chunk_rows)
+        for start, end in shard_ranges(nutrient_file, workers)
+    ]
+
+    sums = NutrientSums(len(catalogue))
+    hash_partials = []
+    rows = 0
+    with _pool(pool, workers) as executor:
+        # map() yields in task order whatever order the shards finish in
+        for part, hashes, shard_rows in executor.map(_scan_shard, tasks):
+            sums.merge(part)
+            hash_partials.append(hashes)
+            rows += shard_rows
+    stats['rows'] = rows
+    return sums, _sum_hashes(hash_partials) if with_hashes else None
+
+
+class _pool:
+    """Use the caller's executor if given, otherwise a temporary one"""
+
+    def __init__(self, pool, workers: int):
+        self.pool = pool
+        self.workers = workers
+        self.owned = None
+
+    def __enter__(self):
+        if self.pool is not None:
+            return self.pool
+        self.owned = ProcessPoolExecutor(self.workers)
+        return self.owned
+
+    def __exit__(self, *exc):
+        if self.owned is not None:
+            self.owned.shutdown()
+
+
+def load_descriptions(food_file: str, fdc_ids, chunk_rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    """fdc_id/description pairs for the given foods, read in chunks"""
+    wanted = pd.Index(fdc_ids)
+    parts = []
+    for chunk in pd.read_csv(food_file, encoding='latin1', usecols=['fdc_id', 'description'], chunksize=chunk_rows):
+        parts.append(chunk[chunk['fdc_id'].isin(wanted)])
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['fdc_id', 'description'])
+
+
+def _descriptions_shard(task: tuple) -> pd.DataFrame:
+    food_file, start, end, block_bytes, wanted = task
+    parts = [
+        chunk[chunk['fdc_id'].isin(wanted)]
+        for chunk in _range_chunks(food_file, start, end, block_bytes, usecols=['fdc_id', 'description'])
+    ]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['fdc_id', 'description'])
+
+
+def load_descriptions_parallel(food_file: str, fdc_ids, chunk_rows: int = CHUNK_ROWS, pool=None, workers: int = None):
+    """load_descriptions over byte ranges of food.csv in a process pool, same rows in the same order"""
+    workers = workers or os.cpu_count() or 1
+    block_bytes = max(1, int(chunk_rows * _bytes_per_row(food_file)))
+    wanted = np.asarray(fdc_ids)
+    tasks = [(food_file, start, end, block_bytes, wanted) for start, end in shard_ranges(food_file, workers)]
+    with _pool(pool, workers) as executor:
+        parts = list(executor.map(_descriptions_shard, tasks))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['fdc_id', 'description'])
+
+
+def build_table(pivot: pd.DataFrame, foods: pd.DataFrame, catalogue=DEFAULT_CATALOGUE) -> pd.DataFrame:
+    """Merge food names onto the nutrient pivot; fdc_id is kept for the food table"""
+    columns = nutrient_columns(catalogue)
+    pivot = pivot.reindex(columns=columns).astype('float32').reset_index()
+    final_df = pd.merge(pivot, foods[['fdc_id', 'description']], on='fdc_id', how='left')
+
+    # Clean up (Fill empty values with 0, reorder columns). Foods missing
+    # from food.csv get an empty description rather than a numeric 0
+    final_df.fillna({column: 0 for column in columns}, inplace=True)
+    final_df.fillna({'description': ''}, inplace=True)
+    return final_df[['fdc_id'] + output_columns(catalogue)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None where unsupported"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def file_checksum(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def description_hashes(descriptions) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(list(descriptions), dtype=object))
+
+
+def manifest_paths(output_file: str):
+    """Manifest JSON and per-food hash arrays kept next to the output CSV"""
+    stem = os.path.splitext(output_file)[0]
+    return f"{stem}.manifest.json", f"{stem}.hashes.npz"
+
+
+def _catalogue_key(catalogue) -> list:
+    return [[nutrient.id, nutrient.name] for nutrient in catalogue]
+
+
+def write_manifest(output_file: str, checksums: dict, fdc_ids, nutrient_hashes, description_hash,
+                   catalogue=DEFAULT_CATALOGUE):
+    """Record what the outputs were built from; the three arrays are in output row order"""
+    manifest_file, hashes_file = manifest_paths(output_file)
+    with open(hashes_file, 'wb') as f:
+        np.savez(
+            f,
+            fdc_id=np.asarray(fdc_ids, dtype='int32'),
+            nutrient_hash=np.asarray(nutrient_hashes, dtype='uint64'),
+            description_hash=np.asarray(description_hash, dtype='uint64')
+        )
+    with open(manifest_file, 'w') as f:
+        json.dump({
+            'version': MANIFEST_VERSION,
+            'nutrients': _catalogue_key(catalogue),
+            'foods': len(fdc_ids),
+            'inputs': checksums,
+        }, f, indent=2)
+
+
+def load_manifest(output_file: str, catalogue=DEFAULT_CATALOGUE):
+    """(manifest, hashes) from the last chunked run, None if missing or stale (other catalogue included)"""
+    manifest_file, hashes_file = manifest_paths(output_file)
+    if not (os.path.exists(manifest_file) and os.path.exists(hashes_file) and os.path.exists(output_file)):
+        return None
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('nutrients') != _catalogue_key(catalogue):
+        return None
+    with np.load(hashes_file) as data:
+        hashes = {name: data[name] for name in data.files}
+    if len(hashes['fdc_id']) != manifest['foods']:
+        return None
+    return manifest, hashes
+
+
+def _write_csv(final_df: pd.DataFrame, output_file: str, catalogue=DEFAULT_CATALOGUE, pool=None, workers: int = 1):
+    frame = final_df[output_columns(catalogue)]
+    if pool is None:
+        frame.to_csv(output_file, index=False, lineterminator='\n')
+        return
+
+    # Formatting the floats is the slowest step for wide catalogues. Rows are
+    # formatted independently, so slices formatted in parallel join up into
+    # the same bytes
+    bounds = np.linspace(0, len(frame), workers + 1).astype(int)
+    slices = [frame.iloc[start:end] for start, end in zip(bounds, bounds[1:])]
+    with open(output_file, 'wb') as f:
+        f.write(frame.head(0).to_csv(index=False, lineterminator='\n').encode('utf-8'))
+        for part in pool.map(_format_rows, slices):
+            f.write(part)
+
+
+def _format_rows(frame: pd.DataFrame) -> bytes:
+    return frame.to_csv(header=False, index=False, lineterminator='\n').encode('utf-8')
+
+
+def _read_csv(source) -> pd.DataFrame:
+    # Nutrient values were written from float32, so reading them back as
+    # float32 gives exactly the same values
+    frame = pd.read_csv(source, keep_default_na=False, dtype={'description': str})
+    return frame.astype({column: 'float32' for column in frame.columns if column != 'description'})
+
+
+def _write_table(final_df: pd.DataFrame, table_file: str, metadata: dict, catalogue=DEFAULT_CATALOGUE):
+    print(f"Writing {table_file}...")
+    metadata = dict(
+        metadata,
+        units={nutrient.name: nutrient.unit for nutrient in catalogue},
+        nutrient_ids={nutrient.name: nutrient.id for nutrient in catalogue}
+    )
+    write_food_table(
+        table_file,
+        final_df['fdc_id'].to_numpy(),
+        final_df['description'].tolist(),
+        {column: final_df[column].to_numpy() for column in nutrient_columns(catalogue)},
+        metadata=metadata
+    )
+
+
+def update(food_file: str, nutrient_file: str, output_file: str, table_file: str, chunk_rows: int,
+           stats: dict, checksums: dict, manifest: dict, hashes: dict, catalogue=DEFAULT_CATALOGUE,
+           scan=scan_chunked):
+    """
+    Incremental run against the previous manifest: only foods whose nutrient
+    rows or description changed are recomputed. The nutrient file is only
+    read if its checksum changed (with scan, scan_chunked or scan_parallel),
+    and unchanged CSV lines are copied as-is.
+    Returns the new fdc_ids with their nutrient and description hashes.
+    """
+    old_ids = pd.Index(hashes['fdc_id'], name='fdc_id')
+    old_nutrient_hashes = pd.Series(hashes['nutrient_hash'], index=old_ids)
+    old_description_hashes = pd.Series(hashes['description_hash'], index=old_ids)
+
+    nutrients_changed = checksums['nutrients']['sha256'] != manifest['inputs']['nutrients']['sha256']
+    foods_changed = checksums['food']['sha256'] != manifest['inputs']['food']['sha256']
+
+    if nutrients_changed:
+        print(f"Hashing {nutrient_file}...")
+        accumulated, nutrient_hashes = scan(nutrient_file, stats, chunk_rows, with_hashes=True, catalogue=catalogue)
+    else:
+        accumulated, nutrient_hashes = None, old_nutrient_hashes
+        stats['rows'] = 0
+    new_ids = nutrient_hashes.index
+    added = new_ids.difference(old_ids)
+    removed = old_ids.difference(new_ids)
+    common = new_ids.intersection(old_ids)
+
+    with open(output_file, 'rb') as f:
+        header, *lines = f.read().split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    if len(lines) != len(old_ids):
+        raise ValueError(f"{output_file} does not match its manifest")
+    old_lines = pd.Series(lines, index=old_ids, dtype=object)
+
+    # Descriptions: every food if food.csv changed, otherwise only new foods
+    lookup = new_ids if foods_changed else added
+    looked_up = pd.Series([], dtype=object)
+    if len(lookup):
+        looked_up = load_descriptions(food_file, lookup, chunk_rows).set_index('fdc_id')['description']
+    looked_up = looked_up.reindex(lookup).fillna('')
+    if foods_changed:
+        description_hash = pd.Series(description_hashes(looked_up), index=new_ids)
+    else:
+        description_hash = pd.concat([
+            old_description_hashes.loc[common],
+            pd.Series(description_hashes(looked_up), index=added, dtype='uint64')
+        ]).reindex(new_ids)
+
+    changed = common[
+        (nutrient_hashes.loc[common].to_numpy() != old_nutrient_hashes.loc[common].to_numpy())
+        | (description_hash.loc[common].to_numpy() != old_description_hashes.loc[common].to_numpy())
+    ]
+    recompute = changed.union(added)
+    stats.update({'changed': len(changed), 'added': len(added), 'removed': len(removed)})
+
+    # Previous values of the changed foods, parsed from just their lines
+    previous = _read_csv(io.BytesIO(b'\n'.join([header, *old_lines.loc[changed]]) + b'\n'))
+    previous.index = changed
+    if accumulated is not None:
+        pivot = scatter(accumulated.subset(recompute), catalogue)
+    else:
+        pivot = previous[nutrient_columns(catalogue)]
+    if foods_changed:
+        descriptions = looked_up.loc[recompute]
+    else:
+        descriptions = pd.concat([previous['description'], looked_up.loc[added]])
+    foods = descriptions.rename('description').rename_axis('fdc_id').reset_index()
+    updated = build_table(pivot, foods, catalogue).set_index('fdc_id')
+
+    new_lines = updated[output_columns(catalogue)].to_csv(header=False, index=False, lineterminator='\n').encode('utf-8')
+    merged = pd.concat([
+        old_lines.drop(index=removed.union(changed)),
+        pd.Series(new_lines.split(b'\n')[:-1], index=updated.index, dtype=object)
+    ]).sort_index()
+    with open(output_file, 'wb') as f:
+        f.write(b'\n'.join([header, *merged]) + b'\n')
+
+    same_rows = not len(added) and not len(removed)
+    same_descriptions = (description_hash.loc[changed] == old_description_hashes.loc[changed]).all()
+    if table_file and same_rows and same_descriptions and os.path.exists(table_file):
+        # Same foods, same names: overwrite the changed nutrient values in place
+        rows = old_ids.get_indexer(changed)
+        patch_food_table(table_file, rows, {column: updated.loc[changed, column].to_numpy() for column in nutrient_columns(catalogue)})
+        stats['patched'] = 'in_place'
+    elif table_file:
+        final_df = _read_csv(output_file)
+        final_df.insert(0, 'fdc_id', merged.index.to_numpy())
+        _write_table(final_df, table_file, {'source': os.path.basename(nutrient_file)}, catalogue)
+        stats['patched'] = 'rewritten'
+    return merged.index, nutrient_hashes.reindex(merged.index), description_hash.reindex(merged.index)
+
+
+def run(
+    food_file: str,
+    nutrient_file: str,
+    output_file: str,
+    mode: str = 'chunked',
+    chunk_rows: int = CHUNK_ROWS,
+    table_file: str = None,
+    incremental: bool = False,
+    catalogue=DEFAULT_CATALOGUE,
+    workers: int = None
+) -> dict:
+    for path in (food_file, nutrient_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Could not find {path}. Make sure this script is in the same folder.")
+
+    stats = {}
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(workers) if mode == 'parallel' else None
+    try:
+        # In parallel mode the checksums are computed alongside the scan
+        inputs = (('food', food_file), ('nutrients', nutrient_file))
+        if pool is not None:
+            digests = {role: pool.submit(file_checksum, path) for role, path in inputs}
+        else:
+            digests = {role: file_checksum(path) for role, path in inputs}
+
+        def checksums():
+            return {
+                role: {
+                    'path': os.path.basename(path),
+                    'size': os.path.getsize(path),
+                    'sha256': digests[role].result() if pool is not None else digests[role],
+                }
+                for role, path in inputs
+            }
+
+        if mode == 'parallel':
+            scan = partial(scan_parallel, pool=pool, workers=workers)
+        else:
+            scan = scan_chunked
+
+        previous = load_manifest(output_file, catalogue) if incremental and mode != 'memory' else None
+        if previous is not None and table_file and not os.path.exists(table_file):
+            previous = None
+
+        manifest_file, _ = manifest_paths(output_file)
+        if previous is not None and previous[0]['inputs'] == checksums():
+            print("Inputs unchanged since the last run, nothing to do.")
+            stats.update({'rows': 0, 'foods': previous[0]['foods'], 'changed': 0, 'added': 0, 'removed': 0, 'patched': None})
+        else:
+            # Until the new manifest is written, the outputs may not match it
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+
+            if previous is not None:
+                print(f"Updating {output_file} incrementally...")
+                fdc_ids, nutrient_hashes, description_hash = update(
+                    food_file, nutrient_file, output_file, table_file, chunk_rows, stats, checksums(), *previous,
+                    catalogue=catalogue, scan=scan
+                )
+            else:
+                print(f"Loading {nutrient_file} ({mode})...")
+                nutrient_hashes = None
+                if mode == 'memory':
+                    pivot = pivot_in_memory(nutrient_file, stats, catalogue)
+                else:
+                    accumulated, nutrient_hashes = scan(nutrient_file, stats, chunk_rows, with_hashes=True, catalogue=catalogue)
+                    pivot = scatter(accumulated, catalogue)
+
+                print("Merging names with numbers...")
+                if pool is not None:
+                    foods = load_descriptions_parallel(food_file, pivot.index, chunk_rows, pool, workers)
+                else:
+                    foods = load_descriptions(food_file, pivot.index, chunk_rows)
+                final_df = build_table(pivot, foods, catalogue)
+                _write_csv(final_df, output_file, catalogue, pool, workers)
+                if table_file:
+                    _write_table(final_df, table_file, {'source': os.path.basename(nutrient_file)}, catalogue)
+                fdc_ids = final_df['fdc_id']
+                if nutrient_hashes is not None:
+                    nutrient_hashes = nutrient_hashes.reindex(fdc_ids)
+                    description_hash = description_hashes(final_df['description'])
+
+            # The memory path is the reference implementation and keeps no manifest
+            if nutrient_hashes is not None:
+                write_manifest(output_file, checksums(), fdc_ids, nutrient_hashes, description_hash, catalogue)
+            stats['foods'] = len(fdc_ids)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    stats.update({
+        'seconds': elapsed,
+        'rows_per_second': stats['rows'] / elapsed if elapsed > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean USDA FoodData Central CSVs into final_ingredients.csv")
+    parser.add_argument('--food', default=FOOD_FILE)
+    parser.add_argument('--nutrients', default=NUTRIENT_FILE)
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--mode', choices=['chunked', 'memory', 'parallel'], default='chunked')
+    parser.add_argument('--workers', type=int, help="Processes for --mode parallel (default: one per core)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--table', default=TABLE_FILE, help="Food table artifact path, '' to skip it")
+    parser.add_argument('--incremental', action='store_true', help="Only reprocess foods changed since the last run")
+    parser.add_argument('--catalogue', help="JSON nutrient catalogue (defaults to ai/nutrients.DEFAULT_CATALOGUE)")
+    args = parser.parse_args(argv)
+
+    print("--- STARTING DATA CLEANING ---")
+    try:
+        catalogue = load_catalogue(args.catalogue)
+        stats = run(args.food, args.nutrients, args.output, args.mode, args.chunk_rows, args.table, args.incremental, catalogue, args.workers)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    print(f"✅ DONE! Saved clean data to: {args.output}")
+    if args.table:
+        print(f"Food table artifact: {args.table}")
+    print(f"Total foods processed: {stats['foods']}")
+    if 'changed' in stats:
+        print(f"Changed: {stats['changed']}, added: {stats['added']}, removed: {stats['removed']}")
+    print(f"Nutrient rows read: {stats['rows']} in {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} rows/s)")
+    if stats['peak_rss_mb'] is not None:
+        print(f"Peak RSS: {stats['peak_rss_mb']:.0f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
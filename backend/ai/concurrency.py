@@ -0,0 +1,72 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from core.config import settings
+
+
+class GenerationOverloaded(RuntimeError):
+    """Raised when a generation could not get a concurrency slot in time"""
+
+
+class ConcurrencyGate:
+    """
+    Global cap on in-flight LLM calls.
+    Callers queue for a slot for at most queue_timeout seconds and are then
+    rejected with GenerationOverloaded instead of piling up behind the backend.
+    """
+
+    def __init__(self, limit: Optional[int] = None, queue_timeout: Optional[float] = None):
+        self.limit = limit if limit is not None else settings.LLM_MAX_CONCURRENCY
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.LLM_QUEUE_TIMEOUT_SECONDS
+        # Created on first use so it binds to the running event loop
+        self._semaphore = None
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def _acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise GenerationOverloaded(
+                f"Meal plan generation is at capacity ({self.limit} in flight), please retry shortly"
+            )
+        finally:
+            self.waiting -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for the duration of the block"""
+        await self._acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+# Global gate shared by every LLM call in this process
+generation_gate = ConcurrencyGate()
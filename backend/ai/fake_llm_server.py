@@ -0,0 +1,157 @@
+"""
+Local OpenAI-compatible chat completions server for load testing.
+
+Run it next to the backend and point the OpenAI backend at it:
+
+    uvicorn ai.fake_llm_server:app --port 8001
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake uvicorn main:app
+
+Behaviour is controlled by the FAKE_LLM_* settings (latency distribution,
+token rate, error rate) and can be changed at runtime via POST /admin/config.
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from ai.llm_backends import FakeCompletionModel, canned_completion, estimate_tokens
+
+app = FastAPI(title="Fake LLM Server", description="OpenAI-compatible stand-in for load testing")
+simulator = FakeCompletionModel()
+
+# Status codes used for injected errors, picked at random
+ERROR_RESPONSES = [
+    (429, "rate_limit_exceeded", "Rate limit reached (injected)"),
+    (500, "server_error", "The server had an error while processing your request (injected)"),
+    (503, "server_error", "The engine is currently overloaded (injected)"),
+]
+
+
+class SimulatorConfig(BaseModel):
+    latency: Optional[str] = None
+    tokens_per_second: Optional[float] = None
+    error_rate: Optional[float] = None
+
+
+def _prompt_from(body: dict) -> str:
+    return "\n".join(
+        message.get("content") or ""
+        for message in body.get("messages", [])
+        if isinstance(message.get("content"), str)
+    )
+
+
+def _error_response() -> JSONResponse:
+    status_code, code, message = simulator.rng.choice(ERROR_RESPONSES)
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": code, "code": code}}
+    )
+
+
+@app.get("/v1/models")
+def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+    prompt = _prompt_from(body)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    await asyncio.sleep(simulator.first_token_delay())
+    if simulator.should_fail():
+        return _error_response()
+
+    content = canned_completion(prompt, simulator.rng, body.get("response_format"))
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(content)
+
+    if not body.get("stream"):
+        await asyncio.sleep(completion_tokens * simulator.token_delay())
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    async def event_stream():
+        def chunk(delta: dict, finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        # Roughly four characters per token
+        for i in range(0, len(content), 4):
+            await asyncio.sleep(simulator.token_delay())
+            yield chunk({"content": content[i:i + 4]})
+        yield chunk({}, finish_reason="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage_chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/admin/config")
+def get_config():
+    return {
+        "latency": simulator.latency,
+        "tokens_per_second": simulator.tokens_per_second,
+        "error_rate": simulator.error_rate,
+    }
+
+
+@app.post("/admin/config")
+def update_config(config: SimulatorConfig):
+    """Change the simulated latency, token rate or error rate between runs"""
+    if config.latency is not None:
+        previous = simulator.latency
+        simulator.latency = config.latency
+        try:
+            simulator.first_token_delay()
+        except ValueError:
+            simulator.latency = previous
+            raise HTTPException(status_code=400, detail=f"Invalid latency spec: {config.latency}")
+    if config.tokens_per_second is not None:
+        simulator.tokens_per_second = config.tokens_per_second
+    if config.error_rate is not None:
+        simulator.error_rate = config.error_rate
+    return get_config()
@@ -0,0 +1,169 @@
+"""
+Load the cleaned USDA food table into the app's SQLite database, so foods
+can be queried with SQL next to mealplans:
+
+    python -m ai.food_db                                   # ai/final_ingredients.*
+    python -m ai.food_db --source path/to/final_ingredients.csv --database ./nutritionist.db
+
+The foods table gets fdc_id as its rowid, the description and one REAL
+column per nutrient of the ETL output (the .foodtable artifact when it
+exists, with real fdc_ids and every catalogue nutrient; else the CSV).
+foods_fts is an FTS5 index over the descriptions, stored as an
+external-content table so descriptions are not kept twice:
+
+    SELECT foods.* FROM foods_fts JOIN foods ON foods.fdc_id = foods_fts.rowid
+    WHERE foods_fts MATCH 'chick* breast' ORDER BY bm25(foods_fts) LIMIT 10
+
+Each import replaces both tables in one transaction. Rows go in with
+executemany in large batches under bulk-load PRAGMAs; the FTS index and
+the secondary indexes are built once all rows are in.
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+from core.config import settings
+from database.database import engine
+from ai.food_table import FoodTable, FOOD_TABLE_EXTENSION
+from ai.food_search import normalize
+from ai.nutrients import MACRO_COLUMNS
+
+BATCH_ROWS = 50_000
+
+# Applied to the import connection only
+BULK_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",  # 256 MB
+    "PRAGMA temp_store=MEMORY",
+)
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def _read_source(path: str) -> tuple:
+    """(fdc_ids, descriptions, nutrient names, rows x nutrients float matrix)"""
+    table_path = os.path.splitext(path)[0] + FOOD_TABLE_EXTENSION
+    if os.path.exists(table_path):
+        with FoodTable(table_path) as table:
+            return table.fdc_ids.tolist(), table.descriptions(), list(table.nutrients), table.matrix().astype(np.float64)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Food table {path} not found, run ai/clean_data.py first")
+
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        names = [name for name in header if name != "description"]
+        position = header.index("description")
+        columns = [header.index(name) for name in names]
+        descriptions, values = [], []
+        for record in reader:
+            descriptions.append(record[position])
+            values.append([float(record[column] or 0) for column in columns])
+    # The CSV has no fdc_id column; number rows like load_food_records does
+    return list(range(len(descriptions))), descriptions, names, np.asarray(values, dtype=np.float64).reshape(-1, len(names))
+
+
+def _create_tables(conn: sqlite3.Connection, names: list):
+    conn.execute("DROP TABLE IF EXISTS foods_fts")
+    conn.execute("DROP TABLE IF EXISTS foods")
+    nutrient_columns = "".join(f", {name} REAL NOT NULL DEFAULT 0" for name in names)
+    conn.execute(f"CREATE TABLE foods (fdc_id INTEGER PRIMARY KEY, description TEXT NOT NULL{nutrient_columns})")
+
+
+def import_foods(source: str, database: Optional[str] = None, batch_rows: int = BATCH_ROWS) -> dict:
+    """Replace the foods and foods_fts tables with the ETL output at source"""
+    database = database or engine.url.database
+    started = time.perf_counter()
+    fdc_ids, descriptions, names, values = _read_source(source)
+    invalid = [name for name in names if not name.isidentifier()]
+    if invalid:
+        raise ValueError(f"Nutrient names are not valid column names: {', '.join(invalid)}")
+    read_seconds = time.perf_counter() - started
+
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        # One transaction: readers see the old table or the complete new one
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _create_tables(conn, names)
+            placeholders = ", ".join("?" * (len(names) + 2))
+            insert = f"INSERT INTO foods (fdc_id, description, {', '.join(names)}) VALUES ({placeholders})"
+            rows = values.tolist()
+            for start in range(0, len(fdc_ids), batch_rows):
+                end = start + batch_rows
+                conn.executemany(insert, [
+                    (fdc_id, description, *row)
+                    for fdc_id, description, row in zip(fdc_ids[start:end], descriptions[start:end], rows[start:end])
+                ])
+            insert_seconds = time.perf_counter() - started - read_seconds
+
+            # Indexes are built in one pass over the loaded table, not row by row
+            conn.execute(
+                "CREATE VIRTUAL TABLE foods_fts USING fts5("
+                f"description, content='foods', content_rowid='fdc_id', tokenize='{FTS_TOKENIZER}', prefix='2 3')"
+            )
+            conn.execute("INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')")
+            for name in MACRO_COLUMNS:
+                if name in names:
+                    conn.execute(f"CREATE INDEX ix_foods_{name} ON foods ({name})")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("ANALYZE foods")
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "foods": len(fdc_ids),
+        "nutrients": len(names),
+        "database": database,
+        "read_seconds": round(read_seconds, 2),
+        "insert_seconds": round(insert_seconds, 2),
+        "index_seconds": round(elapsed - read_seconds - insert_seconds, 2),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def fts_query(text: str) -> str:
+    """FTS5 MATCH expression for free text: every word, the last one as a prefix"""
+    words = normalize(text)
+    if not words:
+        return ""
+    # Normalized words are plain [a-z0-9]+, so quoting them is enough to escape FTS syntax
+    terms = [f'"{word}"' for word in words]
+    if not text[-1:].isspace():
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the cleaned USDA food table into SQLite")
+    parser.add_argument("--source", default=settings.FOOD_TABLE_PATH, help="final_ingredients.csv (its .foodtable is preferred)")
+    parser.add_argument("--database", default=engine.url.database)
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    args = parser.parse_args(argv)
+
+    try:
+        stats = import_foods(args.source, args.database, args.batch_rows)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(
+        f"Imported {stats['foods']} foods ({stats['nutrients']} nutrients) into {stats['database']} in {stats['seconds']:.1f}s "
+        f"(read {stats['read_seconds']:.1f}s, insert {stats['insert_seconds']:.1f}s, index {stats['index_seconds']:.1f}s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+In-memory search index over the food descriptions of the ETL output,
+backing the /api/foods/search autocomplete endpoint.
+
+Descriptions are tokenized once at startup into token postings (token ->
+sorted document ids). The last query token is matched as a prefix through
+the sorted vocabulary, and tokens with no exact or prefix match fall back
+to trigram similarity against the vocabulary, so "chiken" still finds
+chicken. Scoring and ranking work on NumPy arrays over all documents, which
+keeps a query to a few vectorized passes whatever the match count.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from core.config import settings
+from ai.food_table import FOOD_TABLE_EXTENSION, get_food_table
+from ai.local_planner import load_food_csv, NUTRIENT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Prefixes matching more vocabulary tokens than this keep the most common ones
+MAX_PREFIX_EXPANSIONS = 64
+# Fuzzy matching: candidate tokens need this Dice similarity of trigrams
+MIN_TRIGRAM_SIMILARITY = 0.5
+MAX_FUZZY_EXPANSIONS = 8
+
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+FIRST_TOKEN_BONUS = 0.5
+LENGTH_PENALTY = 0.01
+
+# Ranked results kept per cached query; deeper pages are ranked on demand
+RANK_DEPTH = 200
+# Autocomplete traffic repeats short prefixes, so recent rankings are cached
+CACHE_SIZE = 2048
+
+
+def normalize(text: str) -> list:
+    """Lower-cased ASCII tokens, accents stripped"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _TOKEN.findall(text.lower())
+
+
+def trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodSearchIndex:
+    """
+    Token and trigram postings over food descriptions.
+    search() returns (total, [(doc, score)]) for a page of the ranked results.
+    Rankings are cached per query; single-character prefixes, the most
+    expensive queries, are ranked while building.
+    """
+
+    def __init__(self, descriptions: list, cache_size: int = CACHE_SIZE):
+        started = time.perf_counter()
+        self.size = len(descriptions)
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        token_ids = {}
+        pairs_token = []
+        pairs_doc = []
+        first_token = np.full(self.size, -1, dtype=np.int32)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc, description in enumerate(descriptions):
+            tokens = normalize(description)
+            lengths[doc] = len(description or "")
+            for position, token in enumerate(dict.fromkeys(tokens)):
+                token_id = token_ids.setdefault(token, len(token_ids))
+                if position == 0:
+                    first_token[doc] = token_id
+                pairs_token.append(token_id)
+                pairs_doc.append(doc)
+
+        # Renumber tokens in sorted order so a prefix is a contiguous id range
+        self.vocabulary = sorted(token_ids)
+        renumber = np.zeros(len(token_ids), dtype=np.int32)
+        for sorted_id, token in enumerate(self.vocabulary):
+            renumber[token_ids[token]] = sorted_id
+        self.first_token = np.where(first_token >= 0, renumber[np.maximum(first_token, 0)], -1)
+
+        pair_tokens = renumber[np.asarray(pairs_token, dtype=np.int32)]
+        pair_docs = np.asarray(pairs_doc, dtype=np.int32)
+        order = np.argsort(pair_tokens, kind="stable")  # docs stay sorted within a token
+        pair_tokens, pair_docs = pair_tokens[order], pair_docs[order]
+        bounds = np.searchsorted(pair_tokens, np.arange(len(self.vocabulary) + 1))
+        self.postings = [pair_docs[start:end] for start, end in zip(bounds, bounds[1:])]
+        self.document_frequency = np.diff(bounds)
+
+        # Trigram -> vocabulary token ids, for fuzzy matching
+        trigram_tokens = {}
+        self.trigram_counts = np.zeros(len(self.vocabulary), dtype=np.int32)
+        for token_id, token in enumerate(self.vocabulary):
+            grams = trigrams(token)
+            self.trigram_counts[token_id] = len(grams)
+            for gram in grams:
+                trigram_tokens.setdefault(gram, []).append(token_id)
+        self.trigram_postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in trigram_tokens.items()}
+
+        self.length_penalty = lengths * LENGTH_PENALTY
+        for character in "abcdefghijklmnopqrstuvwxyz0123456789":
+            self.search(character)
+        self.build_seconds = time.perf_counter() - started
+
+    def _prefix_tokens(self, prefix: str) -> np.ndarray:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff", start)
+        if end - start <= MAX_PREFIX_EXPANSIONS:
+            return np.arange(start, end)
+        frequency = self.document_frequency[start:end]
+        top = np.argpartition(-frequency, MAX_PREFIX_EXPANSIONS)[:MAX_PREFIX_EXPANSIONS]
+        return start + top
+
+    def _fuzzy_tokens(self, token: str) -> tuple:
+        """(token ids, similarities) of vocabulary tokens close to token"""
+        grams = [gram for gram in trigrams(token) if gram in self.trigram_postings]
+        if len(token) < 3 or not grams:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        shared = np.bincount(
+            np.concatenate([self.trigram_postings[gram] for gram in grams]),
+            minlength=len(self.vocabulary)
+        )
+        candidates = np.flatnonzero(shared)
+        similarity = 2 * shared[candidates] / (len(trigrams(token)) + self.trigram_counts[candidates])
+        keep = similarity >= MIN_TRIGRAM_SIMILARITY
+        candidates, similarity = candidates[keep], similarity[keep]
+        best = np.argsort(-similarity, kind="stable")[:MAX_FUZZY_EXPANSIONS]
+        return candidates[best], similarity[best]
+
+    def _expand(self, token: str, prefix: bool, fuzzy: bool) -> list:
+        """(token id, weight) pairs a query token matches"""
+        expansions = []
+        position = bisect.bisect_left(self.vocabulary, token)
+        exact = position < len(self.vocabulary) and self.vocabulary[position] == token
+        if exact:
+            expansions.append((position, EXACT_WEIGHT))
+        if prefix:
+            expansions += [(int(token_id), PREFIX_WEIGHT) for token_id in self._prefix_tokens(token) if token_id != position or not exact]
+        if not expansions and fuzzy:
+            token_ids, similarity = self._fuzzy_tokens(token)
+            expansions = [(int(token_id), FUZZY_WEIGHT * float(score)) for token_id, score in zip(token_ids, similarity)]
+        return expansions
+
+    def _rank(self, terms: tuple, typing: bool, fuzzy: bool, require_all: bool, depth: int) -> tuple:
+        """(total matches, best docs up to depth, their scores), best first"""
+        total_score = np.zeros(self.size, dtype=np.float32)
+        matched = np.full(self.size, require_all, dtype=bool)
+        leading = np.zeros(len(self.vocabulary), dtype=bool)
+        for index, term in enumerate(terms):
+            expansions = self._expand(term, prefix=typing and index == len(terms) - 1, fuzzy=fuzzy)
+            if not expansions and require_all:
+                return 0, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            # A document scores the best weight among the tokens it matched:
+            # assigning in ascending weight order lets the higher ones win
+            term_score = np.zeros(self.size, dtype=np.float32)
+            for token_id, weight in sorted(expansions, key=lambda expansion: expansion[1]):
+                term_score[self.postings[token_id]] = weight
+            if require_all:
+                matched &= term_score > 0
+            else:
+                matched |= term_score > 0
+            total_score += term_score
+            if index == 0 and expansions:
+                leading[[token_id for token_id, _ in expansions]] = True
+
+        docs = np.flatnonzero(matched)
+        # Foods whose name starts with the first query term rank higher
+        scores = total_score[docs] + FIRST_TOKEN_BONUS * leading[self.first_token[docs]] - self.length_penalty[docs]
+        if depth < len(docs):
+            # Keep everything tied with the depth-th score so ties break by document order below
+            cutoff = -np.partition(-scores, depth - 1)[depth - 1]
+            keep = scores >= cutoff
+            docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((docs, -scores))[:depth]
+        return int(matched.sum()), docs[order], scores[order]
+
+    def search(self, query: str, limit: int = 10, offset: int = 0, fuzzy: bool = True, require_all: bool = True) -> tuple:
+        """
+        Rank documents matching every query word, or with require_all=False
+        any of them, documents matching more words scoring higher
+        """
+        tokens = normalize(query)
+        if not tokens:
+            return 0, []
+        # Autocomplete: the token being typed is a prefix unless followed by a space
+        typing = not query[-1:].isspace()
+        terms = list(dict.fromkeys(tokens))
+        if typing and terms[-1] != tokens[-1]:
+            terms.remove(tokens[-1])
+            terms.append(tokens[-1])
+        key = (tuple(terms), typing, fuzzy, require_all)
+
+        if offset + limit > RANK_DEPTH:
+            total, docs, scores = self._rank(*key, depth=offset + limit)
+        else:
+            with self._lock:
+                ranked = self._cache.get(key)
+                if ranked is not None:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+            if ranked is None:
+                ranked = self._rank(*key, depth=RANK_DEPTH)
+                with self._lock:
+                    self._cache[key] = ranked
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            total, docs, scores = ranked
+        return total, [(int(doc), float(score)) for doc, score in zip(docs[offset:offset + limit], scores[offset:offset + limit])]
+
+
+def rows_for_ids(fdc_ids: np.ndarray, order: np.ndarray, wanted) -> np.ndarray:
+    """Row of each wanted fdc_id in fdc_ids (order sorts fdc_ids), -1 for unknown ids"""
+    wanted = np.asarray(wanted, dtype=np.int64).reshape(-1)
+    if not len(fdc_ids):
+        return np.full(len(wanted), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(fdc_ids, wanted, sorter=order), len(fdc_ids) - 1)
+    rows = order[positions]
+    return np.where(fdc_ids[rows] == wanted, rows, -1)
+
+
+class FoodCatalog:
+    """
+    Food records (fdc_id, description, macros) with a search index over them.
+    fingerprint identifies the food table the ids belong to; it is None for
+    the row numbers of the CSV fallback, which no ETL run keeps stable.
+    """
+
+    def __init__(self, fdc_ids: np.ndarray, descriptions, nutrients, fingerprint: Optional[str] = None):
+        self.fdc_ids = fdc_ids
+        self.descriptions = descriptions
+        self.nutrients = nutrients
+        self.fingerprint = fingerprint
+        self.index = FoodSearchIndex(descriptions)
+        self._id_order = np.argsort(fdc_ids, kind="stable")
+
+    def rows_for(self, fdc_ids) -> np.ndarray:
+        """Row index of each fdc_id, -1 for unknown ids"""
+        return rows_for_ids(self.fdc_ids, self._id_order, fdc_ids)
+
+    def search(self, query: str, limit: int = 10, offset: int = 0, fuzzy: bool = True) -> dict:
+        total, hits = self.index.search(query, limit, offset, fuzzy)
+        results = []
+        for doc, score in hits:
+            food = {"fdc_id": int(self.fdc_ids[doc]), "description": self.descriptions[doc], "score": round(score, 4)}
+            food.update({name: round(float(value), 2) for name, value in zip(NUTRIENT_COLUMNS, self.nutrients[doc])})
+            results.append(food)
+        return {"query": query, "total": total, "limit": limit, "offset": offset, "results": results}
+
+    def stats(self) -> dict:
+        return {
+            "foods": self.index.size,
+            "tokens": len(self.index.vocabulary),
+            "trigrams": len(self.index.trigram_postings),
+            "build_seconds": round(self.index.build_seconds, 3),
+            "cached_queries": len(self.index._cache),
+            "cache_hits": self.index.cache_hits,
+        }
+
+
+def load_food_records(path: str):
+    """
+    (fdc_ids, descriptions, macro matrix, table fingerprint), preferring the
+    .foodtable artifact, whose records come back as views over the shared
+    table; None if missing
+    """
+    table = get_food_table(os.path.splitext(path)[0] + FOOD_TABLE_EXTENSION)
+    if table is not None:
+        return table.fdc_ids, table.description_view(), table.nutrient_view(NUTRIENT_COLUMNS), table.fingerprint
+    if os.path.exists(path):
+        # The CSV has no fdc_id column; fall back to row numbers, which have no fingerprint
+        descriptions, nutrients = load_food_csv(path)
+        return np.arange(len(descriptions)), descriptions, nutrients, None
+    return None
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_food_catalog() -> Optional[FoodCatalog]:
+    """Lazily build the shared search index; None if the food table is missing"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                path = settings.FOOD_TABLE_PATH
+                records = load_food_records(path)
+                if records is None:
+                    logger.warning(f"Food table {path} not found, food search unavailable")
+                    return None
+                _catalog = FoodCatalog(*records)
+                logger.info(f"Indexed {_catalog.index.size} foods for search in {_catalog.index.build_seconds:.1f}s")
+    return _catalog
@@ -0,0 +1,180 @@
+"""
+Nearest-neighbour food substitutions by macros.
+
+Foods are points in (calories, protein, fat, carbs) space, per 100 g, with
+each axis divided by its spread across the table so that a gram of protein
+and a kilocalorie weigh comparably. A KD-tree per diet type answers
+"what is closest to this food / to these macros" for a whole batch of
+queries in one call.
+"""
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from ai.food_search import get_food_catalog, rows_for_ids
+from ai.food_table import NutrientView
+from ai.local_planner import DIET_EXCLUSIONS, NUTRIENT_COLUMNS, diet_key
+
+logger = logging.getLogger(__name__)
+
+# Most substitutes returned per query
+MAX_K = 50
+
+
+class FoodSubstitutes:
+    """KD-trees over scaled macro vectors, built lazily per diet type"""
+
+    def __init__(self, fdc_ids: np.ndarray, descriptions, nutrients):
+        self.fdc_ids = np.asarray(fdc_ids)
+        self.descriptions = descriptions
+        if not isinstance(nutrients, NutrientView):
+            nutrients = np.asarray(nutrients, dtype=np.float32)
+        self.nutrients = nutrients
+        # Column by column, so a table's views are read in place
+        columns = [nutrients[:, column] for column in range(len(NUTRIENT_COLUMNS))]
+        # Foods with no energy are mostly water, salt and unfilled rows
+        self.usable = np.logical_and.reduce([np.isfinite(column) for column in columns]) & (columns[0] > 0)
+        if self.usable.any():
+            spread = np.array([column[self.usable].std() for column in columns])
+        else:
+            spread = np.ones(len(NUTRIENT_COLUMNS))
+        self.scale = np.where(spread > 0, spread, 1.0).astype(np.float64)
+        self._id_order = np.argsort(self.fdc_ids, kind="stable")
+        self._lowered = None
+        self._trees = {}  # diet key -> (tree, row indices)
+        self._lock = threading.Lock()
+
+    def _diet_mask(self, diet: str) -> np.ndarray:
+        if not diet:
+            return self.usable
+        rows = np.flatnonzero(self.usable)
+        if self._lowered is None:
+            # Only usable foods can be substitutes, so only they are decoded
+            self._lowered = [self.descriptions[row].lower() for row in rows]
+        words = DIET_EXCLUSIONS[diet]
+        allowed = np.zeros(len(self.usable), dtype=bool)
+        allowed[rows] = np.fromiter(
+            (not any(word in text for word in words) for text in self._lowered),
+            dtype=bool, count=len(self._lowered)
+        )
+        return allowed
+
+    def _tree(self, diet: str) -> tuple:
+        with self._lock:
+            if diet not in self._trees:
+                rows = np.flatnonzero(self._diet_mask(diet))
+                tree = cKDTree(self.nutrients[rows] / self.scale) if len(rows) else None
+                self._trees[diet] = (tree, rows)
+            return self._trees[diet]
+
+    def rows_for(self, fdc_ids) -> np.ndarray:
+        """Row index of each fdc_id, -1 for unknown ids"""
+        return rows_for_ids(self.fdc_ids, self._id_order, fdc_ids)
+
+    def nearest(self, targets: np.ndarray, k: int = 5, diet_type: Optional[str] = None, exclude_rows=None) -> tuple:
+        """
+        (distances, rows), each n x k, of the foods closest to n target macro
+        vectors. exclude_rows gives one row per target to leave out (the food
+        being replaced), -1 for none. Missing neighbours come back as row -1.
+        """
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, len(NUTRIENT_COLUMNS))
+        k = max(1, min(int(k), MAX_K))
+        tree, rows = self._tree(diet_key(diet_type))
+        distances = np.full((len(targets), k), np.inf)
+        found = np.full((len(targets), k), -1, dtype=np.int64)
+        if tree is None or not len(targets):
+            return distances, found
+
+        # One extra neighbour covers the excluded food turning up in its own results
+        extra = 1 if exclude_rows is not None else 0
+        query_k = min(k + extra, len(rows))
+        near_distances, near = tree.query(targets / self.scale, k=query_k)
+        near_distances = near_distances.reshape(len(targets), query_k)
+        near_rows = rows[near.reshape(len(targets), query_k)]
+
+        if extra:
+            exclude_rows = np.asarray(exclude_rows, dtype=np.int64).reshape(-1, 1)
+            keep = near_rows != exclude_rows
+            # Stable sort moves dropped entries to the end of each row, order otherwise kept
+            order = np.argsort(~keep, axis=1, kind="stable")
+            near_rows = np.where(np.take_along_axis(keep, order, axis=1), np.take_along_axis(near_rows, order, axis=1), -1)
+            near_distances = np.where(near_rows >= 0, np.take_along_axis(near_distances, order, axis=1), np.inf)
+
+        width = min(k, query_k)
+        found[:, :width] = near_rows[:, :width]
+        distances[:, :width] = near_distances[:, :width]
+        return distances, found
+
+    def for_foods(self, fdc_ids, k: int = 5, diet_type: Optional[str] = None) -> tuple:
+        """Substitutes for each food by fdc_id: (rows of the foods, distances, substitute rows)"""
+        rows = self.rows_for(fdc_ids)
+        targets = np.where(rows[:, None] >= 0, self.nutrients[np.maximum(rows, 0)], np.nan)
+        distances, found = self.nearest(np.nan_to_num(targets), k, diet_type, exclude_rows=rows)
+        # Unknown foods get no substitutes rather than neighbours of the origin
+        found[rows < 0] = -1
+        distances[rows < 0] = np.inf
+        return rows, distances, found
+
+    def food(self, row: int, distance: Optional[float] = None) -> dict:
+        food = {"fdc_id": int(self.fdc_ids[row]), "description": self.descriptions[row]}
+        if distance is not None:
+            food["distance"] = round(float(distance), 4)
+        food.update({name: round(float(value), 2) for name, value in zip(NUTRIENT_COLUMNS, self.nutrients[row])})
+        return food
+
+    def substitutes(self, distances: np.ndarray, found: np.ndarray) -> list:
+        """Result dicts for each query of a nearest() batch"""
+        return [
+            [self.food(row, distance) for distance, row in zip(row_distances, row_found) if row >= 0]
+            for row_distances, row_found in zip(distances, found)
+        ]
+
+    def suggest(self, fdc_ids=(), targets=(), k: int = 5, diet_type: Optional[str] = None) -> list:
+        """
+        Substitution results for a batch: one entry per fdc_id (the food, and
+        no substitutes if it is unknown), then one per target macro vector
+        """
+        results = []
+        if len(fdc_ids):
+            rows, distances, found = self.for_foods(fdc_ids, k, diet_type)
+            for fdc_id, row, substitutes in zip(fdc_ids, rows, self.substitutes(distances, found)):
+                food = self.food(row) if row >= 0 else {"fdc_id": int(fdc_id), "description": None}
+                target = {name: food[name] for name in NUTRIENT_COLUMNS} if row >= 0 else None
+                results.append({"fdc_id": food["fdc_id"], "description": food["description"], "target": target, "substitutes": substitutes})
+        if len(targets):
+            targets = np.asarray(targets, dtype=np.float64).reshape(-1, len(NUTRIENT_COLUMNS))
+            distances, found = self.nearest(targets, k, diet_type)
+            for target, substitutes in zip(targets, self.substitutes(distances, found)):
+                target = dict(zip(NUTRIENT_COLUMNS, target.tolist()))
+                results.append({"fdc_id": None, "description": None, "target": target, "substitutes": substitutes})
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "foods": int(self.usable.sum()),
+            "scale": dict(zip(NUTRIENT_COLUMNS, np.round(self.scale, 3).tolist())),
+            "trees": {diet or "all": len(rows) for diet, (_, rows) in self._trees.items()},
+        }
+
+
+_substitutes = None
+_substitutes_lock = threading.Lock()
+
+
+def get_food_substitutes() -> Optional[FoodSubstitutes]:
+    """Lazily build the shared substitution index over the search catalog's foods"""
+    global _substitutes
+    if _substitutes is None:
+        with _substitutes_lock:
+            if _substitutes is None:
+                catalog = get_food_catalog()
+                if catalog is None:
+                    return None
+                _substitutes = FoodSubstitutes(catalog.fdc_ids, catalog.descriptions, catalog.nutrients)
+                for diet in ("",) + tuple(DIET_EXCLUSIONS):
+                    _substitutes._tree(diet)
+                logger.info(f"Built food substitution index over {int(_substitutes.usable.sum())} foods")
+    return _substitutes
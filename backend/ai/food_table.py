@@ -0,0 +1,277 @@
+"""
+Columnar binary format for the cleaned food table.
+
+Layout of a .foodtable file:
+
+    8 bytes   magic b"FOODTBL\\x01"
+    4 bytes   little-endian uint32 header length
+    N bytes   JSON header (row count, column dtypes and offsets)
+    ...       padding to a 64-byte boundary, then the data section:
+              one fixed-dtype array per column, each 64-byte aligned,
+              description offsets (uint64, rows + 1) and the UTF-8 blob
+
+Readers memory-map the file, so loading is independent of the table size
+and every process reading the same file shares its pages in the OS cache.
+get_food_table() keeps one open table per process for the app's readers.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"FOODTBL\x01"
+FORMAT_VERSION = 1
+FOOD_TABLE_EXTENSION = ".foodtable"
+ALIGNMENT = 64
+
+_PREFIX = struct.Struct("<8sI")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_food_table(path: str, fdc_ids, descriptions: list, columns: dict, metadata: Optional[dict] = None):
+    """
+    Write a .foodtable file. columns maps nutrient name to values; they are
+    stored as float32. The file is written next to path and renamed into
+    place, so readers never see a partial table.
+    """
+    rows = len(descriptions)
+    encoded = [(description or "").encode("utf-8") for description in descriptions]
+    offsets = np.zeros(rows + 1, dtype="<u8")
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+
+    arrays = [("fdc_id", np.asarray(fdc_ids, dtype="<i4"))]
+    arrays += [(name, np.asarray(values, dtype="<f4")) for name, values in columns.items()]
+    arrays.append(("description_offsets", offsets))
+    for name, array in arrays:
+        if len(array) != (rows + 1 if name == "description_offsets" else rows):
+            raise ValueError(f"Column {name} has {len(array)} values for {rows} rows")
+
+    sections = {}
+    position = 0
+    for name, array in arrays:
+        sections[name] = {"dtype": array.dtype.str, "count": len(array), "offset": position}
+        position = _align(position + array.nbytes)
+    sections["description_blob"] = {"dtype": "|u1", "count": int(offsets[-1]), "offset": position}
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "nutrients": list(columns),
+        "sections": sections,
+        "metadata": metadata or {},
+    }).encode("utf-8")
+    data_start = _align(_PREFIX.size + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for name, array in arrays:
+            f.seek(data_start + sections[name]["offset"])
+            f.write(array.tobytes())
+        f.seek(data_start + sections["description_blob"]["offset"])
+        for item in encoded:
+            f.write(item)
+        # Padding may follow the last array when the blob is empty
+        f.truncate(data_start + sections["description_blob"]["offset"] + int(offsets[-1]))
+    os.replace(tmp_path, path)
+
+
+def patch_food_table(path: str, rows, columns: dict):
+    """
+    Overwrite nutrient values of existing rows in place. rows are row
+    indices; columns maps nutrient name to one new value per row. Only the
+    touched pages are written; the row set and descriptions stay as they are.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    with open(path, "r+b") as f, mmap.mmap(f.fileno(), 0) as mapping:
+        magic, header_length = _PREFIX.unpack_from(mapping, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a food table file")
+        header = json.loads(mapping[_PREFIX.size:_PREFIX.size + header_length])
+        data_start = _align(_PREFIX.size + header_length)
+        for name, values in columns.items():
+            if name not in header["nutrients"]:
+                raise KeyError(f"Unknown food table column: {name}")
+            spec = header["sections"][name]
+            column = np.frombuffer(mapping, dtype=spec["dtype"], count=spec["count"], offset=data_start + spec["offset"])
+            column[rows] = np.asarray(values, dtype=spec["dtype"])
+            del column
+        mapping.flush()
+
+
+class FoodTable:
+    """
+    Read-only, memory-mapped view of a .foodtable file.
+    Columns come back as zero-copy NumPy views into the mapping; only
+    descriptions are decoded, and only when asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, header_length = _PREFIX.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a food table file")
+            header = json.loads(self._mmap[_PREFIX.size:_PREFIX.size + header_length])
+        except Exception:
+            self.close()
+            raise
+        if header["version"] != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported food table version {header['version']}")
+
+        self.rows = header["rows"]
+        self.nutrients = header["nutrients"]
+        self.metadata = header["metadata"]
+        # Identifies this ETL output; each run replaces the file with a new one
+        stat = os.fstat(self._file.fileno())
+        self.fingerprint = f"{os.path.abspath(path)}:{stat.st_ino}:{stat.st_mtime_ns}"
+        data_start = _align(_PREFIX.size + header_length)
+        self._arrays = {
+            name: np.frombuffer(self._mmap, dtype=spec["dtype"], count=spec["count"], offset=data_start + spec["offset"])
+            for name, spec in header["sections"].items()
+        }
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    def column(self, name: str) -> np.ndarray:
+        """Zero-copy, read-only view of one column"""
+        if name not in self.nutrients and name != "fdc_id":
+            raise KeyError(f"Unknown food table column: {name}")
+        return self._arrays[name]
+
+    @property
+    def units(self) -> dict:
+        """Nutrient name -> unit, as recorded by the writer"""
+        return self.metadata.get("units", {})
+
+    @property
+    def fdc_ids(self) -> np.ndarray:
+        return self._arrays["fdc_id"]
+
+    def matrix(self, names: Optional[list] = None) -> np.ndarray:
+        """Rows x nutrients float32 matrix of the given columns (a copy)"""
+        names = names or self.nutrients
+        return np.column_stack([self.column(name) for name in names])
+
+    def description(self, index: int) -> str:
+        offsets = self._arrays["description_offsets"]
+        return self._arrays["description_blob"][offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+
+    def descriptions(self) -> list:
+        """Decode every description"""
+        blob = self._arrays["description_blob"].tobytes()
+        offsets = self._arrays["description_offsets"].tolist()
+        return [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def description_view(self) -> "DescriptionView":
+        """Sequence of the descriptions that decodes each one when read"""
+        return DescriptionView(self)
+
+    def nutrient_view(self, names: Optional[list] = None) -> "NutrientView":
+        """Rows x nutrients matrix over the column views, gathered on indexing"""
+        return NutrientView([self.column(name) for name in names or self.nutrients])
+
+    def description_lengths(self) -> np.ndarray:
+        """Encoded length of each description, without decoding any"""
+        return np.diff(self._arrays["description_offsets"])
+
+    def close(self):
+        self._arrays = {}
+        mapping = getattr(self, "_mmap", None)
+        if mapping is not None:
+            try:
+                mapping.close()
+            except BufferError:
+                # Callers still hold column views; the mapping goes when they do
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DescriptionView:
+    """Read-only sequence over the descriptions of a FoodTable, decoded per item"""
+
+    def __init__(self, table: FoodTable):
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, index) -> str:
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("description index out of range")
+        return self._table.description(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._table.description(index)
+
+
+class NutrientView:
+    """
+    Rows x nutrients matrix over per-column views. Indexing rows gathers just
+    those rows into a new array; view[:, i] is the column view itself.
+    """
+
+    def __init__(self, columns: list):
+        self._columns = columns
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self._columns[0]) if self._columns else 0, len(self._columns))
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key) -> np.ndarray:
+        if isinstance(key, tuple):
+            rows, column = key
+            return self._columns[column][rows]
+        if isinstance(key, (int, np.integer)):
+            return np.array([column[key] for column in self._columns])
+        return np.column_stack([column[key] for column in self._columns])
+
+
+_tables = {}  # path -> (inode, FoodTable)
+_tables_lock = threading.Lock()
+
+
+def get_food_table(path: str) -> Optional[FoodTable]:
+    """
+    The process-wide FoodTable for path, opened once and kept open so every
+    reader shares its mapping; None if the file is missing. A file replaced
+    by a new ETL run is mapped afresh on the next call.
+    """
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is None or cached[0] != inode:
+            # The old table is not closed: views handed out may still be in use
+            cached = _tables[path] = (inode, FoodTable(path))
+        return cached[1]
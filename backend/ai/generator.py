@@ -1,27 +1,417 @@
-from openai import OpenAI
 from core.config import settings
-from ai.prompt_template import PROMPT_TEMPLATE
+from ai.plan_cache import plan_cache, normalize_plan_params, render_prompt, make_cache_key
+from ai.concurrency import generation_gate, GenerationOverloaded
+from ai.stream_parser import DayStreamParser
+from ai.singleflight import generation_flight
+from ai.prompt_template import DAY_PROMPT_TEMPLATE
+from ai.plan_schema import (
+    parse_json_with_repair, validate_day, extract_days, PlanValidationError,
+    PLAN_DAYS, PLAN_RESPONSE_FORMAT, DAY_RESPONSE_FORMAT
+)
+from ai.local_planner import get_local_planner
+from ai.llm_backends import get_backend
+from ai.circuit_breaker import llm_breaker, hedged
+from ai.llm_metrics import llm_metrics, CallRecord
+from ai.plan_verifier import verify_plan, plan_verification
 import asyncio
+import json
+import logging
+import time
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
-async def generate_meal_plan(request):
-    prompt = PROMPT_TEMPLATE.format(
-        goal=request.goal,
-        calories=request.daily_calories,
-        diet_type=request.diet_type,
-        protein=request.macros.protein,
-        carbs=request.macros.carbs,
-        fats=request.macros.fats
-    )
+_local_counters = {"generated": 0, "fallbacks": 0}
+_validation_counters = {"repaired_plans": 0, "regenerated_days": 0, "invalid_stream_days": 0, "off_target_days": 0}
+_hedge_counters = {"hedged": 0}
+
+
+async def _cache_plan(cache_key: str, content: str, model: str):
+    # Only cache plans that parse, so a bad completion is not served repeatedly
+    if not settings.PLAN_CACHE_ENABLED or not content:
+        return
+    try:
+        json.loads(content)
+    except ValueError:
+        return
+    await plan_cache.aset(cache_key, content, model)
+
+
+def _response_format(response_format: dict):
+    return response_format if settings.LLM_STRUCTURED_OUTPUT else None
+
+
+def _dump_plan(days: dict) -> str:
+    return json.dumps([days[day] for day in range(1, PLAN_DAYS + 1)])
+
+
+async def _call_llm(prompt: str, model: str, response_format, kind: str, diet_type: str, parse):
+    """
+    One completion through the circuit breaker and concurrency gate,
+    returning parse(content). Queue wait, latency, tokens, cost, retries
+    and parse failures are recorded per call in llm_metrics.
+    With HEDGE_ENABLED a second attempt is fired once the first has run
+    longer than the recent p95 for this kind of call.
+    """
+    async def attempt(hedge: bool):
+        call = CallRecord(model, kind, diet_type)
+        probe = False
+        try:
+            queued = time.perf_counter()
+            # Raises GenerationOverloaded if no slot frees up within the queue timeout
+            async with generation_gate.slot():
+                # Asked only with a slot held, so a gate rejection never uses up a half-open probe
+                if settings.CIRCUIT_BREAKER_ENABLED:
+                    probe = llm_breaker.allow()
+                started = time.perf_counter()
+                call.queue_wait = started - queued
+                try:
+                    completion = await get_backend().complete(prompt, model, response_format)
+                except Exception:
+                    call.latency = time.perf_counter() - started
+                    llm_breaker.record(call.latency, ok=False, kind=kind, probe=probe)
+                    probe = False
+                    raise
+                call.latency = time.perf_counter() - started
+                llm_breaker.record(call.latency, ok=True, kind=kind, probe=probe)
+                probe = False
+
+            call.set_usage(completion.usage)
+            call.retries = completion.retries + hedge
+            try:
+                return parse(completion.content)
+            except PlanValidationError:
+                call.parse_failure = True
+                raise
+        except asyncio.CancelledError:
+            # Lost a hedge race or the caller gave up
+            call.status = "cancelled"
+            raise
+        except Exception as e:
+            if not call.parse_failure:
+                call.status = "error"
+                call.error = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            if probe:
+                # Cancelled before an outcome: a lost hedge race says nothing about the LLM
+                llm_breaker.release(probe)
+            llm_metrics.record(call)
+
+    delay = None
+    if settings.HEDGE_ENABLED:
+        p95 = llm_breaker.latency_percentile(95, kind=kind)
+        if p95 is not None:
+            delay = max(p95, settings.HEDGE_MIN_DELAY_SECONDS)
+
+    result, was_hedged = await hedged(attempt, delay)
+    if was_hedged:
+        _hedge_counters["hedged"] += 1
+    return result
+
+
+def _parse_day(day: int):
+    def parse(content: str) -> dict:
+        parsed = parse_json_with_repair(content)
+        # Tolerate the model wrapping the single day in a list
+        if isinstance(parsed, list) and len(parsed) == 1:
+            parsed = parsed[0]
+        return validate_day(parsed, expected_day=day)
+    return parse
 
-    response = await asyncio.to_thread(
-        client.chat.completions.create,
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
+
+async def _generate_single(prompt: str, params: dict, model: str) -> tuple:
+    try:
+        days, problems = await _call_llm(
+            prompt, model, _response_format(PLAN_RESPONSE_FORMAT), "plan", params["diet_type"], extract_days
+        )
+    except PlanValidationError as e:
+        days, problems = {}, [str(e)]
+
+    if problems:
+        # Keep the valid days and regenerate only the broken ones
+        logger.warning(f"Repairing generated meal plan: {'; '.join(problems)}")
+        _validation_counters["repaired_plans"] += 1
+        days = await _fill_days(params, model, days, settings.PLAN_REPAIR_ATTEMPTS)
+
+    days, verification = await _verify_days(params, model, days)
+    return _dump_plan(days), verification
+
+
+async def _complete(prompt: str, params: dict, model: str, cache_key: str) -> tuple:
+    content, verification = await _generate_single(prompt, params, model)
+    await _cache_plan(cache_key, content, model)
+    return content, verification
+
+
+async def _complete_day(params: dict, day: int, model: str) -> dict:
+    prompt = DAY_PROMPT_TEMPLATE.format(day=day, **params)
+    return await _call_llm(
+        prompt, model, _response_format(DAY_RESPONSE_FORMAT), "day", params["diet_type"], _parse_day(day)
     )
 
+
+async def _fill_days(params: dict, model: str, days: dict, attempts: int) -> dict:
+    """
+    Generate every day missing from days with concurrent day-scoped prompts.
+    Each day is validated on its own and only failed days are retried.
+    """
+    days = dict(days)
+    errors = {}
+    pending = [day for day in range(1, PLAN_DAYS + 1) if day not in days]
+
+    for _ in range(max(1, attempts)):
+        if not pending:
+            break
+        results = await asyncio.gather(
+            *[_complete_day(params, day, model) for day in pending],
+            return_exceptions=True
+        )
+        _validation_counters["regenerated_days"] += len(pending)
+        failed = []
+        for day, result in zip(pending, results):
+            if isinstance(result, Exception):
+                errors[day] = result
+                failed.append(day)
+            else:
+                days[day] = result
+        pending = failed
+
+    if pending:
+        if all(isinstance(errors[day], GenerationOverloaded) for day in pending):
+            raise errors[pending[0]]
+        details = "; ".join(f"day {day}: {errors[day]}" for day in pending)
+        raise RuntimeError(f"Failed to generate meal plan days ({details})")
+    return days
+
+
+async def _verify_days(params: dict, model: str, days: dict) -> tuple:
+    """
+    Check the days against the food database and regenerate only those off
+    the requested calories or macro split. Each regenerated day replaces
+    the original only if it is closer to the targets.
+    Returns the days and the PlanVerification of those days (None if not verified).
+    """
+    if not settings.PLAN_VERIFY_ENABLED:
+        return days, None
+    ordered = [days[day] for day in sorted(days)]
+    verification = await asyncio.to_thread(verify_plan, ordered, params)
+    if verification is None or not verification.offending_days:
+        return days, verification
+
+    offending = verification.offending_days
+    logger.warning(f"Regenerating meal plan days off target: {offending}")
+    _validation_counters["off_target_days"] += len(offending)
+    kept = {day: value for day, value in days.items() if day not in offending}
     try:
-        return response.choices[0].message.content
-    except (IndexError, AttributeError) as e:
-        raise RuntimeError("Failed to generate meal plan: invalid response structure") from e
+        regenerated = await _fill_days(params, model, kept, settings.PLAN_VERIFY_ATTEMPTS)
+    except Exception as e:
+        # The original days are valid, only off target
+        logger.warning(f"Could not regenerate off-target days: {e}")
+        return days, verification
+
+    recheck = await asyncio.to_thread(verify_plan, [regenerated[day] for day in offending], params)
+    checked = {day.day: day for day in verification.days}
+    days = dict(days)
+    for day in recheck.days if recheck is not None else []:
+        before = checked[day.day].deviation
+        if day.deviation is not None and (before is None or day.deviation < before):
+            days[day.day] = regenerated[day.day]
+            checked[day.day] = day
+    return days, plan_verification([checked[day] for day in sorted(checked)])
+
+
+async def _complete_fanout(params: dict, model: str, cache_key: str) -> tuple:
+    """
+    Generate the week as seven concurrent day-scoped prompts, so wall-clock
+    time tracks the slowest day rather than the whole week.
+    """
+    days = await _fill_days(params, model, {}, settings.FANOUT_MAX_ATTEMPTS)
+    days, verification = await _verify_days(params, model, days)
+    content = _dump_plan(days)
+    await _cache_plan(cache_key, content, model)
+    return content, verification
+
+
+async def generate_plan_variant(params: dict) -> str:
+    """
+    Generate a fresh plan for normalized params, bypassing the cache and
+    single-flight so repeated calls return distinct variants (warm pool).
+    """
+    if settings.GENERATION_MODE == "local":
+        content = await _local_plan(params)
+        if content is None:
+            raise RuntimeError("Local meal planner is unavailable: food table not found")
+        return content
+    model = settings.OPENAI_MODEL
+    if settings.GENERATION_MODE == "fanout":
+        days = await _fill_days(params, model, {}, settings.FANOUT_MAX_ATTEMPTS)
+        days, _ = await _verify_days(params, model, days)
+        return _dump_plan(days)
+    content, _ = await _generate_single(render_prompt(params), params, model)
+    return content
+
+
+async def _local_plan(params: dict):
+    """Plan from the offline optimizer, or None if the food table is missing"""
+    planner = await asyncio.to_thread(get_local_planner)
+    if planner is None:
+        return None
+    plan = await asyncio.to_thread(planner.generate, params)
+    return json.dumps(plan)
+
+
+async def generate_meal_plan(request) -> str:
+    content, _ = await generate_verified_meal_plan(request)
+    return content
+
+
+async def generate_verified_meal_plan(request) -> tuple:
+    """
+    (plan JSON, PlanVerification) for a request. The verification is the one
+    done while generating; it is None for plans that were not verified here
+    (cached, local or verification disabled).
+    """
+    # Equivalent requests render the same prompt, so the prompt doubles as the cache key
+    params = normalize_plan_params(request)
+
+    if settings.GENERATION_MODE == "local":
+        content = await _local_plan(params)
+        if content is None:
+            raise RuntimeError("Local meal planner is unavailable: food table not found")
+        _local_counters["generated"] += 1
+        return content, None
+
+    prompt = render_prompt(params)
+    model = settings.OPENAI_MODEL
+    cache_key = make_cache_key(prompt, model)
+
+    if settings.PLAN_CACHE_ENABLED:
+        cached_plan = await plan_cache.aget(cache_key)
+        if cached_plan is not None:
+            return cached_plan, None
+
+    if settings.GENERATION_MODE == "fanout":
+        complete = lambda: _complete_fanout(params, model, cache_key)
+    else:
+        complete = lambda: _complete(prompt, params, model, cache_key)
+
+    # Identical requests already in flight share one LLM call
+    if settings.SINGLE_FLIGHT_ENABLED:
+        call = generation_flight.do(cache_key, complete)
+    else:
+        call = complete()
+
+    if not settings.LOCAL_FALLBACK_ENABLED:
+        return await call
+
+    try:
+        return await asyncio.wait_for(call, timeout=settings.LLM_SOFT_TIMEOUT_SECONDS)
+    except Exception as e:
+        # LLM slow, overloaded or down: serve a plan from the offline optimizer
+        content = await _local_plan(params)
+        if content is None:
+            raise
+        logger.warning(f"LLM generation failed ({type(e).__name__}: {e}), served local meal plan")
+        _local_counters["fallbacks"] += 1
+        return content, None
+
+
+async def stream_meal_plan(request):
+    """
+    Async generator yielding each validated day of the plan as soon as it is
+    parsed. Days that stream in malformed or never arrive are regenerated
+    once the stream ends. Uses the same cache and concurrency gate as
+    generate_meal_plan.
+    """
+    params = normalize_plan_params(request)
+    prompt = render_prompt(params)
+    model = settings.OPENAI_MODEL
+    cache_key = make_cache_key(prompt, model)
+
+    if settings.PLAN_CACHE_ENABLED:
+        cached_plan = await plan_cache.aget(cache_key)
+        if cached_plan is not None:
+            for day in json.loads(cached_plan):
+                yield day
+            return
+
+    call = CallRecord(model, "stream", params["diet_type"])
+    usage = {}
+    parser = DayStreamParser()
+    days = {}
+    probe = False
+    try:
+        queued = time.perf_counter()
+        async with generation_gate.slot():
+            if settings.CIRCUIT_BREAKER_ENABLED:
+                probe = llm_breaker.allow()
+            started = time.perf_counter()
+            call.queue_wait = started - queued
+            try:
+                stream = get_backend().stream(prompt, model, _response_format(PLAN_RESPONSE_FORMAT), usage)
+                async for delta in stream:
+                    if call.ttft is None:
+                        # Streams are judged on time to first token, not total duration
+                        call.ttft = time.perf_counter() - started
+                        llm_breaker.record(call.ttft, ok=True, kind="stream", probe=probe)
+                        probe = False
+                    for item in parser.feed(delta):
+                        try:
+                            day = validate_day(item)
+                        except PlanValidationError as e:
+                            logger.warning(f"Dropping invalid streamed day: {e}")
+                            _validation_counters["invalid_stream_days"] += 1
+                            call.parse_failure = True
+                            continue
+                        if day["day"] in days:
+                            continue
+                        days[day["day"]] = day
+                        yield day
+                if parser.malformed:
+                    logger.warning(f"Dropped {parser.malformed} malformed streamed day(s)")
+                    _validation_counters["invalid_stream_days"] += parser.malformed
+                    call.parse_failure = True
+            except Exception:
+                if call.ttft is None:
+                    llm_breaker.record(time.perf_counter() - started, ok=False, kind="stream", probe=probe)
+                    probe = False
+                raise
+            finally:
+                call.latency = time.perf_counter() - started
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client went away mid-stream
+        call.status = "cancelled"
+        raise
+    except Exception as e:
+        call.status = "error"
+        call.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        if probe:
+            # Client left before the first token
+            llm_breaker.release(probe)
+        call.set_usage(usage)
+        llm_metrics.record(call)
+
+    if len(days) < PLAN_DAYS:
+        _validation_counters["repaired_plans"] += 1
+        repaired = await _fill_days(params, model, days, settings.PLAN_REPAIR_ATTEMPTS)
+        for day_number in sorted(set(repaired) - set(days)):
+            yield repaired[day_number]
+        days = repaired
+
+    await _cache_plan(cache_key, _dump_plan(days), model)
+
+
+def get_generation_stats() -> dict:
+    """Counters for the meal plan generation pipeline"""
+    return {
+        "cache": plan_cache.stats(),
+        "concurrency": generation_gate.stats(),
+        "singleflight": generation_flight.stats(),
+        "local": dict(_local_counters),
+        "validation": dict(_validation_counters),
+        "circuit": llm_breaker.stats(),
+        "hedge": dict(_hedge_counters),
+        "backend": get_backend().name,
+    }
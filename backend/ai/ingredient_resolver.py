@@ -0,0 +1,252 @@
+"""
+Resolve the free-text ingredient strings of generated meal plans
+("200 g boiled eggs", "Injera (1 piece)") to foods of the cleaned USDA
+table.
+
+Strings are normalized to an alias key (quantities, units and filler words
+dropped) and matched against the food search index. Every resolution, a
+miss included, is memoized under its alias key in an in-process dict backed
+by a SQLite file, so a string seen before resolves with one dict lookup,
+also after a restart. Aliases set by an admin are never overwritten.
+
+Resolved aliases hold fdc_ids of the food table they were matched against:
+the file records that table's fingerprint and forgets them when a new ETL
+run replaces it. Matches against the CSV fallback, whose ids are row
+numbers, are kept in memory only.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from core.config import settings
+from ai.food_search import get_food_catalog, normalize, FIRST_TOKEN_BONUS
+
+logger = logging.getLogger(__name__)
+
+# Matches scoring below this fraction of a perfect match are treated as misses
+MIN_CONFIDENCE = 0.4
+
+_PARENTHESES = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_QUANTITY = re.compile(r"^\d+[a-z]{0,5}$")
+
+# Units, amounts and preparation words that do not identify a food
+IGNORED_WORDS = frozenset("""
+    g gr gram grams kg mg ml l litre liter cup cups tbsp tsp tablespoon tablespoons teaspoon teaspoons
+    oz ounce ounces lb lbs pound pounds slice slices piece pieces pinch dash handful serving servings
+    small medium large half quarter whole of a an the and or with to taste for about approx
+    fresh chopped diced sliced minced optional
+""".split())
+
+
+def alias_key(ingredient: str) -> str:
+    """Normalized form of an ingredient string; equal keys resolve to the same food"""
+    tokens = normalize(_PARENTHESES.sub(" ", ingredient or ""))
+    words = [token for token in tokens if token not in IGNORED_WORDS and not _QUANTITY.match(token)]
+    return " ".join(dict.fromkeys(words))
+
+
+class IngredientResolver:
+    """Alias cache in front of fuzzy matching against the food search index"""
+
+    def __init__(self, catalog=None, path: Optional[str] = None):
+        self.catalog = catalog
+        self.path = path or settings.INGREDIENT_ALIAS_PATH
+        self._aliases = None  # alias key -> (fdc_id, description, confidence, source)
+        self._fingerprint = None  # food table the stored auto aliases were resolved against
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.misses = 0
+        self.unresolved = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with the lock held: the connection is shared by threadpool routes and
+        # to_thread verification, and sqlite3 needs writes on it serialized
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingredient_aliases (
+                    alias TEXT PRIMARY KEY,
+                    fdc_id INTEGER,
+                    description TEXT,
+                    confidence REAL NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS alias_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _load(self) -> dict:
+        # Called with the lock held; the whole table is small enough to keep in memory
+        if self._aliases is None:
+            self._aliases = {}
+            try:
+                rows = self._connection().execute(
+                    "SELECT alias, fdc_id, description, confidence, source FROM ingredient_aliases"
+                ).fetchall()
+                self._aliases = {alias: tuple(entry) for alias, *entry in rows}
+            except sqlite3.Error as e:
+                logger.warning(f"Ingredient alias cache load failed: {e}")
+        return self._aliases
+
+    def _check_table(self, fingerprint: Optional[str]):
+        # Called with the lock held: auto aliases matched against another food table are dropped
+        if fingerprint is None or fingerprint == self._fingerprint:
+            return
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM alias_meta WHERE key = 'food_table'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self._drop("auto")
+                conn.execute("INSERT OR REPLACE INTO alias_meta (key, value) VALUES ('food_table', ?)", (fingerprint,))
+                conn.commit()
+                if row is not None:
+                    logger.info("Food table changed, dropped resolved ingredient aliases")
+        except sqlite3.Error as e:
+            logger.warning(f"Ingredient alias cache check failed: {e}")
+        self._fingerprint = fingerprint
+
+    def _store(self, entries: dict, replace: bool = False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        now = time.time()
+        rows = [(alias, *entry, now) for alias, entry in entries.items()]
+        # One batch and its commit at a time, so a commit never lands mid-way through another thread's batch
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.executemany(
+                    f"{verb} INTO ingredient_aliases (alias, fdc_id, description, confidence, source, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Ingredient alias cache store failed: {e}")
+
+    def _match(self, catalog, key: str) -> tuple:
+        """(fdc_id, description, confidence, "auto") of the best food for an alias key"""
+        if not key:
+            return None, None, 0.0, "auto"
+        # Every word must match when possible, otherwise as many as possible
+        total, hits = catalog.index.search(key + " ", limit=1)
+        if not total:
+            total, hits = catalog.index.search(key + " ", limit=1, require_all=False)
+        if not hits:
+            return None, None, 0.0, "auto"
+        doc, score = hits[0]
+        # Against a perfect match, every word exact plus the leading-word bonus;
+        # the ranking's short-description preference is not a matter of confidence
+        score += float(catalog.index.length_penalty[doc])
+        confidence = min(1.0, max(0.0, score / (len(key.split()) + FIRST_TOKEN_BONUS)))
+        if confidence < MIN_CONFIDENCE:
+            return None, None, round(confidence, 4), "auto"
+        return int(catalog.fdc_ids[doc]), catalog.descriptions[doc], round(confidence, 4), "auto"
+
+    def resolve(self, ingredients: list) -> list:
+        """
+        Resolve a batch of ingredient strings in input order. Each result has
+        the ingredient, its alias key, fdc_id/description (None if unresolved),
+        the match confidence and whether it came from the alias cache.
+        """
+        keys = [alias_key(ingredient) for ingredient in ingredients]
+        catalog = self.catalog or get_food_catalog()
+        with self._lock:
+            aliases = self._load()
+            if catalog is not None:
+                self._check_table(catalog.fingerprint)
+            cached = {key: aliases[key] for key in set(keys) if key in aliases}
+        # Each distinct new string is matched once per batch
+        if catalog is None:
+            matched = {key: (None, None, 0.0, "auto") for key in keys if key not in cached}
+        else:
+            matched = {key: self._match(catalog, key) for key in dict.fromkeys(keys) if key not in cached}
+        # Without a food table nothing is learned, so nothing is remembered
+        if matched and catalog is not None:
+            with self._lock:
+                for key, entry in matched.items():
+                    aliases.setdefault(key, entry)
+            # Row numbers of the CSV fallback are not worth remembering across restarts
+            if catalog.fingerprint is not None:
+                self._store(matched)
+
+        results = []
+        hits = unresolved = 0
+        for ingredient, key in zip(ingredients, keys):
+            fdc_id, description, confidence, source = cached.get(key) or matched[key]
+            from_cache = key in cached
+            hits += from_cache
+            unresolved += fdc_id is None
+            results.append({
+                "ingredient": ingredient,
+                "alias": key,
+                "fdc_id": fdc_id,
+                "description": description,
+                "confidence": confidence,
+                "source": source,
+                "cached": from_cache,
+            })
+        with self._lock:
+            self.hits += hits
+            self.misses += len(ingredients) - hits
+            self.unresolved += unresolved
+        return results
+
+    def set_alias(self, ingredient: str, fdc_id: Optional[int], description: Optional[str] = None) -> str:
+        """Pin an ingredient string to a food (None: never resolve it); returns the alias key"""
+        key = alias_key(ingredient)
+        if not key:
+            raise ValueError("Ingredient has no food words")
+        if fdc_id is not None and description is None:
+            catalog = self.catalog or get_food_catalog()
+            rows = np.flatnonzero(catalog.fdc_ids == fdc_id) if catalog is not None else []
+            if not len(rows):
+                raise ValueError(f"Unknown food {fdc_id}")
+            description = catalog.descriptions[rows[0]]
+        entry = (fdc_id, description, 1.0, "manual")
+        with self._lock:
+            self._load()[key] = entry
+        self._store({key: entry}, replace=True)
+        return key
+
+    def clear(self, source: str = "auto"):
+        """Forget resolved aliases; manual ones stay"""
+        with self._lock:
+            try:
+                self._drop(source)
+                self._connection().commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Ingredient alias cache clear failed: {e}")
+
+    def _drop(self, source: str):
+        # Called with the lock held; the caller commits
+        aliases = self._load()
+        for key in [key for key, entry in aliases.items() if entry[3] == source]:
+            del aliases[key]
+        self._connection().execute("DELETE FROM ingredient_aliases WHERE source = ?", (source,))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "aliases": len(self._aliases or {}),
+            "hits": self.hits,
+            "misses": self.misses,
+            "unresolved": self.unresolved,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global resolver over the shared food catalog
+ingredient_resolver = IngredientResolver()
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database.database import SessionLocal
+from database.models import GenerationJob, MealPlan, MealHistory
+from database.schemas import MealPlanCreate
+from ai.generator import generate_verified_meal_plan
+from ai.concurrency import GenerationOverloaded
+from ai.plan_schema import parse_plan, day_total_calories
+from ai.plan_verifier import verify_plan
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _verify(request: MealPlanCreate, days: list):
+    """PlanVerification of days against the request, None if disabled or unavailable"""
+    if not settings.PLAN_VERIFY_ENABLED:
+        return None
+    targets = {
+        "calories": request.daily_calories,
+        "protein": request.macros.protein,
+        "carbs": request.macros.carbs,
+        "fats": request.macros.fats,
+    }
+    try:
+        return verify_plan(days, targets)
+    except Exception as e:
+        # Verification scores are informational; the plan is saved regardless
+        logger.warning(f"Meal plan verification failed: {e}")
+        return None
+
+
+def _save_plan(db: Session, user_id: int, request: MealPlanCreate, days: list, verification=None) -> int:
+    """Add the MealPlan and one MealHistory row per day; the caller commits"""
+    checked = {day.day: day for day in verification.days} if verification is not None else {}
+    db_meal_plan = MealPlan(
+        user_id=user_id,
+        goal=request.goal,
+        diet_type=request.diet_type,
+        daily_calories=request.daily_calories,
+        macro_protein=request.macros.protein,
+        macro_carbs=request.macros.carbs,
+        macro_fats=request.macros.fats,
+        deviation=verification.deviation if verification is not None else None
+    )
+    db.add(db_meal_plan)
+    db.flush()
+
+    # One small row per day so single-day reads skip the rest of the week
+    db.add_all([
+        MealHistory(
+            mealplan_id=db_meal_plan.id,
+            day_number=day["day"],
+            meals_json=json.dumps(day),
+            total_calories=day_total_calories(day),
+            verified_calories=int(round(checked[day["day"]].calories)) if day["day"] in checked else None,
+            deviation=checked[day["day"]].deviation if day["day"] in checked else None
+        )
+        for day in days
+    ])
+    return db_meal_plan.id
+
+
+def _save_ready_job(db: Session, user_id: int, request: MealPlanCreate, days: list, verification) -> GenerationJob:
+    now = datetime.utcnow()
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        status=JOB_DONE,
+        request_json=request.model_dump_json(),
+        mealplan_id=_save_plan(db, user_id, request, days, verification),
+        started_at=now,
+        finished_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+class MealPlanJobQueue:
+    """
+    Durable meal plan generation queue backed by the generation_jobs table.
+    Requests only insert a pending row; a pool of worker tasks claims rows
+    with a conditional UPDATE (safe across uvicorn processes), runs the LLM
+    call without holding a database session, and writes the plan at the end.
+    Worker database work runs in threads so SQLite I/O never blocks the loop.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        workers: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers if workers is not None else settings.JOB_WORKERS
+        self.poll_interval = poll_interval if poll_interval is not None else settings.JOB_POLL_INTERVAL_SECONDS
+
+        self._wakeup = None
+        self._tasks = []
+
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+
+    def enqueue(self, db: Session, user_id: int, request: MealPlanCreate) -> GenerationJob:
+        """Persist a pending job and wake an idle worker"""
+        job = GenerationJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            status=JOB_PENDING,
+            request_json=request.model_dump_json()
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def record_ready(self, db: Session, user_id: int, request: MealPlanCreate, plan: str) -> GenerationJob:
+        """
+        Save an already generated plan (e.g. from the warm pool) as a job
+        that is done on arrival, so clients poll it like any other job.
+        """
+        days = parse_plan(plan)
+        # Ingredient resolution and alias writes stay off the event loop
+        verification = await asyncio.to_thread(_verify, request, days)
+        job = await asyncio.to_thread(_save_ready_job, db, user_id, request, days, verification)
+        self.completed += 1
+        return job
+
+    async def start(self):
+        """Recover interrupted jobs and start the worker pool"""
+        await asyncio.to_thread(self._requeue_stale)
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"mealplan-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} meal plan job workers")
+
+    async def stop(self):
+        """Cancel the worker pool; running jobs are recovered on next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    def _requeue_stale(self):
+        # Jobs left running by a crashed process go back to the queue. Only
+        # old ones, so a restart does not steal jobs from a live sibling process
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+        with self.session_factory() as db:
+            result = db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.status == JOB_RUNNING, GenerationJob.started_at < cutoff)
+                .values(status=JOB_PENDING)
+            )
+            db.commit()
+            if result.rowcount:
+                logger.warning(f"Requeued {result.rowcount} interrupted meal plan jobs")
+
+    def _claim(self) -> Optional[GenerationJob]:
+        """Atomically move the oldest pending job to running"""
+        with self.session_factory() as db:
+            while True:
+                job_id = db.execute(
+                    select(GenerationJob.id)
+                    .where(GenerationJob.status == JOB_PENDING)
+                    .order_by(GenerationJob.created_at)
+                    .limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+
+                claimed = db.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, GenerationJob.status == JOB_PENDING)
+                    .values(
+                        status=JOB_RUNNING,
+                        started_at=datetime.utcnow(),
+                        attempts=GenerationJob.attempts + 1
+                    )
+                ).rowcount
+                db.commit()
+                if claimed == 1:
+                    job = db.get(GenerationJob, job_id)
+                    db.expunge(job)
+                    return job
+                # Another worker won the race, try the next one
+
+    async def _worker(self):
+        while True:
+            # Cleared before claiming so an enqueue during the claim is not lost
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Failed to claim meal plan job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Keep the worker alive if persisting the result fails
+                logger.error(f"Meal plan job {job.id} could not be completed: {e}")
+                self.failed += 1
+                await asyncio.to_thread(self._finish, job.id, JOB_FAILED, f"Failed to save meal plan: {str(e)}")
+
+    async def _run(self, job: GenerationJob):
+        try:
+            request = MealPlanCreate.model_validate_json(job.request_json)
+            plan, verification = await generate_verified_meal_plan(request)
+            days = parse_plan(plan)
+        except GenerationOverloaded as e:
+            if job.attempts < settings.JOB_MAX_ATTEMPTS:
+                # Capacity problem, not a bad request: put it back and back off
+                self.requeued += 1
+                await asyncio.to_thread(self._finish, job.id, JOB_PENDING)
+                await asyncio.sleep(self.poll_interval)
+            else:
+                self.failed += 1
+                await asyncio.to_thread(self._finish, job.id, JOB_FAILED, str(e))
+            return
+        except Exception as e:
+            logger.error(f"Meal plan job {job.id} failed: {e}")
+            self.failed += 1
+            await asyncio.to_thread(self._finish, job.id, JOB_FAILED, f"Failed to generate meal plan: {str(e)}")
+            return
+
+        if verification is None:
+            # Not verified while generating (cached or local plan)
+            verification = await asyncio.to_thread(_verify, request, days)
+        await asyncio.to_thread(self._complete, job, request, days, verification)
+
+    def _complete(self, job: GenerationJob, request: MealPlanCreate, days: list, verification):
+        # The database session is only held once the plan is ready
+        with self.session_factory() as db:
+            mealplan_id = _save_plan(db, job.user_id, request, days, verification)
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job.id)
+                .values(status=JOB_DONE, mealplan_id=mealplan_id, finished_at=datetime.utcnow())
+            )
+            db.commit()
+        # Counted here: a worker cancelled while waiting on this thread still saved the plan
+        self.completed += 1
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None):
+        values = {"status": status, "error": error}
+        if status != JOB_PENDING:
+            values["finished_at"] = datetime.utcnow()
+        with self.session_factory() as db:
+            db.execute(update(GenerationJob).where(GenerationJob.id == job_id).values(**values))
+            db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "requeued": self.requeued,
+        }
+
+
+# Global job queue instance, started from the app lifespan
+meal_plan_jobs = MealPlanJobQueue()
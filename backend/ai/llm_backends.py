@@ -0,0 +1,289 @@
+import asyncio
+import contextvars
+import json
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, NamedTuple, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from core.config import settings
+
+
+class Completion(NamedTuple):
+    content: Optional[str]
+    usage: Optional[dict] = None  # prompt_tokens / completion_tokens when reported
+    retries: int = 0  # attempts the client retried internally
+
+
+# Highest retry count the OpenAI client sent for the call running in this context
+_retries_taken = contextvars.ContextVar("retries_taken", default=None)
+
+
+async def _track_retries(request: httpx.Request):
+    # The SDK numbers its own retries in this header
+    counter = _retries_taken.get()
+    if counter is not None:
+        counter[0] = max(counter[0], int(request.headers.get("x-stainless-retry-count", "0")))
+
+
+class LLMBackend(ABC):
+    """Interface every chat-completion backend implements"""
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, prompt: str, model: str, response_format: Optional[dict] = None) -> Completion:
+        """response_format is an OpenAI-style json_schema format, or None for free text"""
+
+    @abstractmethod
+    def stream(
+        self, prompt: str, model: str, response_format: Optional[dict] = None, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        """Async iterator over content deltas; token usage is written into usage when given"""
+
+    async def close(self):
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI chat completions over a shared, pooled async client.
+    Point OPENAI_BASE_URL at any OpenAI-compatible server (such as
+    ai/fake_llm_server.py) to run without the real API.
+    """
+
+    name = "openai"
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=30.0
+                ),
+                timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=5.0),
+                event_hooks={"request": [_track_retries]}
+            )
+            self._client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=settings.OPENAI_MAX_RETRIES,
+                http_client=http_client
+            )
+        return self._client
+
+    async def complete(self, prompt: str, model: str, response_format: Optional[dict] = None) -> Completion:
+        extra = {"response_format": response_format} if response_format else {}
+        retries = [0]
+        token = _retries_taken.set(retries)
+        try:
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                **extra
+            )
+        finally:
+            _retries_taken.reset(token)
+        try:
+            content = response.choices[0].message.content
+        except (IndexError, AttributeError) as e:
+            raise RuntimeError("Failed to generate meal plan: invalid response structure") from e
+
+        usage = None
+        if getattr(response, "usage", None) is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+            }
+        return Completion(content, usage, retries[0])
+
+    async def stream(
+        self, prompt: str, model: str, response_format: Optional[dict] = None, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        extra = {"response_format": response_format} if response_format else {}
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            stream_options={"include_usage": True},
+            **extra
+        )
+        async for chunk in stream:
+            # The final chunk carries usage and no choices
+            if getattr(chunk, "usage", None) is not None and usage is not None:
+                usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                usage["completion_tokens"] = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# ----------- FAKE BACKEND -----------
+
+_DISHES = [
+    ("Firfir with scrambled eggs", ["injera", "eggs", "berbere", "onion"]),
+    ("Shiro wat with injera", ["chickpea flour", "injera", "garlic", "tomato"]),
+    ("Misir wat with rice", ["red lentils", "rice", "berbere", "onion"]),
+    ("Doro wat", ["chicken", "boiled egg", "onion", "niter kibbeh"]),
+    ("Grilled tilapia with greens", ["tilapia", "collard greens", "lemon", "garlic"]),
+    ("Genfo porridge", ["barley flour", "niter kibbeh", "berbere"]),
+    ("Gomen with kitfo", ["collard greens", "lean beef", "mitmita"]),
+    ("Atakilt wat with teff", ["cabbage", "carrot", "potato", "teff"]),
+    ("Tibs with vegetables", ["beef", "onion", "green pepper", "rosemary"]),
+]
+_SNACKS = ["Roasted chickpeas (kolo)", "Banana", "Yogurt with honey", "Peanuts", "Mango slices", "Boiled egg"]
+
+
+def _canned_day(day: int, daily_calories: int, rng: random.Random) -> dict:
+    meal_calories = [round(daily_calories * share) for share in (0.25, 0.30, 0.30)]
+    snack_calories = round(daily_calories * 0.075)
+    dishes = rng.sample(_DISHES, 3)
+    snacks = rng.sample(_SNACKS, 2)
+    return {
+        "day": day,
+        "meals": [
+            {"name": name, "calories": calories, "ingredients": ingredients}
+            for (name, ingredients), calories in zip(dishes, meal_calories)
+        ],
+        "snacks": [{"name": name, "calories": snack_calories} for name in snacks],
+        "total_calories": sum(meal_calories) + 2 * snack_calories,
+    }
+
+
+def canned_completion(prompt: str, rng: Optional[random.Random] = None, response_format: Optional[dict] = None) -> str:
+    """
+    Plan JSON shaped like a real answer to PROMPT_TEMPLATE / DAY_PROMPT_TEMPLATE.
+    With the structured-output plan schema the week is wrapped in {"days": [...]}.
+    """
+    rng = rng or random.Random()
+    calories_match = re.search(r"Daily Calories:\s*(\d+)", prompt)
+    daily_calories = int(calories_match.group(1)) if calories_match else 2000
+
+    day_match = re.search(r"day (\d+) of a 7-day", prompt)
+    if day_match:
+        return json.dumps(_canned_day(int(day_match.group(1)), daily_calories, rng))
+    days = [_canned_day(day, daily_calories, rng) for day in range(1, 8)]
+    if (response_format or {}).get("json_schema", {}).get("name") == "meal_plan":
+        return json.dumps({"days": days})
+    return json.dumps(days)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeCompletionModel:
+    """
+    Latency/error simulator shared by FakeBackend and the fake HTTP server.
+    Latency specs: "fixed:0.5", "uniform:0.2,1.5" or "lognormal:1.0,0.5"
+    (median seconds, sigma) for time to first token; completion tokens then
+    arrive at tokens_per_second.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[str] = None,
+        tokens_per_second: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency or settings.FAKE_LLM_LATENCY
+        self.tokens_per_second = tokens_per_second if tokens_per_second is not None else settings.FAKE_LLM_TOKENS_PER_SECOND
+        self.error_rate = error_rate if error_rate is not None else settings.FAKE_LLM_ERROR_RATE
+        self.rng = random.Random(seed)
+
+    def first_token_delay(self) -> float:
+        kind, _, args = self.latency.partition(":")
+        try:
+            values = [float(v) for v in args.split(",") if v]
+            if kind == "fixed":
+                return values[0] if values else 0.0
+            if kind == "uniform":
+                return self.rng.uniform(values[0], values[1])
+            if kind == "lognormal":
+                median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+                return self.rng.lognormvariate(0.0, sigma) * median
+        except (ValueError, IndexError):
+            raise ValueError(f"Invalid latency spec: {self.latency}")
+        raise ValueError(f"Unknown latency distribution: {self.latency}")
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def should_fail(self) -> bool:
+        return self.rng.random() < self.error_rate
+
+
+class FakeBackend(LLMBackend):
+    """In-process stand-in that returns canned plans with simulated latency"""
+
+    name = "fake"
+
+    def __init__(self, model: Optional[FakeCompletionModel] = None):
+        self.model = model or FakeCompletionModel()
+
+    async def complete(self, prompt: str, model: str, response_format: Optional[dict] = None) -> Completion:
+        if self.model.should_fail():
+            await asyncio.sleep(self.model.first_token_delay())
+            raise RuntimeError("Fake LLM backend injected an error")
+        content = canned_completion(prompt, self.model.rng, response_format)
+        tokens = estimate_tokens(content)
+        await asyncio.sleep(self.model.first_token_delay() + tokens * self.model.token_delay())
+        return Completion(content, {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": tokens})
+
+    async def stream(
+        self, prompt: str, model: str, response_format: Optional[dict] = None, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        await asyncio.sleep(self.model.first_token_delay())
+        if self.model.should_fail():
+            raise RuntimeError("Fake LLM backend injected an error")
+        content = canned_completion(prompt, self.model.rng, response_format)
+        if usage is not None:
+            usage["prompt_tokens"] = estimate_tokens(prompt)
+            usage["completion_tokens"] = estimate_tokens(content)
+        for i in range(0, len(content), 4):
+            await asyncio.sleep(self.model.token_delay())
+            yield content[i:i + 4]
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "fake": FakeBackend,
+}
+
+_backend = None
+
+
+def get_backend() -> LLMBackend:
+    """Shared backend instance selected by LLM_BACKEND"""
+    global _backend
+    if _backend is None:
+        try:
+            backend_class = BACKENDS[settings.LLM_BACKEND]
+        except KeyError:
+            raise RuntimeError(f"Unknown LLM_BACKEND '{settings.LLM_BACKEND}', expected one of {sorted(BACKENDS)}")
+        _backend = backend_class()
+    return _backend
+
+
+async def close_backend():
+    """Close pooled connections on shutdown"""
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
@@ -0,0 +1,281 @@
+import asyncio
+import bisect
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from core.config import settings
+from database.database import SessionLocal
+from database.models import LLMCall
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds, Prometheus style
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 120.0)
+
+# Free-text diet types beyond this many distinct values are reported as "other"
+MAX_DIET_LABELS = 50
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost of a call from LLM_PRICING, 0 for models without a price"""
+    price = settings.LLM_PRICING.get(model)
+    if not price:
+        return 0.0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with percentile estimates"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the pct-th observation"""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class CallRecord:
+    """Measurements for one LLM call, filled in along the call path"""
+
+    def __init__(self, model: str, kind: str, diet_type: Optional[str] = None):
+        self.model = model
+        self.kind = kind
+        self.diet_type = diet_type
+        self.created_at = datetime.utcnow()
+        self.status = "ok"
+        self.queue_wait = 0.0
+        self.ttft = None
+        self.latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.parse_failure = False
+        self.error = None
+
+    def set_usage(self, usage: Optional[dict]):
+        if usage:
+            self.prompt_tokens = usage.get("prompt_tokens") or 0
+            self.completion_tokens = usage.get("completion_tokens") or 0
+
+    @property
+    def cost(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.completion_tokens)
+
+
+class _Series:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.parse_failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.queue_wait = Histogram()
+        self.ttft = Histogram()
+        self.latency = Histogram()
+
+
+class LLMMetrics:
+    """
+    In-process aggregates of LLM calls, tagged by model, kind and diet type,
+    plus a buffered writer that stores every call in the llm_calls table for
+    ad-hoc capacity planning queries. Batches filled on the event loop are
+    written from a worker thread; flush() waits for them.
+    """
+
+    def __init__(self, session_factory=SessionLocal, persist: Optional[bool] = None, flush_size: Optional[int] = None):
+        self.session_factory = session_factory
+        self.persist = persist if persist is not None else settings.LLM_METRICS_PERSIST
+        self.flush_size = flush_size if flush_size is not None else settings.LLM_METRICS_FLUSH_SIZE
+
+        self._series = {}   # (model, kind, diet_type) -> _Series
+        self._pending = []  # CallRecords not yet written
+        self._writing = 0   # batches handed to worker threads
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+
+    def _diet_label(self, diet_type: Optional[str]) -> str:
+        label = diet_type or "unknown"
+        known = {key[2] for key in self._series}
+        if label not in known and len(known) >= MAX_DIET_LABELS:
+            return "other"
+        return label
+
+    def record(self, call: CallRecord):
+        with self._lock:
+            key = (call.model, call.kind, self._diet_label(call.diet_type))
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+
+            series.calls += 1
+            series.errors += call.status == "error"
+            series.retries += call.retries
+            series.parse_failures += call.parse_failure
+            series.prompt_tokens += call.prompt_tokens
+            series.completion_tokens += call.completion_tokens
+            series.cost += call.cost
+            series.queue_wait.observe(call.queue_wait)
+            if call.ttft is not None:
+                series.ttft.observe(call.ttft)
+            if call.status == "ok":
+                series.latency.observe(call.latency)
+
+            if not self.persist:
+                return
+            self._pending.append(call)
+            if len(self._pending) < self.flush_size:
+                return
+            pending, self._pending = self._pending, []
+            self._writing += 1
+
+        try:
+            # The batch INSERT and commit must not block the event loop
+            asyncio.get_running_loop().run_in_executor(None, self._write_batch, pending)
+        except RuntimeError:
+            # No running loop (or its executor is shut down): write here
+            self._write_batch(pending)
+
+    def flush(self):
+        """Write buffered call rows now (before queries and on shutdown)"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._written.wait_for(lambda: self._writing == 0)
+        if pending:
+            self._write(pending)
+
+    def _write_batch(self, calls: list):
+        try:
+            self._write(calls)
+        finally:
+            with self._lock:
+                self._writing -= 1
+                self._written.notify_all()
+
+    def _write(self, calls: list):
+        try:
+            with self.session_factory() as db:
+                db.add_all([
+                    LLMCall(
+                        created_at=call.created_at,
+                        model=call.model,
+                        kind=call.kind,
+                        diet_type=call.diet_type,
+                        status=call.status,
+                        queue_wait_ms=call.queue_wait * 1000,
+                        ttft_ms=call.ttft * 1000 if call.ttft is not None else None,
+                        latency_ms=call.latency * 1000,
+                        prompt_tokens=call.prompt_tokens,
+                        completion_tokens=call.completion_tokens,
+                        cost_usd=call.cost,
+                        retries=call.retries,
+                        parse_failure=call.parse_failure,
+                        error=call.error
+                    )
+                    for call in calls
+                ])
+                db.commit()
+        except Exception as e:
+            # Metrics must never break generation
+            logger.error(f"Failed to store {len(calls)} LLM call records: {e}")
+
+    def snapshot(self) -> list:
+        """One entry per (model, kind, diet_type) series"""
+        with self._lock:
+            return [
+                {
+                    "model": model,
+                    "kind": kind,
+                    "diet_type": diet_type,
+                    "calls": series.calls,
+                    "errors": series.errors,
+                    "retries": series.retries,
+                    "parse_failures": series.parse_failures,
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "cost_usd": round(series.cost, 6),
+                    "queue_wait_seconds": series.queue_wait.snapshot(),
+                    "time_to_first_token_seconds": series.ttft.snapshot(),
+                    "latency_seconds": series.latency.snapshot(),
+                }
+                for (model, kind, diet_type), series in sorted(self._series.items())
+            ]
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition of the aggregates"""
+        lines = []
+        counters = [
+            ("llm_calls_total", "LLM calls", "calls"),
+            ("llm_errors_total", "LLM calls that failed", "errors"),
+            ("llm_retries_total", "Client retries and hedged attempts", "retries"),
+            ("llm_parse_failures_total", "Completions that could not be parsed", "parse_failures"),
+            ("llm_prompt_tokens_total", "Prompt tokens", "prompt_tokens"),
+            ("llm_completion_tokens_total", "Completion tokens", "completion_tokens"),
+            ("llm_cost_usd_total", "Estimated cost in USD", "cost"),
+        ]
+        histograms = [
+            ("llm_queue_wait_seconds", "Time waiting for a concurrency slot", "queue_wait"),
+            ("llm_time_to_first_token_seconds", "Time to first streamed token", "ttft"),
+            ("llm_latency_seconds", "Backend call latency of successful calls", "latency"),
+        ]
+
+        with self._lock:
+            items = sorted(self._series.items())
+            for name, help_text, attr in counters:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for key, series in items:
+                    lines.append(f"{name}{{{_labels(key)}}} {getattr(series, attr)}")
+            for name, help_text, attr in histograms:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, series in items:
+                    histogram = getattr(series, attr)
+                    labels = _labels(key)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: tuple) -> str:
+    model, kind, diet_type = key
+    escape = lambda value: value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'model="{escape(model)}",kind="{escape(kind)}",diet_type="{escape(diet_type)}"'
+
+
+# Global metrics for every LLM call in this process
+llm_metrics = LLMMetrics()
@@ -0,0 +1,269 @@
+import csv
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+
+from core.config import settings
+from ai.plan_schema import PLAN_DAYS
+from ai.food_table import FOOD_TABLE_EXTENSION, NutrientView, get_food_table
+
+logger = logging.getLogger(__name__)
+
+# Column order of the nutrient matrix (per 100 g, as written by clean_data.py)
+CALORIES, PROTEIN, FAT, CARBS = 0, 1, 2, 3
+NUTRIENT_COLUMNS = ["calories", "protein", "fat", "carbs"]
+
+# kcal per gram of protein, fat and carbs
+ENERGY_PER_GRAM = np.array([4.0, 9.0, 4.0], dtype=np.float32)
+
+# Share of the daily calories for each slot of the PROMPT_TEMPLATE schema
+MEAL_SHARES = [0.25, 0.30, 0.30]
+SNACK_SHARES = [0.075, 0.075]
+
+# Foods excluded per diet type, matched against the lower-cased description
+MEAT_WORDS = [
+    "beef", "pork", "chicken", "turkey", "lamb", "mutton", "goat", "veal", "bacon", "ham,",
+    "sausage", "salami", "fish", "tuna", "salmon", "sardine", "tilapia", "shrimp", "crab",
+    "lobster", "meat", "liver", "gelatin",
+]
+ANIMAL_WORDS = MEAT_WORDS + ["milk", "cheese", "yogurt", "butter", "cream", "egg", "whey", "honey", "ghee"]
+DIET_EXCLUSIONS = {
+    "vegan": ANIMAL_WORDS,
+    "vegetarian": MEAT_WORDS,
+    "pescatarian": [w for w in MEAT_WORDS if w not in ("fish", "tuna", "salmon", "sardine", "tilapia", "shrimp", "crab", "lobster")],
+}
+
+# Words that negate the diet named right after them ("non-vegetarian", "no vegan")
+DIET_NEGATIONS = ("non", "not", "no")
+
+CANDIDATES_PER_SLOT = 64
+POOL_SIZE = 400
+MIN_PORTION_GRAMS = 15.0
+MAX_PORTION_GRAMS = 450.0
+
+
+def diet_key(diet_type: Optional[str]) -> str:
+    """
+    The DIET_EXCLUSIONS entry a free-text diet type falls under, "" for none.
+    Diets match whole words only, so "non-vegetarian" is not vegetarian.
+    """
+    words = re.findall(r"[a-z]+", (diet_type or "").lower())
+    for position, word in enumerate(words):
+        if word in DIET_EXCLUSIONS and (position == 0 or words[position - 1] not in DIET_NEGATIONS):
+            return word
+    return ""
+
+
+def load_food_csv(path: str):
+    """Load final_ingredients.csv into a description list and a float32 nutrient matrix"""
+    descriptions = []
+    rows = []
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.DictReader(f)
+        for record in reader:
+            try:
+                rows.append([float(record[column] or 0) for column in NUTRIENT_COLUMNS])
+            except (KeyError, ValueError):
+                continue
+            descriptions.append(record.get("description") or "")
+    return descriptions, np.asarray(rows, dtype=np.float32).reshape(-1, len(NUTRIENT_COLUMNS))
+
+
+def load_foods(path: str):
+    """
+    Load the food table for path, preferring the memory-mapped .foodtable
+    artifact written next to the CSV by clean_data.py over parsing the CSV.
+    From the artifact, descriptions and nutrients are views over the shared
+    table (see get_food_table), not copies. Returns None if neither exists.
+    """
+    table_path = os.path.splitext(path)[0] + FOOD_TABLE_EXTENSION
+    if os.path.exists(table_path):
+        try:
+            table = get_food_table(table_path)
+            if table is not None:
+                return table.description_view(), table.nutrient_view(NUTRIENT_COLUMNS)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable food table {table_path}: {e}")
+    if os.path.exists(path):
+        return load_food_csv(path)
+    return None
+
+
+def _short_name(description: str) -> str:
+    return description.split(",")[0].strip().title()
+
+
+class LocalPlanner:
+    """
+    Offline meal plan engine over the cleaned USDA ingredient table.
+    Each meal combines a protein, a carb and a fat source; candidate
+    combinations are scored in one vectorized pass (portion solve plus
+    macro error) and the best one is taken greedily, slot by slot.
+    """
+
+    def __init__(self, descriptions, nutrients):
+        # Only plausible foods are ever picked, so only they are copied out of
+        # the table; planner indices are positions in that subset
+        if not isinstance(nutrients, NutrientView):
+            nutrients = np.asarray(nutrients, dtype=np.float32).reshape(-1, len(NUTRIENT_COLUMNS))
+        calories = nutrients[:, CALORIES]
+        macro_kcal = sum(nutrients[:, column] * energy for column, energy in zip((PROTEIN, FAT, CARBS), ENERGY_PER_GRAM))
+        # Drop rows whose label calories disagree with their macros
+        plausible = (
+            (calories > 5) & (calories < 900) & (macro_kcal > 0)
+            & (np.abs(macro_kcal - calories) <= 0.35 * calories + 10)
+        )
+        self.rows = np.flatnonzero(plausible)
+        self.descriptions = descriptions
+        self.nutrients = np.asarray(nutrients[self.rows], dtype=np.float32).reshape(-1, len(NUTRIENT_COLUMNS))
+
+        macro_energy = self.nutrients[:, [PROTEIN, FAT, CARBS]] * ENERGY_PER_GRAM
+        macro_kcal = macro_energy.sum(axis=1)
+        # Energy fractions (protein, fat, carbs) per food
+        self.fractions = np.divide(
+            macro_energy, macro_kcal[:, None],
+            out=np.zeros_like(macro_energy), where=macro_kcal[:, None] > 0
+        )
+        self._lowered = [descriptions[row].lower() for row in self.rows]
+        # Prefer short, generic descriptions over long branded ones
+        lengths = np.fromiter((len(d) for d in self._lowered), dtype=np.float32, count=len(self._lowered))
+        self.quality = 1.0 / (1.0 + lengths / 40.0)
+        self.valid = np.ones(len(self.rows), dtype=bool)
+        self._pools = {}
+
+    def _description(self, food: int) -> str:
+        return self.descriptions[self.rows[food]]
+
+    def _allowed(self, diet_type: str) -> np.ndarray:
+        diet = diet_key(diet_type)
+        if not diet:
+            return self.valid
+        excluded = DIET_EXCLUSIONS[diet]
+        mask = np.fromiter(
+            (not any(word in text for word in excluded) for text in self._lowered),
+            dtype=bool, count=len(self._lowered)
+        )
+        return self.valid & mask
+
+    def _macro_pools(self, diet_type: str) -> list:
+        """Indices of the best protein, fat and carb sources for a diet"""
+        if diet_type in self._pools:
+            return self._pools[diet_type]
+
+        allowed = self._allowed(diet_type)
+        pools = []
+        for macro in range(3):
+            score = np.where(allowed, self.fractions[:, macro] * self.quality, -1.0)
+            top = np.argsort(score)[::-1][:POOL_SIZE]
+            pools.append(top[score[top] > 0])
+        pools.append(np.flatnonzero(allowed))
+        self._pools[diet_type] = pools
+        return pools
+
+    def _pick_meal(self, rng, pools, target_kcal, target_fractions, used):
+        # Sample candidate (protein, fat, carb) food triples
+        picks = []
+        for pool in pools[:3]:
+            fresh = pool[~np.isin(pool, used)] if used else pool
+            picks.append(rng.choice(fresh if len(fresh) else pool, size=CANDIDATES_PER_SLOT))
+        triples = np.stack(picks, axis=1)  # (candidates, 3 foods)
+
+        # Solve grams so the macro grams of the meal hit the target
+        target_grams = target_kcal * target_fractions / ENERGY_PER_GRAM
+        per_gram = self.nutrients[triples][:, :, [PROTEIN, FAT, CARBS]] / 100.0  # (candidates, food, macro)
+        A = np.transpose(per_gram, (0, 2, 1))
+        grams = np.einsum("nij,j->ni", np.linalg.pinv(A), target_grams)
+        grams = np.clip(grams, MIN_PORTION_GRAMS, MAX_PORTION_GRAMS)
+
+        # Rescale portions to hit the calorie target exactly
+        kcal_per_gram = self.nutrients[triples][:, :, CALORIES] / 100.0
+        kcal = (kcal_per_gram * grams).sum(axis=1)
+        grams *= (target_kcal / np.maximum(kcal, 1e-6))[:, None]
+
+        achieved = np.einsum("nfm,nf->nm", per_gram, grams) * ENERGY_PER_GRAM
+        achieved_fractions = achieved / np.maximum(achieved.sum(axis=1, keepdims=True), 1e-6)
+        error = np.abs(achieved_fractions - target_fractions).sum(axis=1)
+        # Penalize extreme portions after rescaling
+        error += 0.002 * np.clip(grams - MAX_PORTION_GRAMS, 0, None).sum(axis=1)
+
+        best = int(np.argmin(error))
+        return triples[best], grams[best]
+
+    def _pick_snack(self, rng, pools, target_kcal, target_fractions, used):
+        pool = pools[3]
+        candidates = rng.choice(pool, size=CANDIDATES_PER_SLOT)
+        error = np.abs(self.fractions[candidates] - target_fractions).sum(axis=1)
+        error -= 0.2 * self.quality[candidates]
+        error[np.isin(candidates, used)] += 1.0
+        best = int(candidates[int(np.argmin(error))])
+        grams = target_kcal / max(self.nutrients[best, CALORIES] / 100.0, 1e-6)
+        return best, grams
+
+    def generate(self, params: dict, seed: Optional[int] = None) -> list:
+        """Build a 7-day plan in the PROMPT_TEMPLATE JSON schema"""
+        rng = np.random.default_rng(seed)
+        pools = self._macro_pools(params["diet_type"])
+        if any(len(pool) == 0 for pool in pools):
+            raise RuntimeError(f"No foods available for diet type '{params['diet_type']}'")
+
+        split = np.array([params["protein"], params["fats"], params["carbs"]], dtype=np.float32)
+        target_fractions = split / split.sum() if split.sum() > 0 else np.full(3, 1 / 3, dtype=np.float32)
+        daily_calories = float(params["calories"])
+
+        plan = []
+        for day in range(1, PLAN_DAYS + 1):
+            used = []
+            meals = []
+            for share in MEAL_SHARES:
+                foods, grams = self._pick_meal(rng, pools, daily_calories * share, target_fractions, used)
+                used.extend(int(food) for food in foods)
+                order = np.argsort(grams)[::-1]
+                names = [_short_name(self._description(foods[i])) for i in order]
+                calories = float((self.nutrients[foods, CALORIES] / 100.0 * grams).sum())
+                meals.append({
+                    "name": f"{names[0]} with {names[1]} and {names[2]}",
+                    "calories": int(round(calories)),
+                    "ingredients": [f"{int(round(grams[i]))} g {self._description(foods[i])}" for i in order],
+                })
+
+            snacks = []
+            for share in SNACK_SHARES:
+                food, grams = self._pick_snack(rng, pools, daily_calories * share, target_fractions, used)
+                used.append(food)
+                snacks.append({
+                    "name": f"{int(round(grams))} g {_short_name(self._description(food))}",
+                    "calories": int(round(self.nutrients[food, CALORIES] / 100.0 * grams)),
+                })
+
+            plan.append({
+                "day": day,
+                "meals": meals,
+                "snacks": snacks,
+                "total_calories": sum(item["calories"] for item in meals + snacks),
+            })
+        return plan
+
+
+_planner = None
+_planner_lock = threading.Lock()
+
+
+def get_local_planner() -> Optional[LocalPlanner]:
+    """Lazily load the shared planner; None if the food table is missing"""
+    global _planner
+    if _planner is None:
+        with _planner_lock:
+            if _planner is None:
+                path = settings.FOOD_TABLE_PATH
+                foods = load_foods(path)
+                if foods is None:
+                    logger.warning(f"Food table {path} not found, local meal planner unavailable")
+                    return None
+                descriptions, nutrients = foods
+                _planner = LocalPlanner(descriptions, nutrients)
+                logger.info(f"Loaded {len(descriptions)} foods for the local meal planner")
+    return _planner
@@ -0,0 +1,86 @@
+"""
+Nutrient catalogue for the USDA ETL (ai/clean_data.py): which FoodData
+Central nutrient ids are extracted, the column each one becomes and its
+unit. Amounts are per 100 g, as USDA reports them.
+
+clean_data.py uses DEFAULT_CATALOGUE unless pointed at a JSON file:
+
+    [{"id": 1079, "name": "fiber", "unit": "g", "label": "Fiber, total dietary"}, ...]
+"""
+import json
+from typing import NamedTuple, Optional
+
+
+class Nutrient(NamedTuple):
+    id: int      # FoodData Central nutrient id
+    name: str    # output column name
+    unit: str
+    label: str
+
+
+# The planner and the food table loaders rely on these
+MACRO_COLUMNS = ("calories", "protein", "fat", "carbs")
+
+DEFAULT_CATALOGUE = (
+    Nutrient(1008, "calories", "kcal", "Energy"),
+    Nutrient(1003, "protein", "g", "Protein"),
+    Nutrient(1004, "fat", "g", "Total lipid (fat)"),
+    Nutrient(1005, "carbs", "g", "Carbohydrate, by difference"),
+    Nutrient(1079, "fiber", "g", "Fiber, total dietary"),
+    Nutrient(2000, "sugars", "g", "Sugars, total"),
+    Nutrient(1258, "saturated_fat", "g", "Fatty acids, total saturated"),
+    Nutrient(1292, "monounsaturated_fat", "g", "Fatty acids, total monounsaturated"),
+    Nutrient(1293, "polyunsaturated_fat", "g", "Fatty acids, total polyunsaturated"),
+    Nutrient(1257, "trans_fat", "g", "Fatty acids, total trans"),
+    Nutrient(1253, "cholesterol", "mg", "Cholesterol"),
+    Nutrient(1093, "sodium", "mg", "Sodium, Na"),
+    Nutrient(1092, "potassium", "mg", "Potassium, K"),
+    Nutrient(1087, "calcium", "mg", "Calcium, Ca"),
+    Nutrient(1089, "iron", "mg", "Iron, Fe"),
+    Nutrient(1090, "magnesium", "mg", "Magnesium, Mg"),
+    Nutrient(1091, "phosphorus", "mg", "Phosphorus, P"),
+    Nutrient(1095, "zinc", "mg", "Zinc, Zn"),
+    Nutrient(1098, "copper", "mg", "Copper, Cu"),
+    Nutrient(1103, "selenium", "ug", "Selenium, Se"),
+    Nutrient(1106, "vitamin_a", "ug", "Vitamin A, RAE"),
+    Nutrient(1162, "vitamin_c", "mg", "Vitamin C, total ascorbic acid"),
+    Nutrient(1114, "vitamin_d", "ug", "Vitamin D (D2 + D3)"),
+    Nutrient(1109, "vitamin_e", "mg", "Vitamin E (alpha-tocopherol)"),
+    Nutrient(1185, "vitamin_k", "ug", "Vitamin K (phylloquinone)"),
+    Nutrient(1165, "thiamin", "mg", "Thiamin"),
+    Nutrient(1166, "riboflavin", "mg", "Riboflavin"),
+    Nutrient(1167, "niacin", "mg", "Niacin"),
+    Nutrient(1175, "vitamin_b6", "mg", "Vitamin B-6"),
+    Nutrient(1190, "folate", "ug", "Folate, DFE"),
+    Nutrient(1178, "vitamin_b12", "ug", "Vitamin B-12"),
+    Nutrient(1180, "choline", "mg", "Choline, total"),
+)
+
+
+def validate_catalogue(catalogue) -> tuple:
+    """Return the catalogue as a tuple, raising ValueError if it is unusable"""
+    catalogue = tuple(catalogue)
+    ids = [nutrient.id for nutrient in catalogue]
+    names = [nutrient.name for nutrient in catalogue]
+    if len(set(ids)) != len(ids) or len(set(names)) != len(names):
+        raise ValueError("Nutrient ids and names must be unique")
+    if any(nutrient_id < 0 for nutrient_id in ids):
+        raise ValueError("Nutrient ids must be positive")
+    if {"fdc_id", "description"} & set(names):
+        raise ValueError("fdc_id and description are reserved column names")
+    missing = [name for name in MACRO_COLUMNS if name not in names]
+    if missing:
+        raise ValueError(f"Catalogue is missing required nutrients: {', '.join(missing)}")
+    return catalogue
+
+
+def load_catalogue(path: Optional[str] = None) -> tuple:
+    """DEFAULT_CATALOGUE, or the catalogue in a JSON file"""
+    if not path:
+        return DEFAULT_CATALOGUE
+    with open(path) as f:
+        entries = json.load(f)
+    return validate_catalogue(
+        Nutrient(int(entry["id"]), entry["name"], entry.get("unit", ""), entry.get("label", entry["name"]))
+        for entry in entries
+    )
@@ -1,19 +1,160 @@
-def generate_meal_plan_pdf(meal_plan_data: dict, filename: str = "meal_plan.pdf") -> str:
-    """
-    Generate a PDF version of the meal plan.
-    This is a placeholder implementation.
-    In a real implementation, this would use reportlab or similar library to create a PDF.
-    """
-    # In a real implementation, this would create an actual PDF
-    # For now, we'll just return a mock path
-    import os
-    mock_pdf_path = f"mock_pdfs/{filename}"
-    
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(mock_pdf_path), exist_ok=True)
-    
-    # Create a mock PDF file
-    with open(mock_pdf_path, 'w') as f:
-        f.write("This is a mock PDF file for the meal plan")
-    
-    return mock_pdf_path
\ No newline at end of file
+"""
+PDF export of stored meal plans.
+
+Plans are rendered with reportlab into a spooled buffer (in memory up to
+SPOOL_MAX_BYTES) and kept on disk under PDF_CACHE_DIR, named by mealplan id
+and a hash of everything that goes into the document. The hash doubles as
+the ETag, so a repeat download is a conditional 304 or a file send, never
+a re-render; a changed plan gets a new hash and the old file is removed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from core.config import settings
+
+# Bump when the layout changes so cached files are rendered again
+RENDERER_VERSION = 1
+SPOOL_MAX_BYTES = 1 << 20
+
+
+def plan_content_hash(plan: dict, days: list) -> str:
+    """Hash of the plan fields and days a PDF is rendered from"""
+    payload = json.dumps([RENDERER_VERSION, plan, days], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _text(value) -> str:
+    return escape(str(value))
+
+
+def render_meal_plan_pdf(plan: dict, days: list, out):
+    """Write the PDF of a plan (MealPlan fields) and its day objects to a binary file object"""
+    styles = getSampleStyleSheet()
+    cell = styles["BodyText"]
+    # invariant drops the timestamp and random file id, so equal plans give equal bytes
+    doc = SimpleDocTemplate(
+        out, pagesize=A4, invariant=True, title=f"Meal plan {plan['id']}",
+        leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm
+    )
+    story = [
+        Paragraph("7-Day Meal Plan", styles["Title"]),
+        Paragraph(
+            f"Goal: {_text(plan['goal'])} &middot; Diet: {_text(plan['diet_type'])} &middot; "
+            f"{plan['daily_calories']} kcal/day &middot; Protein {plan['macro_protein']}% / "
+            f"Carbs {plan['macro_carbs']}% / Fats {plan['macro_fats']}%",
+            styles["Normal"]
+        ),
+        Spacer(1, 6 * mm),
+    ]
+
+    for day in days:
+        if not isinstance(day, dict) or "meals" not in day:
+            # Legacy rows hold the raw model output
+            story += [Paragraph(_text(day), cell), Spacer(1, 4 * mm)]
+            continue
+        story.append(Paragraph(f"Day {day.get('day', '')} &middot; {day.get('total_calories', '')} kcal", styles["Heading2"]))
+        rows = [["", "Dish", "kcal", "Ingredients"]]
+        for index, meal in enumerate(day.get("meals", [])):
+            ingredients = ", ".join(meal.get("ingredients", []))
+            rows.append([f"Meal {index + 1}", Paragraph(_text(meal["name"]), cell), meal["calories"], Paragraph(_text(ingredients), cell)])
+        for snack in day.get("snacks", []):
+            rows.append(["Snack", Paragraph(_text(snack["name"]), cell), snack["calories"], ""])
+        table = Table(rows, colWidths=[18 * mm, 62 * mm, 14 * mm, 86 * mm], repeatRows=1)
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2e7d32")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f1f8e9")]),
+        ]))
+        story += [table, Spacer(1, 5 * mm)]
+
+    doc.build(story)
+
+
+class PdfCache:
+    """Rendered plan PDFs on disk, one current file per mealplan id"""
+
+    def __init__(self, directory: Optional[str] = None, max_files: Optional[int] = None):
+        self.directory = directory or settings.PDF_CACHE_DIR
+        self.max_files = max_files if max_files is not None else settings.PDF_CACHE_MAX_FILES
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.renders = 0
+
+    def path_for(self, mealplan_id: int, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{mealplan_id}-{content_hash[:32]}.pdf")
+
+    def lookup(self, mealplan_id: int, content_hash: str) -> Optional[str]:
+        """Path of the cached PDF, None if it has not been rendered"""
+        path = self.path_for(mealplan_id, content_hash)
+        if not os.path.exists(path):
+            return None
+        self.hits += 1
+        return path
+
+    def get_or_render(self, plan: dict, days: list, content_hash: Optional[str] = None) -> str:
+        """Path of the cached PDF for the plan, rendering it first on a miss"""
+        content_hash = content_hash or plan_content_hash(plan, days)
+        path = self.lookup(plan["id"], content_hash)
+        if path is not None:
+            return path
+        path = self.path_for(plan["id"], content_hash)
+
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buffer:
+            render_meal_plan_pdf(plan, days, buffer)
+            buffer.seek(0)
+            # Written beside the final name and renamed, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                while chunk := buffer.read(1 << 16):
+                    f.write(chunk)
+        os.replace(tmp_path, path)
+        self.renders += 1
+        self._prune(plan["id"], keep=path)
+        return path
+
+    def invalidate(self, mealplan_id: int):
+        """Remove every cached PDF of a plan"""
+        self._prune(mealplan_id, keep=None)
+
+    def _prune(self, mealplan_id: int, keep: Optional[str]):
+        with self._lock:
+            try:
+                names = [name for name in os.listdir(self.directory) if name.endswith(".pdf")]
+            except FileNotFoundError:
+                return
+            paths = [os.path.join(self.directory, name) for name in names]
+            # Older renders of this plan are stale
+            stale = [path for path in paths if os.path.basename(path).startswith(f"{mealplan_id}-") and path != keep]
+            current = [path for path in paths if path not in stale]
+            # Over the limit, the least recently written files go first
+            if len(current) > self.max_files:
+                current.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+                stale += [path for path in current[:len(current) - self.max_files] if path != keep]
+            for path in stale:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "renders": self.renders, "directory": self.directory}
+
+
+# Global PDF cache instance
+pdf_cache = PdfCache()
@@ -0,0 +1,297 @@
+"""
+Meal plan PDF rendering off the event loop.
+
+reportlab is pure Python and holds the GIL for the whole layout, so renders
+run in a small process pool instead of the API process. At most
+workers + queue_size renders are in flight; past that requests are turned
+away with PdfRenderOverloaded rather than queueing behind one another.
+Requests for a PDF that is already being rendered wait for that render.
+A render still running at the timeout gets its pool torn down and its
+worker killed, so a hung render cannot keep a slot; the other renders the
+pool was running or holding are resubmitted to a fresh pool. Exports share one
+window of max(workers, 1) renders across all of them and count towards
+the bound like any other render.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from core.config import settings
+from ai.llm_metrics import Histogram
+from ai.pdf_generator import PdfCache, pdf_cache, render_meal_plan_pdf
+
+logger = logging.getLogger(__name__)
+
+
+class PdfRenderOverloaded(RuntimeError):
+    """Raised when the render queue is full"""
+
+
+class PdfRenderTimeout(RuntimeError):
+    """Raised when a render did not finish within the timeout"""
+
+
+class PdfRenderUnavailable(RuntimeError):
+    """Raised when a render worker died or the pool shut down under a render"""
+
+
+def _render(directory: str, max_files: int, plan: dict, days: list, content_hash: str) -> tuple:
+    """Worker side: (path, started, seconds) of a render into the cache directory"""
+    started = time.time()
+    path = PdfCache(directory, max_files).get_or_render(plan, days, content_hash)
+    return path, started, time.time() - started
+
+
+def _render_bytes(plan: dict, days: list) -> tuple:
+    """Worker side: (PDF bytes, started, seconds) of an uncached render"""
+    started = time.time()
+    out = io.BytesIO()
+    render_meal_plan_pdf(plan, days, out)
+    return out.getvalue(), started, time.time() - started
+
+
+class PdfRenderService:
+    """Bounded process pool in front of a PdfCache"""
+
+    def __init__(
+        self,
+        cache: Optional[PdfCache] = None,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self.cache = cache or pdf_cache
+        self.workers = workers if workers is not None else settings.PDF_RENDER_WORKERS
+        self.queue_size = queue_size if queue_size is not None else settings.PDF_RENDER_QUEUE_SIZE
+        self.timeout = timeout if timeout is not None else settings.PDF_RENDER_TIMEOUT_SECONDS
+        self._executor = None
+        self._pending = {}  # cache path -> future of the render
+        self._jobs = {}  # future of a pool render -> (fn, args, concurrent future of the current attempt)
+        self._pool_of = weakref.WeakKeyDictionary()  # render future -> executor running it
+        self._export_slots = None
+        self._exporting = 0
+        self._export_waiting = 0
+
+        self.submitted = 0
+        self.rendered = 0
+        self.exported = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.recycled = 0
+        self.resubmitted = 0
+        self.render_seconds = Histogram()
+        self.wait_seconds = Histogram()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process with running threads can copy held locks
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _submit(self, fn, *args) -> asyncio.Future:
+        """
+        Future of fn(*args) in the pool. It outlives the pool attempt behind
+        it, so a render can be moved to a fresh pool when its pool is torn down.
+        """
+        if not self.workers:
+            return asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        future = asyncio.get_running_loop().create_future()
+        self._jobs[future] = (fn, args, None)
+        future.add_done_callback(self._forget)
+        self._start(future)
+        return future
+
+    def _start(self, future: asyncio.Future):
+        fn, args, _ = self._jobs[future]
+        try:
+            executor = self._pool()
+            attempt = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start over with a fresh pool
+            self._executor = None
+            executor = self._pool()
+            attempt = executor.submit(fn, *args)
+        self._jobs[future] = (fn, args, attempt)
+        self._pool_of[future] = executor
+        loop = asyncio.get_running_loop()
+
+        def done(attempt):
+            try:
+                loop.call_soon_threadsafe(self._settle, future, executor, attempt)
+            except RuntimeError:
+                pass  # the loop is closed, nobody is waiting
+
+        attempt.add_done_callback(done)
+
+    def _settle(self, future: asyncio.Future, executor, attempt):
+        """Hand the outcome of a pool attempt to its render future"""
+        if future.done() or self._pool_of.get(future) is not executor:
+            # Given up on, or already moved to a fresh pool
+            return
+        if attempt.cancelled():
+            future.set_exception(PdfRenderUnavailable("PDF rendering is shutting down, please retry shortly"))
+            return
+        error = attempt.exception()
+        if isinstance(error, BrokenProcessPool):
+            if executor is self._executor:
+                self._executor = None
+            future.set_exception(PdfRenderUnavailable(f"A PDF render worker died, please retry shortly ({error})"))
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(attempt.result())
+
+    def _forget(self, future: asyncio.Future):
+        _, _, attempt = self._jobs.pop(future, (None, None, None))
+        if future.cancelled() and attempt is not None:
+            # Only stops an attempt that is still queued
+            attempt.cancel()
+
+    def _recycle(self, future: asyncio.Future):
+        """
+        Tear down the pool running a timed-out render and kill its workers.
+        The timed-out render fails with PdfRenderTimeout; every other render
+        the pool was running or holding starts over on a fresh pool. Renders
+        in threads (workers=0) cannot be stopped and keep their slot until
+        they finish.
+        """
+        executor = self._pool_of.get(future)
+        if executor is None or executor is not self._executor:
+            # Already replaced; its workers are gone or going
+            return
+        self._executor = None
+        self.recycled += 1
+        victims = [job for job in self._jobs if job is not future and self._pool_of.get(job) is executor]
+        # ProcessPoolExecutor has no public way to stop a running call
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        if not future.done():
+            future.set_exception(PdfRenderTimeout(f"PDF rendering took longer than {self.timeout:g}s"))
+        for job in victims:
+            self._start(job)
+        self.resubmitted += len(victims)
+        logger.warning(
+            f"PDF render exceeded {self.timeout:g}s, restarted the render pool and resubmitted {len(victims)} renders"
+        )
+
+    def _in_flight(self) -> int:
+        return len(self._pending) + self._exporting
+
+    def _finished(self, path: str, submitted: float, future: asyncio.Future):
+        self._pending.pop(path, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.failures += 1
+            logger.error(f"PDF render failed: {error}")
+            return
+        _, started, seconds = future.result()
+        self.rendered += 1
+        self.wait_seconds.observe(max(started - submitted, 0.0))
+        self.render_seconds.observe(seconds)
+
+    async def render(self, plan: dict, days: list, content_hash: str) -> str:
+        """Path of the PDF of a plan, rendered in the pool on a cache miss"""
+        path = self.cache.lookup(plan["id"], content_hash)
+        if path is not None:
+            return path
+        path = self.cache.path_for(plan["id"], content_hash)
+
+        future = self._pending.get(path)
+        if future is None:
+            if self._in_flight() >= max(self.workers, 1) + self.queue_size:
+                self.rejected += 1
+                raise PdfRenderOverloaded(
+                    f"PDF rendering is at capacity ({self._in_flight()} in flight), please retry shortly"
+                )
+            future = self._submit(_render, self.cache.directory, self.cache.max_files, plan, days, content_hash)
+            self.submitted += 1
+            self._pending[path] = future
+            future.add_done_callback(lambda done, submitted=time.time(): self._finished(path, submitted, done))
+
+        try:
+            # Shielded: a waiter giving up does not cancel the render others may be waiting on
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._recycle(future)
+            raise PdfRenderTimeout(f"PDF rendering took longer than {self.timeout:g}s")
+        return result[0]
+
+    async def render_many(self, items: list) -> list:
+        """
+        PDF bytes for a batch of (plan, days) pairs, in order, for exports.
+        Nothing is cached, and all exports together hand at most one render
+        per worker to the pool at a time, so interactive renders queue behind
+        a few export renders rather than whole batches.
+        """
+        if self._export_slots is None:
+            self._export_slots = asyncio.Semaphore(max(self.workers, 1))
+
+        async def render_one(plan: dict, days: list) -> bytes:
+            self._export_waiting += 1
+            try:
+                await self._export_slots.acquire()
+            finally:
+                self._export_waiting -= 1
+            self._exporting += 1
+            try:
+                future = self._submit(_render_bytes, plan, days)
+                try:
+                    data, _, seconds = await asyncio.wait_for(future, timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._recycle(future)
+                    raise PdfRenderTimeout(f"PDF rendering took longer than {self.timeout:g}s")
+                except PdfRenderUnavailable:
+                    self.failures += 1
+                    raise
+            finally:
+                self._exporting -= 1
+                self._export_slots.release()
+            self.exported += 1
+            self.render_seconds.observe(seconds)
+            return data
+
+        return await asyncio.gather(*(render_one(plan, days) for plan, days in items))
+
+    async def stop(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        in_flight = self._in_flight()
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": min(in_flight, max(self.workers, 1)),
+            "queued": max(in_flight - max(self.workers, 1), 0),
+            "exporting": self._exporting,
+            "export_waiting": self._export_waiting,
+            "submitted": self.submitted,
+            "rendered": self.rendered,
+            "exported": self.exported,
+            "cache_hits": self.cache.hits,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "recycled": self.recycled,
+            "resubmitted": self.resubmitted,
+            "wait_seconds": self.wait_seconds.snapshot(),
+            "render_seconds": self.render_seconds.snapshot(),
+        }
+
+
+# Global render service over the shared PDF cache
+pdf_renderer = PdfRenderService()
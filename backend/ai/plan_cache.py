@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from core.config import settings
+from ai.prompt_template import PROMPT_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_plan_params(request) -> dict:
+    """
+    Normalize MealPlanCreate fields into PROMPT_TEMPLATE parameters.
+    Free-text fields are case/whitespace folded and calories are bucketed so
+    that equivalent requests render the same prompt.
+    """
+    bucket = max(1, settings.PLAN_CACHE_CALORIE_BUCKET)
+    calories = int(round(request.daily_calories / bucket) * bucket) or bucket
+
+    return {
+        "goal": " ".join(request.goal.split()).lower(),
+        "calories": calories,
+        "diet_type": " ".join(request.diet_type.split()).lower(),
+        "protein": request.macros.protein,
+        "carbs": request.macros.carbs,
+        "fats": request.macros.fats,
+    }
+
+
+def render_prompt(params: dict) -> str:
+    """Render PROMPT_TEMPLATE from normalized parameters"""
+    return PROMPT_TEMPLATE.format(**params)
+
+
+def make_cache_key(prompt: str, model: str) -> str:
+    """Cache key for a rendered prompt sent to a given model"""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    Two-tier cache for generated meal plans.
+    Tier 1 is an in-process LRU, tier 2 is a SQLite file shared by all workers
+    with TTL expiry and size-based (least recently used) eviction.
+    Async callers use aget()/aset(), which keep only the LRU on the event loop.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        memory_entries: Optional[int] = None,
+    ):
+        self.path = path or settings.PLAN_CACHE_PATH
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.PLAN_CACHE_TTL_SECONDS
+        self.max_entries = max_entries if max_entries is not None else settings.PLAN_CACHE_MAX_ENTRIES
+        self.memory_entries = memory_entries if memory_entries is not None else settings.PLAN_CACHE_MEMORY_ENTRIES
+
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()  # memory tier and counters; never held across disk I/O
+        self._disk_lock = threading.Lock()  # the shared sqlite connection
+        self._conn = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so importing the module never touches the filesystem
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS plan_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_plan_cache_last_access ON plan_cache (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_plan_cache_expires_at ON plan_cache (expires_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        with self._disk_lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT value, expires_at FROM plan_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE plan_cache SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Plan cache lookup failed: {e}")
+                row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            self._remember(key, value, expires_at)
+            self.disk_hits += 1
+            return value
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached plan for key, or None on a miss"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        return value if value is not None else self._get_disk(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for async callers: the disk tier is read in a worker thread"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        return value if value is not None else await asyncio.to_thread(self._get_disk, key, now)
+
+    def _set_memory(self, key: str, value: str, now: float) -> float:
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self.stores += 1
+        return expires_at
+
+    def _set_disk(self, key: str, value: str, model: str, now: float, expires_at: float):
+        with self._disk_lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO plan_cache (key, model, value, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, value, now, expires_at, now)
+                )
+                self._evict(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Plan cache store failed: {e}")
+
+    def set(self, key: str, value: str, model: str):
+        """Store a generated plan in both tiers"""
+        now = time.time()
+        expires_at = self._set_memory(key, value, now)
+        self._set_disk(key, value, model, now, expires_at)
+
+    async def aset(self, key: str, value: str, model: str):
+        """set() for async callers: the disk tier is written in a worker thread"""
+        now = time.time()
+        expires_at = self._set_memory(key, value, now)
+        await asyncio.to_thread(self._set_disk, key, value, model, now, expires_at)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        # Drop expired rows first, then the least recently used ones over the size limit
+        removed = conn.execute("DELETE FROM plan_cache WHERE expires_at <= ?", (now,)).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM plan_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM plan_cache WHERE key IN "
+                "(SELECT key FROM plan_cache ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            ).rowcount
+        with self._lock:
+            self.evictions += max(removed, 0)
+
+    def clear(self):
+        """Remove every cached plan from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        with self._disk_lock:
+            try:
+                conn = self._connection()
+                conn.execute("DELETE FROM plan_cache")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Plan cache clear failed: {e}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters for both tiers"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global plan cache instance
+plan_cache = PlanCache()
@@ -0,0 +1,157 @@
+"""
+Streamed ZIP export of stored meal plans for audits.
+
+Plans are read in keyset-paginated batches (id > last id seen, never
+OFFSET), each batch with its days in one more query. While a batch is
+serialized (JSON) or rendered in the PDF process pool, the next batch is
+already being read. Entries go into a zipfile writing to an in-memory sink
+that is drained after every batch, so the archive is never held whole: the
+response only ever holds about two batches, plus the zip central directory
+(a few hundred bytes per entry) that has to be written at the end.
+"""
+import asyncio
+import json
+import zipfile
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+
+from database.database import SessionLocal
+from database.models import MealPlan, MealHistory
+from ai.pdf_service import pdf_renderer
+
+EXPORT_BATCH_SIZE = 200
+EXPORT_FORMATS = ("json", "pdf")
+
+
+def parse_meals_json(meals_json: str) -> list:
+    """Day objects stored in one MealHistory row"""
+    try:
+        parsed = json.loads(meals_json)
+    except ValueError:
+        parsed = meals_json
+    # Legacy rows store the whole week in one row, or the raw model output
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def fetch_plan_batch(
+    db,
+    after_id: int = 0,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = EXPORT_BATCH_SIZE
+) -> list:
+    """(plan fields, days) of up to limit plans with id > after_id created in [start, end), by id"""
+    query = select(
+        MealPlan.id,
+        MealPlan.user_id,
+        MealPlan.goal,
+        MealPlan.diet_type,
+        MealPlan.daily_calories,
+        MealPlan.macro_protein,
+        MealPlan.macro_carbs,
+        MealPlan.macro_fats,
+        MealPlan.deviation,
+        MealPlan.created_at
+    ).where(MealPlan.id > after_id)
+    if start is not None:
+        query = query.where(MealPlan.created_at >= start)
+    if end is not None:
+        query = query.where(MealPlan.created_at < end)
+    plans = [dict(row._mapping) for row in db.execute(query.order_by(MealPlan.id).limit(limit))]
+    if not plans:
+        return []
+
+    days = {plan["id"]: [] for plan in plans}
+    rows = db.execute(
+        select(MealHistory.mealplan_id, MealHistory.meals_json)
+        .where(MealHistory.mealplan_id.in_(list(days)))
+        .order_by(MealHistory.mealplan_id, MealHistory.day_number)
+    )
+    for mealplan_id, meals_json in rows:
+        days[mealplan_id] += parse_meals_json(meals_json)
+    return [(plan, days[plan["id"]]) for plan in plans]
+
+
+class _ZipSink:
+    """Write-only file object that collects what ZipFile writes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_info(plan: dict, fmt: str) -> zipfile.ZipInfo:
+    created_at = plan["created_at"] or datetime(1980, 1, 1)
+    info = zipfile.ZipInfo(f"plans/{plan['id']}.{fmt}", date_time=created_at.timetuple()[:6])
+    # PDF page streams are compressed already
+    info.compress_type = zipfile.ZIP_STORED if fmt == "pdf" else zipfile.ZIP_DEFLATED
+    return info
+
+
+def _write_entries(archive: zipfile.ZipFile, sink: _ZipSink, batch: list, bodies: Optional[list], fmt: str) -> bytes:
+    for index, (plan, days) in enumerate(batch):
+        if bodies is None:
+            body = json.dumps({**plan, "days": days}, default=str).encode("utf-8")
+        else:
+            body = bodies[index]
+        archive.writestr(_entry_info(plan, fmt), body)
+    return sink.drain()
+
+
+def _fetch(session_factory, after_id: int, start, end, limit: int) -> list:
+    with session_factory() as db:
+        return fetch_plan_batch(db, after_id, start, end, limit)
+
+
+async def stream_plan_export(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fmt: str = "json",
+    batch_size: int = EXPORT_BATCH_SIZE,
+    session_factory=SessionLocal,
+    renderer=None
+):
+    """
+    Async generator of the bytes of a ZIP with one plans/<id>.<fmt> entry per
+    plan created in [start, end). An error mid-export ends the stream without
+    the central directory, so a failed export never reads as a complete archive.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}")
+    renderer = renderer or pdf_renderer
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, "w")
+
+    pending = asyncio.ensure_future(asyncio.to_thread(_fetch, session_factory, 0, start, end, batch_size))
+    try:
+        while True:
+            batch = await pending
+            if not batch:
+                break
+            # Read the next batch while this one is rendered and written
+            pending = asyncio.ensure_future(
+                asyncio.to_thread(_fetch, session_factory, batch[-1][0]["id"], start, end, batch_size)
+            )
+            bodies = None
+            if fmt == "pdf":
+                bodies = await renderer.render_many(batch)
+            yield await asyncio.to_thread(_write_entries, archive, sink, batch, bodies, fmt)
+    finally:
+        if not pending.done():
+            pending.cancel()
+
+    archive.close()
+    yield sink.drain()
@@ -0,0 +1,215 @@
+import jiter
+from typing import Optional
+
+MEALS_PER_DAY = 3
+SNACKS_PER_DAY = 2
+PLAN_DAYS = 7
+
+
+class PlanValidationError(ValueError):
+    """Raised when generated plan JSON does not match the PROMPT_TEMPLATE schema"""
+
+
+# Ingredients and snacks start with a gram amount, so their calories can be checked
+_GRAMS_FIRST = {
+    "type": "string",
+    "pattern": r"^\d+(\.\d+)? ?g ",
+    "description": 'Amount in grams, then the food, e.g. "150 g lentils"',
+}
+
+# Strict JSON schema for one day, used for structured-output mode
+DAY_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "day": {"type": "integer"},
+        "meals": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "calories": {"type": "number"},
+                    "ingredients": {"type": "array", "items": _GRAMS_FIRST},
+                },
+                "required": ["name", "calories", "ingredients"],
+                "additionalProperties": False,
+            },
+        },
+        "snacks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": _GRAMS_FIRST,
+                    "calories": {"type": "number"},
+                },
+                "required": ["name", "calories"],
+                "additionalProperties": False,
+            },
+        },
+        "total_calories": {"type": "number"},
+    },
+    "required": ["day", "meals", "snacks", "total_calories"],
+    "additionalProperties": False,
+}
+
+# Structured outputs need an object at the root, so the week is wrapped in "days"
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "meal_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"days": {"type": "array", "items": DAY_JSON_SCHEMA}},
+            "required": ["days"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+DAY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "meal_plan_day", "strict": True, "schema": DAY_JSON_SCHEMA},
+}
+
+
+def _strip_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text
+
+
+def parse_json(text: str):
+    """Parse model output, tolerating a surrounding markdown code fence"""
+    if text is None:
+        raise PlanValidationError("Empty model output")
+    try:
+        return jiter.from_json(_strip_fence(text).encode("utf-8"))
+    except ValueError as e:
+        raise PlanValidationError(f"Invalid JSON: {e}") from e
+
+
+def parse_json_with_repair(text: str):
+    """
+    Parse model output, repairing the common failure modes: prose around
+    the JSON and completions truncated mid-object. Truncated trailing days
+    come back incomplete and are rejected by validate_day.
+    """
+    try:
+        return parse_json(text)
+    except PlanValidationError:
+        pass
+
+    text = _strip_fence(text)
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        raise PlanValidationError("No JSON found in model output")
+    text = text[min(starts):]
+
+    end = max(text.rfind("]"), text.rfind("}"))
+    if end >= 0:
+        try:
+            return jiter.from_json(text[:end + 1].encode("utf-8"))
+        except ValueError:
+            pass
+    try:
+        return jiter.from_json(text.encode("utf-8"), partial_mode="trailing-strings")
+    except ValueError as e:
+        raise PlanValidationError(f"Invalid JSON: {e}") from e
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_day(day, expected_day: Optional[int] = None) -> dict:
+    """
+    Validate one day object and return it in canonical form.
+    Raises PlanValidationError describing the first problem found.
+    """
+    if not isinstance(day, dict):
+        raise PlanValidationError("Day must be a JSON object")
+
+    meals = day.get("meals")
+    snacks = day.get("snacks")
+    if not isinstance(meals, list) or len(meals) != MEALS_PER_DAY:
+        raise PlanValidationError(f"Day must have exactly {MEALS_PER_DAY} meals")
+    if not isinstance(snacks, list) or len(snacks) != SNACKS_PER_DAY:
+        raise PlanValidationError(f"Day must have exactly {SNACKS_PER_DAY} snacks")
+
+    for meal in meals:
+        if not isinstance(meal, dict) or not isinstance(meal.get("name"), str) or not _is_number(meal.get("calories")):
+            raise PlanValidationError("Each meal needs a name and numeric calories")
+        ingredients = meal.get("ingredients", [])
+        if not isinstance(ingredients, list) or not all(isinstance(item, str) for item in ingredients):
+            raise PlanValidationError("Meal ingredients must be a list of strings")
+    for snack in snacks:
+        if not isinstance(snack, dict) or not isinstance(snack.get("name"), str) or not _is_number(snack.get("calories")):
+            raise PlanValidationError("Each snack needs a name and numeric calories")
+
+    day_number = day.get("day")
+    if expected_day is not None:
+        day_number = expected_day
+    elif not isinstance(day_number, int) or not 1 <= day_number <= PLAN_DAYS:
+        raise PlanValidationError(f"Day number must be between 1 and {PLAN_DAYS}")
+
+    total_calories = day.get("total_calories")
+    if not _is_number(total_calories):
+        total_calories = sum(item["calories"] for item in meals + snacks)
+
+    return {
+        "day": day_number,
+        "meals": [
+            {"name": meal["name"], "calories": meal["calories"], "ingredients": meal.get("ingredients", [])}
+            for meal in meals
+        ],
+        "snacks": [{"name": snack["name"], "calories": snack["calories"]} for snack in snacks],
+        "total_calories": total_calories,
+    }
+
+
+def extract_days(text: str):
+    """
+    Parse a full-plan completion into validated days.
+    Returns ({day_number: day}, [problems]) so callers can regenerate just
+    the missing or malformed days instead of the whole week.
+    """
+    data = parse_json_with_repair(text)
+    if isinstance(data, dict) and isinstance(data.get("days"), list):
+        data = data["days"]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise PlanValidationError("Plan must be a JSON array of days")
+
+    days = {}
+    problems = []
+    for index, item in enumerate(data):
+        try:
+            day = validate_day(item)
+        except PlanValidationError as e:
+            problems.append(f"entry {index + 1}: {e}")
+            continue
+        days.setdefault(day["day"], day)
+
+    missing = [day for day in range(1, PLAN_DAYS + 1) if day not in days]
+    if missing:
+        problems.append(f"missing days {missing}")
+    return days, problems
+
+
+def parse_plan(text: str) -> list:
+    """Parse and validate a complete plan, raising PlanValidationError if any day is unusable"""
+    days, problems = extract_days(text)
+    if len(days) < PLAN_DAYS or any(day not in days for day in range(1, PLAN_DAYS + 1)):
+        raise PlanValidationError("; ".join(problems))
+    return [days[day] for day in range(1, PLAN_DAYS + 1)]
+
+
+def day_total_calories(day: dict) -> int:
+    """Per-day calorie total computed from the meals and snacks themselves"""
+    return int(round(sum(item["calories"] for item in day["meals"] + day["snacks"])))
@@ -0,0 +1,171 @@
+"""
+Check generated meal plans against the food database instead of trusting
+the calories the model reports.
+
+Every meal ingredient and snack name of a plan is resolved to a food in one
+batch (ai/ingredient_resolver.py). Ingredients with an explicit amount
+("150 g lentils", "1 cup rice") count at that weight; the rest of a meal's
+stated calories is split evenly over its other resolved ingredients, which
+still tells us where the energy comes from. Portions then become a meals x
+ingredients weight matrix, and one matrix product with the ingredients'
+per-100 g nutrients gives the meal totals (another gives the days).
+
+Days are compared with the requested daily calories and macro split; days
+outside tolerance are what generator.py regenerates. Calories spread from
+the stated values only echo what the model claimed, so a day's calories are
+judged only when enough of them come from measured amounts (calorie
+coverage); the macro split is judged either way.
+"""
+import re
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from core.config import settings
+from ai.food_search import get_food_catalog
+from ai.ingredient_resolver import ingredient_resolver
+from ai.local_planner import CALORIES, PROTEIN, FAT, CARBS
+
+# Grams per unit; volumes are taken at the density of water
+UNIT_GRAMS = {
+    "g": 1.0, "gram": 1.0, "grams": 1.0, "kg": 1000.0, "ml": 1.0, "l": 1000.0,
+    "oz": 28.35, "ounce": 28.35, "ounces": 28.35, "lb": 453.6, "lbs": 453.6,
+    "cup": 240.0, "cups": 240.0, "tbsp": 15.0, "tablespoon": 15.0, "tablespoons": 15.0,
+    "tsp": 5.0, "teaspoon": 5.0, "teaspoons": 5.0,
+}
+_AMOUNT = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(" + "|".join(sorted(UNIT_GRAMS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+
+
+class DayVerification(NamedTuple):
+    day: int
+    calories: float           # from the food database
+    reported_calories: float  # as stated in the plan
+    protein: float
+    fat: float
+    carbs: float
+    coverage: float           # share of ingredients resolved to a food
+    calorie_coverage: float   # share of calories from resolved ingredients with an amount
+    calorie_deviation: Optional[float]  # |calories - target| / target, None if calorie coverage is too low
+    macro_deviation: float    # distance between energy splits, 0 to 1
+    deviation: Optional[float]  # worst of the two, None if coverage is too low to judge
+    within_tolerance: bool
+
+
+class PlanVerification(NamedTuple):
+    days: list
+    deviation: Optional[float]  # worst verified day
+
+    @property
+    def offending_days(self) -> list:
+        return [day.day for day in self.days if not day.within_tolerance]
+
+
+def plan_verification(days: list) -> PlanVerification:
+    """PlanVerification over DayVerification results, worst judged day as the deviation"""
+    judged = [day.deviation for day in days if day.deviation is not None]
+    return PlanVerification(days, max(judged) if judged else None)
+
+
+def parse_grams(ingredient: str) -> float:
+    """Weight of an ingredient with an explicit amount, NaN otherwise"""
+    match = _AMOUNT.search(ingredient or "")
+    if match is None:
+        return float("nan")
+    return float(match.group(1)) * UNIT_GRAMS[match.group(2).lower()]
+
+
+def target_split(params: dict) -> np.ndarray:
+    """Requested (protein, fat, carbs) energy fractions from percentages"""
+    split = np.array([params["protein"], params["fats"], params["carbs"]], dtype=np.float64)
+    return split / split.sum() if split.sum() > 0 else np.full(3, 1 / 3)
+
+
+def verify_plan(days: list, params: dict, catalog=None, resolver=None) -> Optional[PlanVerification]:
+    """
+    Verify validated plan days against params (normalized plan parameters).
+    None when there is no food table to verify against.
+    """
+    catalog = catalog or get_food_catalog()
+    if catalog is None or not days:
+        return None
+    resolver = resolver or ingredient_resolver
+
+    # One entry per eaten item: meals list ingredients, snacks only have a name
+    items, item_meal, meal_day, meal_reported = [], [], [], []
+    for day_index, day in enumerate(days):
+        for entry in day["meals"] + day["snacks"]:
+            names = entry.get("ingredients") or [entry["name"]]
+            items += names
+            item_meal += [len(meal_day)] * len(names)
+            meal_day.append(day_index)
+            meal_reported.append(float(entry["calories"]))
+    item_meal = np.asarray(item_meal, dtype=np.int64)
+    meal_day = np.asarray(meal_day, dtype=np.int64)
+    meal_reported = np.asarray(meal_reported)
+    meals = len(meal_day)
+
+    resolved = resolver.resolve(items)
+    rows = catalog.rows_for([result["fdc_id"] if result["fdc_id"] is not None else -1 for result in resolved])
+    nutrients = np.where(rows[:, None] >= 0, catalog.nutrients[np.maximum(rows, 0)], 0).astype(np.float64)
+    found = (rows >= 0) & (nutrients[:, CALORIES] > 0)
+
+    # Explicit amounts count as written; the rest of the meal's calories go evenly to the others
+    grams = np.array([parse_grams(item) for item in items])
+    measured = found & ~np.isnan(grams)
+    weights = np.where(measured, np.nan_to_num(grams) / 100, 0.0)
+    measured_kcal = np.bincount(item_meal, weights=weights * nutrients[:, CALORIES], minlength=meals)
+    estimated = found & ~measured
+    estimated_count = np.bincount(item_meal, weights=estimated, minlength=meals)
+    remaining = np.maximum(meal_reported - measured_kcal, 0) / np.maximum(estimated_count, 1)
+    weights = np.where(estimated, remaining[item_meal] / np.where(found, nutrients[:, CALORIES], 1), weights)
+
+    portions = np.zeros((meals, len(items)))
+    portions[item_meal, np.arange(len(items))] = weights
+    meal_totals = portions @ nutrients
+    # Meals with nothing resolved still count with their stated calories
+    unresolved_meal = np.bincount(item_meal, weights=found, minlength=meals) == 0
+    meal_totals[unresolved_meal, CALORIES] = meal_reported[unresolved_meal]
+    day_matrix = np.zeros((len(days), meals))
+    day_matrix[meal_day, np.arange(meals)] = 1.0
+    day_totals = day_matrix @ meal_totals
+
+    coverage = np.bincount(meal_day[item_meal], weights=found, minlength=len(days)) / np.maximum(
+        np.bincount(meal_day[item_meal], minlength=len(days)), 1
+    )
+    calorie_coverage = np.bincount(meal_day, weights=measured_kcal, minlength=len(days)) / np.maximum(
+        day_totals[:, CALORIES], 1e-9
+    )
+    target = float(params["calories"])
+    calorie_deviation = np.abs(day_totals[:, CALORIES] - target) / target
+    macro_energy = day_totals[:, [PROTEIN, FAT, CARBS]] * np.array([4.0, 9.0, 4.0])
+    split = macro_energy / np.maximum(macro_energy.sum(axis=1, keepdims=True), 1e-9)
+    macro_deviation = np.abs(split - target_split(params)).sum(axis=1) / 2
+
+    results = []
+    for index, day in enumerate(days):
+        judged = coverage[index] >= settings.PLAN_VERIFY_MIN_COVERAGE
+        measured_day = judged and calorie_coverage[index] >= settings.PLAN_VERIFY_MIN_CALORIE_COVERAGE
+        deviations = [macro_deviation[index]] + ([calorie_deviation[index]] if measured_day else [])
+        within = bool(
+            not judged
+            or (macro_deviation[index] <= settings.PLAN_MACRO_TOLERANCE
+                and (not measured_day or calorie_deviation[index] <= settings.PLAN_CALORIE_TOLERANCE))
+        )
+        results.append(DayVerification(
+            day=day["day"],
+            calories=round(float(day_totals[index, CALORIES]), 1),
+            reported_calories=float(day["total_calories"]),
+            protein=round(float(day_totals[index, PROTEIN]), 1),
+            fat=round(float(day_totals[index, FAT]), 1),
+            carbs=round(float(day_totals[index, CARBS]), 1),
+            coverage=round(float(coverage[index]), 3),
+            calorie_coverage=round(float(min(calorie_coverage[index], 1.0)), 3),
+            calorie_deviation=round(float(calorie_deviation[index]), 4) if measured_day else None,
+            macro_deviation=round(float(macro_deviation[index]), 4),
+            deviation=round(float(max(deviations)), 4) if judged else None,
+            within_tolerance=within,
+        ))
+    return plan_verification(results)
@@ -1,8 +1,5 @@
-PROMPT_TEMPLATE = """
-You are a certified fitness nutritionist.
-
-Generate a structured **7-day meal plan** based on the following user details:
-
+# Shared building blocks, so the full-week and single-day prompts stay in sync
+_USER_DETAILS = """
 Goal: {goal}
 Daily Calories: {calories}
 Diet Type: {diet_type}
@@ -10,35 +7,65 @@ Macros:
   - Protein: {protein}%
   - Carbs: {carbs}%
   - Fats: {fats}%
+"""
 
-### OUTPUT FORMAT (VERY IMPORTANT)
-Return ONLY valid JSON, no explanations, no markdown.
-
-Schema:
-[
-  {{
-    "day": 1,
+_DAY_SCHEMA = """{{
+    "day": {day},
     "meals": [
       {{
         "name": "Meal Name",
         "calories": 350,
-        "ingredients": ["item1", "item2"]
+        "ingredients": ["150 g item1", "80 g item2"]
       }}
     ],
     "snacks": [
       {{
-        "name": "Snack Name",
+        "name": "30 g Snack Name",
         "calories": 150
       }}
     ],
     "total_calories": 1800
-  }}
+  }}"""
+
+_FOOD_RULES = """- Respect calories and macro ratios
+- Start every ingredient and snack name with its amount in grams, e.g. "150 g lentils"
+- Only use foods available in African & Ethiopian markets if possible
+"""
+
+PROMPT_TEMPLATE = """
+You are a certified fitness nutritionist.
+
+Generate a structured **7-day meal plan** based on the following user details:
+""" + _USER_DETAILS + """
+### OUTPUT FORMAT (VERY IMPORTANT)
+Return ONLY valid JSON, no explanations, no markdown.
+
+Schema:
+[
+  """ + _DAY_SCHEMA.replace("{day}", "1") + """
 ]
 
 ### Rules:
 - 3 meals + 2 snacks PER DAY
-- Respect calories and macro ratios
-- Only use foods available in African & Ethiopian markets if possible
-- All days must be included (day 1–7)
+""" + _FOOD_RULES + """- All days must be included (day 1–7)
+- JSON must be valid and parsable
+"""
+
+# Day-scoped variant used by the parallel fan-out generation mode
+DAY_PROMPT_TEMPLATE = """
+You are a certified fitness nutritionist.
+
+Generate **day {day} of a 7-day meal plan** based on the following user details:
+""" + _USER_DETAILS + """
+### OUTPUT FORMAT (VERY IMPORTANT)
+Return ONLY valid JSON, no explanations, no markdown.
+
+Schema:
+  """ + _DAY_SCHEMA + """
+
+### Rules:
+- 3 meals + 2 snacks for this day
+""" + _FOOD_RULES + """- The other days are planned separately, so pick dishes that suit day {day} of the week and avoid the most obvious default menu
+- Return a single JSON object for day {day}, not a list
 - JSON must be valid and parsable
 """
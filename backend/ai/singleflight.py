@@ -0,0 +1,47 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key onto one in-flight task.
+    The first caller starts the work; later callers with the same key await
+    the same result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._in_flight = {}  # key -> asyncio.Task
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn):
+        """Run fn() for key, or join the call already in flight for it"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        # Shielded so one caller disconnecting does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+# Global single-flight group for meal plan generation
+generation_flight = SingleFlight()
@@ -0,0 +1,67 @@
+import jiter
+
+
+class DayStreamParser:
+    """
+    Incrementally extract day objects from a streamed JSON array.
+    Feed completion tokens as they arrive; every day object whose closing
+    brace has been seen is decoded and returned immediately, so callers do
+    not have to wait for the whole 7-day array. Objects that do not decode
+    are skipped and counted in malformed; the caller regenerates those days.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0            # next character of _text to scan
+        self._depth = 0
+        self._array_depth = None  # depth of the outermost array
+        self._in_string = False
+        self._escape = False
+        self._start = None       # start index of the day object being read
+        self.malformed = 0
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk of the completion and return any completed days"""
+        if not chunk:
+            return []
+
+        self._text += chunk
+        days = []
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "[" or ch == "{":
+                self._depth += 1
+                if ch == "[" and self._array_depth is None:
+                    self._array_depth = self._depth
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._start = i
+            elif ch == "]" or ch == "}":
+                if ch == "}" and self._start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        days.append(jiter.from_json(text[self._start:i + 1].encode("utf-8")))
+                    except ValueError:
+                        self.malformed += 1
+                    self._start = None
+                self._depth -= 1
+
+        # Drop text that can no longer be part of a day object
+        if self._start is None:
+            self._text = ""
+            self._pos = 0
+        else:
+            self._text = text[self._start:]
+            self._pos = len(self._text)
+            self._start = 0
+
+        return days
@@ -0,0 +1,239 @@
+"""
+Warm pool of pre-generated meal plans for the most requested parameters.
+
+Run the pre-generation job offline (cron, deploy hook) to mine the
+mealplans table and fill the pool:
+
+    python -m ai.warm_pool
+
+create_meal_plan then serves a popular request from the pool instantly and
+a background task generates a replacement variant.
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database.database import SessionLocal
+from database.models import MealPlan, WarmPlan
+from database.schemas import MealPlanCreate, Macros
+from ai.plan_cache import normalize_plan_params, render_prompt, make_cache_key
+from ai.generator import generate_plan_variant
+
+logger = logging.getLogger(__name__)
+
+
+def pool_key(params: dict) -> str:
+    """Pool key for normalized parameters; equivalent requests share it"""
+    return make_cache_key(render_prompt(params), settings.OPENAI_MODEL)
+
+
+def popular_params(db: Session, top_n: int) -> list:
+    """The top_n most requested normalized parameter sets, most popular first"""
+    rows = db.execute(
+        select(
+            MealPlan.goal,
+            MealPlan.diet_type,
+            MealPlan.daily_calories,
+            MealPlan.macro_protein,
+            MealPlan.macro_carbs,
+            MealPlan.macro_fats,
+            func.count().label("requests")
+        ).group_by(
+            MealPlan.goal,
+            MealPlan.diet_type,
+            MealPlan.daily_calories,
+            MealPlan.macro_protein,
+            MealPlan.macro_carbs,
+            MealPlan.macro_fats
+        )
+    )
+
+    # Raw rows that normalize to the same prompt are counted together
+    counts = Counter()
+    params_by_key = {}
+    for row in rows:
+        params = normalize_plan_params(MealPlanCreate(
+            goal=row.goal,
+            diet_type=row.diet_type,
+            daily_calories=row.daily_calories,
+            macros=Macros(protein=row.macro_protein, carbs=row.macro_carbs, fats=row.macro_fats)
+        ))
+        key = pool_key(params)
+        counts[key] += row.requests
+        params_by_key[key] = params
+
+    return [params_by_key[key] for key, _ in counts.most_common(top_n)]
+
+
+class WarmPool:
+    """
+    Pre-generated plan variants stored in the warm_plans table.
+    take() claims one variant with a conditional DELETE (safe across
+    processes), so consecutive users get different plans; the pool is then
+    topped back up in the background with bounded concurrency.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        variants: Optional[int] = None,
+        top_n: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_age_seconds: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.variants = variants if variants is not None else settings.WARM_POOL_VARIANTS
+        self.top_n = top_n if top_n is not None else settings.WARM_POOL_TOP_N
+        self.concurrency = concurrency if concurrency is not None else settings.WARM_POOL_CONCURRENCY
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else settings.WARM_POOL_MAX_AGE_SECONDS
+
+        # Created on first use so it binds to the running event loop
+        self._semaphore = None
+        self._replenishing = set()
+        self._tasks = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.max_age_seconds)
+
+    def take(self, db: Session, request: MealPlanCreate) -> Optional[str]:
+        """Claim a pre-generated plan for this request, or None if the pool has none"""
+        params = normalize_plan_params(request)
+        key = pool_key(params)
+
+        while True:
+            row = db.execute(
+                select(WarmPlan.id, WarmPlan.plan_json)
+                .where(WarmPlan.pool_key == key, WarmPlan.created_at >= self._cutoff())
+                .order_by(WarmPlan.id)
+                .limit(1)
+            ).first()
+            if row is None:
+                self.misses += 1
+                return None
+
+            claimed = db.execute(delete(WarmPlan).where(WarmPlan.id == row.id)).rowcount
+            db.commit()
+            if claimed == 1:
+                break
+            # Another request took this variant, try the next one
+
+        self.hits += 1
+        self._schedule_replenish(key, params)
+        return row.plan_json
+
+    def _schedule_replenish(self, key: str, params: dict):
+        if key in self._replenishing:
+            return
+        self._replenishing.add(key)
+        task = asyncio.get_running_loop().create_task(self._replenish(key, params))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _replenish(self, key: str, params: dict):
+        try:
+            with self.session_factory() as db:
+                available = self._available(db).get(key, 0)
+            await self.fill(params, self.variants - available)
+        except Exception as e:
+            logger.error(f"Failed to replenish warm meal plan pool: {e}")
+        finally:
+            self._replenishing.discard(key)
+
+    def _available(self, db: Session) -> dict:
+        rows = db.execute(
+            select(WarmPlan.pool_key, func.count())
+            .where(WarmPlan.created_at >= self._cutoff())
+            .group_by(WarmPlan.pool_key)
+        )
+        return {key: count for key, count in rows}
+
+    async def fill(self, params: dict, count: int) -> int:
+        """Generate count variants for params; returns how many were stored"""
+        if count <= 0:
+            return 0
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        key = pool_key(params)
+        params_json = json.dumps(params)
+
+        async def one():
+            async with self._semaphore:
+                plan = await generate_plan_variant(params)
+            with self.session_factory() as db:
+                db.add(WarmPlan(pool_key=key, params_json=params_json, plan_json=plan))
+                db.commit()
+
+        results = await asyncio.gather(*[one() for _ in range(count)], return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        self.generated += count - len(errors)
+        self.failed += len(errors)
+        if errors:
+            logger.warning(f"{len(errors)} of {count} warm pool variants failed: {errors[0]}")
+        return count - len(errors)
+
+    async def pregenerate(self) -> dict:
+        """Offline job: top up the pool for the top_n most requested parameter sets"""
+        with self.session_factory() as db:
+            expired = db.execute(delete(WarmPlan).where(WarmPlan.created_at < self._cutoff())).rowcount
+            db.commit()
+            popular = popular_params(db, self.top_n)
+            available = self._available(db)
+
+        stored = await asyncio.gather(*[
+            self.fill(params, self.variants - available.get(pool_key(params), 0))
+            for params in popular
+        ])
+        return {"combinations": len(popular), "generated": sum(stored), "expired": expired}
+
+    async def drain(self):
+        """Wait for background replenishment to finish (shutdown, tests)"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def stop(self):
+        """Cancel background replenishment on shutdown"""
+        for task in list(self._tasks):
+            task.cancel()
+        await self.drain()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "failed": self.failed,
+            "replenishing": len(self._replenishing),
+        }
+
+
+# Global warm pool instance
+warm_pool = WarmPool()
+
+
+if __name__ == "__main__":
+    from ai.llm_backends import close_backend
+    from database.models import Base
+    from database.database import engine
+
+    async def main():
+        try:
+            return await warm_pool.pregenerate()
+        finally:
+            await close_backend()
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    print(json.dumps(asyncio.run(main())))
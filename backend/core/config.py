@@ -19,6 +19,72 @@ class Settings(BaseSettings):
     EMAIL_PASSWORD: str = ""
     FRONTEND_URL: str = "http://localhost:5173"
     EMAIL_USE_TLS: bool = True
+    OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_BASE_URL: str | None = None  # e.g. http://localhost:8001/v1 for the fake server
+    LLM_BACKEND: str = "openai"  # "openai" or in-process "fake"
+    FAKE_LLM_LATENCY: str = "lognormal:1.0,0.5"
+    FAKE_LLM_TOKENS_PER_SECOND: float = 80.0
+    FAKE_LLM_ERROR_RATE: float = 0.0
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    PLAN_CACHE_ENABLED: bool = True
+    PLAN_CACHE_PATH: str = "./plan_cache.db"
+    PLAN_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    PLAN_CACHE_MAX_ENTRIES: int = 5000
+    PLAN_CACHE_MEMORY_ENTRIES: int = 256
+    PLAN_CACHE_CALORIE_BUCKET: int = 50
+    SINGLE_FLIGHT_ENABLED: bool = True
+    GENERATION_MODE: str = "single"  # "single" prompt or per-day "fanout"
+    FANOUT_MAX_ATTEMPTS: int = 3
+    LLM_STRUCTURED_OUTPUT: bool = True  # send the plan JSON schema as response_format
+    PLAN_REPAIR_ATTEMPTS: int = 2  # rounds of regenerating missing/invalid days
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_WINDOW_SECONDS: float = 60.0
+    CIRCUIT_MIN_CALLS: int = 10
+    CIRCUIT_ERROR_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 30.0
+    CIRCUIT_SLOW_CALL_RATE: float = 0.5
+    CIRCUIT_OPEN_SECONDS: float = 30.0
+    CIRCUIT_HALF_OPEN_CALLS: int = 3
+    HEDGE_ENABLED: bool = False  # fire a second attempt once a call exceeds the recent p95
+    HEDGE_MIN_DELAY_SECONDS: float = 2.0
+    HEDGE_MIN_SAMPLES: int = 20
+    LLM_METRICS_PERSIST: bool = True  # write one llm_calls row per call
+    LLM_METRICS_FLUSH_SIZE: int = 20
+    # USD per 1M tokens: [prompt, completion]
+    LLM_PRICING: dict[str, list[float]] = {
+        "gpt-4o-mini": [0.15, 0.60],
+        "gpt-4o": [2.50, 10.00],
+        "gpt-4.1-mini": [0.40, 1.60],
+    }
+    WARM_POOL_ENABLED: bool = True
+    WARM_POOL_TOP_N: int = 20  # most requested parameter combinations to keep warm
+    WARM_POOL_VARIANTS: int = 5  # plans kept per combination
+    WARM_POOL_CONCURRENCY: int = 4
+    WARM_POOL_MAX_AGE_SECONDS: int = 7 * 24 * 60 * 60
+    FOOD_TABLE_PATH: str = "ai/final_ingredients.csv"
+    INGREDIENT_ALIAS_PATH: str = "./ingredient_aliases.db"
+    PLAN_VERIFY_ENABLED: bool = True  # check generated plans against the food table
+    PLAN_CALORIE_TOLERANCE: float = 0.10  # allowed relative deviation from daily_calories
+    PLAN_MACRO_TOLERANCE: float = 0.10  # allowed share of energy in the wrong macros
+    PLAN_VERIFY_MIN_COVERAGE: float = 0.5  # days with fewer ingredients resolved are not judged
+    PLAN_VERIFY_MIN_CALORIE_COVERAGE: float = 0.8  # calories are only judged when this share comes from gram amounts
+    PLAN_VERIFY_ATTEMPTS: int = 1  # rounds of regenerating off-target days
+    PDF_CACHE_DIR: str = "./pdf_cache"
+    PDF_CACHE_MAX_FILES: int = 2000
+    PDF_RENDER_WORKERS: int = 2  # render processes, 0 renders in a thread instead
+    PDF_RENDER_QUEUE_SIZE: int = 16  # renders waiting for a worker before requests get 503
+    PDF_RENDER_TIMEOUT_SECONDS: float = 30.0
+    LOCAL_FALLBACK_ENABLED: bool = True
+    LLM_SOFT_TIMEOUT_SECONDS: float = 45.0
+    JOB_WORKERS: int = 4
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_STALE_SECONDS: int = 600
+    JOB_MAX_ATTEMPTS: int = 3
 
     model_config = ConfigDict(env_file=".env")
 
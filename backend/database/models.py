@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, LargeBinary, Index, Float
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -50,6 +50,7 @@ class MealPlan(Base):
     macro_protein = Column(Integer, nullable=False)
     macro_carbs = Column(Integer, nullable=False)
     macro_fats = Column(Integer, nullable=False)
+    deviation = Column(Float, nullable=True)  # Worst day's deviation from the targets per the food table; NULL if unverified
     created_at = Column(DateTime, default=datetime.utcnow)
 
     owner = relationship("User", back_populates="mealplans")
@@ -61,8 +62,75 @@ class MealHistory(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     mealplan_id = Column(Integer, ForeignKey("mealplans.id"))
-    day_number = Column(Integer, nullable=False)
+    day_number = Column(Integer, nullable=False)  # 1-7; 0 for legacy whole-plan rows
     meals_json = Column(Text, nullable=False)
+    total_calories = Column(Integer, nullable=True)
+    verified_calories = Column(Integer, nullable=True)  # Day total per the food table
+    deviation = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     mealplan = relationship("MealPlan", back_populates="history")
+
+    __table_args__ = (
+        Index("ix_mealhistory_plan_day", "mealplan_id", "day_number"),
+    )
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # Random hex job id
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    status = Column(String, default="pending", nullable=False, index=True)  # pending, running, done, failed
+    request_json = Column(Text, nullable=False)  # Serialized MealPlanCreate
+    mealplan_id = Column(Integer, ForeignKey("mealplans.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class WarmPlan(Base):
+    __tablename__ = "warm_plans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pool_key = Column(String, nullable=False, index=True)  # Cache key of the normalized request parameters
+    params_json = Column(Text, nullable=False)  # Normalized parameters, used to replenish the pool
+    plan_json = Column(Text, nullable=False)  # Validated 7-day plan
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LLMCall(Base):
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    model = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)  # plan, day or stream
+    diet_type = Column(String, nullable=True, index=True)
+    status = Column(String, nullable=False)  # ok, error or cancelled
+    queue_wait_ms = Column(Float, nullable=False, default=0)
+    ttft_ms = Column(Float, nullable=True)  # Only measured for streamed calls
+    latency_ms = Column(Float, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0)
+    retries = Column(Integer, nullable=False, default=0)
+    parse_failure = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+
+
+class Food(Base):
+    """
+    Cleaned USDA foods, loaded by ai/food_db.py. The importer recreates the
+    table with one column per catalogue nutrient; only the macros are mapped.
+    """
+    __tablename__ = "foods"
+
+    fdc_id = Column(Integer, primary_key=True)
+    description = Column(Text, nullable=False)
+    calories = Column(Float, nullable=False, default=0)  # Per 100 g
+    protein = Column(Float, nullable=False, default=0)
+    fat = Column(Float, nullable=False, default=0)
+    carbs = Column(Float, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 from datetime import datetime
 
@@ -62,18 +62,32 @@ class MealPlanResponse(BaseModel):
     macro_protein: int
     macro_carbs: int
     macro_fats: int
+    deviation: Optional[float] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class MealPlanJobResponse(BaseModel):
+    job_id: str
+    status: str
+    mealplan_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 # ----------- MEAL HISTORY SCHEMAS -----------
 
 class MealHistoryResponse(BaseModel):
     id: int
     day_number: int
     meals_json: str
+    total_calories: Optional[int] = None
+    verified_calories: Optional[int] = None
+    deviation: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -86,3 +100,81 @@ class MealPlanFullResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+# ----------- FOOD SEARCH SCHEMAS -----------
+
+class FoodSearchResult(BaseModel):
+    fdc_id: int
+    description: str
+    score: float
+    calories: float
+    protein: float
+    fat: float
+    carbs: float
+
+
+class FoodSearchResponse(BaseModel):
+    query: str
+    total: int
+    limit: int
+    offset: int
+    results: List[FoodSearchResult]
+
+
+class FoodMacros(BaseModel):
+    calories: float = Field(ge=0)
+    protein: float = Field(ge=0)
+    fat: float = Field(ge=0)
+    carbs: float = Field(ge=0)
+
+
+class FoodSubstitute(BaseModel):
+    fdc_id: int
+    description: str
+    distance: float
+    calories: float
+    protein: float
+    fat: float
+    carbs: float
+
+
+class FoodSubstitutesRequest(BaseModel):
+    fdc_ids: List[int] = Field(default_factory=list, max_length=200)
+    targets: List[FoodMacros] = Field(default_factory=list, max_length=200)
+    k: int = Field(5, ge=1, le=50)
+    diet_type: Optional[str] = None
+
+
+class FoodSubstitutesResult(BaseModel):
+    fdc_id: Optional[int] = None
+    description: Optional[str] = None
+    target: Optional[FoodMacros] = None
+    substitutes: List[FoodSubstitute]
+
+
+class FoodSubstitutesResponse(BaseModel):
+    results: List[FoodSubstitutesResult]
+
+
+class IngredientResolveRequest(BaseModel):
+    ingredients: List[str] = Field(max_length=500)
+
+
+class IngredientResolution(BaseModel):
+    ingredient: str
+    alias: str
+    fdc_id: Optional[int] = None
+    description: Optional[str] = None
+    confidence: float
+    source: str
+    cached: bool
+
+
+class IngredientResolveResponse(BaseModel):
+    results: List[IngredientResolution]
+
+
+class IngredientAliasUpdate(BaseModel):
+    ingredient: str
+    fdc_id: Optional[int] = None
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Load test for meal plan generation.
+Start the fake LLM server and the backend pointed at it, then run:
+
+    python load_test.py --token <access token> --requests 200 --concurrency 20
+
+Reports throughput and end-to-end latency percentiles (submit until the job
+is done), or time to first day with --stream.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+GOALS = ["weight loss", "muscle gain", "maintenance"]
+DIET_TYPES = ["balanced", "vegetarian", "vegan", "high protein"]
+
+
+def make_payload(distinct: int) -> dict:
+    # A small number of distinct payloads mimics our skewed real traffic
+    rng = random.Random(random.randrange(distinct))
+    return {
+        "goal": rng.choice(GOALS),
+        "daily_calories": rng.choice([1600, 1800, 2000, 2200, 2500]),
+        "diet_type": rng.choice(DIET_TYPES),
+        "macros": {"protein": 30, "carbs": 40, "fats": 30},
+    }
+
+
+async def run_job(client: httpx.AsyncClient, payload: dict, poll_interval: float) -> float:
+    start = time.perf_counter()
+    response = await client.post("/api/mealplan/", json=payload)
+    response.raise_for_status()
+    job_url = response.headers["location"]
+
+    while True:
+        await asyncio.sleep(poll_interval)
+        job = (await client.get(job_url)).json()
+        if job["status"] == "done":
+            return time.perf_counter() - start
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+
+
+async def run_stream(client: httpx.AsyncClient, payload: dict, poll_interval: float) -> float:
+    start = time.perf_counter()
+    first_day = None
+    async with client.stream("POST", "/api/mealplan/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == "event: day" and first_day is None:
+                first_day = time.perf_counter() - start
+            elif line == "event: error":
+                raise RuntimeError("stream reported an error")
+    if first_day is None:
+        raise RuntimeError("stream ended without any day")
+    return first_day
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def load_test(args):
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    latencies = []
+    failures = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    runner = run_stream if args.stream else run_job
+
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=300) as client:
+        async def one():
+            async with semaphore:
+                try:
+                    latencies.append(await runner(client, make_payload(args.distinct), args.poll_interval))
+                except Exception as e:
+                    failures.append(str(e))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(args.requests)])
+        elapsed = time.perf_counter() - start
+
+    label = "time to first day" if args.stream else "end-to-end latency"
+    print(f"Requests: {args.requests}  concurrency: {args.concurrency}  elapsed: {elapsed:.2f}s")
+    print(f"Throughput: {len(latencies) / elapsed:.2f} plans/s  failures: {len(failures)}")
+    if latencies:
+        print(
+            f"{label}: mean {statistics.mean(latencies):.3f}s  p50 {percentile(latencies, 50):.3f}s  "
+            f"p95 {percentile(latencies, 95):.3f}s  p99 {percentile(latencies, 99):.3f}s  "
+            f"max {max(latencies):.3f}s"
+        )
+    for error in sorted(set(failures))[:5]:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test meal plan generation")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Bearer access token of a test user")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--distinct", type=int, default=20, help="Number of distinct request payloads")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--stream", action="store_true", help="Use the SSE endpoint and time the first day")
+    asyncio.run(load_test(parser.parse_args()))
@@ -1,4 +1,6 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from database.database import engine
@@ -6,13 +8,36 @@ from database.models import Base
 from core.security import get_rate_limit_middleware
 
 
-from routers import mealplan, auth
+from routers import mealplan, auth, foods
 from core.config import settings
+from ai.llm_backends import close_backend
+from ai.job_queue import meal_plan_jobs
+from ai.warm_pool import warm_pool
+from ai.llm_metrics import llm_metrics
+from ai.food_substitutes import get_food_substitutes
+from ai.pdf_service import pdf_renderer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the meal plan generation workers
+    await meal_plan_jobs.start()
+    # Build the food search and substitution indexes before serving, off the event loop
+    await asyncio.to_thread(get_food_substitutes)
+    yield
+    await meal_plan_jobs.stop()
+    await warm_pool.stop()
+    await pdf_renderer.stop()
+    await asyncio.to_thread(llm_metrics.flush)
+    # Release pooled LLM connections
+    await close_backend()
+
 
 app = FastAPI(
     title="AI Nutritionist Backend",
     description="LLM-powered nutritional recommendation service",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 Base.metadata.create_all(bind=engine)
 
@@ -60,6 +85,28 @@ with engine.connect() as conn:
         conn.execute(text("ALTER TABLE users ADD COLUMN goal TEXT DEFAULT NULL"))
         conn.commit()
 
+    # Per-day meal history rows carry their own calorie total
+    result = conn.execute(text("PRAGMA table_info(mealhistory)"))
+    history_columns = [row[1] for row in result.fetchall()]
+    if 'total_calories' not in history_columns:
+        conn.execute(text("ALTER TABLE mealhistory ADD COLUMN total_calories INTEGER DEFAULT NULL"))
+        conn.commit()
+    # Verification against the food table
+    if 'verified_calories' not in history_columns:
+        conn.execute(text("ALTER TABLE mealhistory ADD COLUMN verified_calories INTEGER DEFAULT NULL"))
+        conn.commit()
+    if 'deviation' not in history_columns:
+        conn.execute(text("ALTER TABLE mealhistory ADD COLUMN deviation FLOAT DEFAULT NULL"))
+        conn.commit()
+    result = conn.execute(text("PRAGMA table_info(mealplans)"))
+    if 'deviation' not in [row[1] for row in result.fetchall()]:
+        conn.execute(text("ALTER TABLE mealplans ADD COLUMN deviation FLOAT DEFAULT NULL"))
+        conn.commit()
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_mealhistory_plan_day ON mealhistory (mealplan_id, day_number)"
+    ))
+    conn.commit()
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -78,6 +125,7 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # ---Routers---
 app.include_router(mealplan.router, prefix="/api")
+app.include_router(foods.router, prefix="/api")
 app.include_router(auth.router)
 
 @app.get("/")
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from database.schemas import FoodSearchResponse, FoodSubstitutesRequest, FoodSubstitutesResponse, FoodSubstitutesResult
+from database.schemas import IngredientResolveRequest, IngredientResolveResponse, IngredientAliasUpdate
+from database.models import User
+from ai.food_search import get_food_catalog
+from ai.food_substitutes import get_food_substitutes
+from ai.ingredient_resolver import ingredient_resolver
+from typing import Optional
+from routers.auth import get_current_user
+from routers.auth import is_user_admin
+
+
+router = APIRouter(prefix="/foods", tags=["Foods"])
+
+
+@router.get("/search", response_model=FoodSearchResponse)
+def search_foods(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    fuzzy: bool = True,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Autocomplete search over the cleaned USDA foods.
+    The last word of q matches as a prefix while it is being typed (no
+    trailing space); with fuzzy, misspelt words match similar food words.
+    """
+    catalog = get_food_catalog()
+    if catalog is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Food search is not available"
+        )
+    return catalog.search(q, limit=limit, offset=offset, fuzzy=fuzzy)
+
+
+@router.post("/substitutes", response_model=FoodSubstitutesResponse)
+def suggest_substitutes(
+    request: FoodSubstitutesRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Foods with the closest macros (per 100 g) to each given food or target
+    macro vector, in one batch, e.g. every ingredient of a plan at once.
+    Results come back foods first, then targets, each in request order.
+    """
+    substitutes = _get_substitutes()
+    targets = [[target.calories, target.protein, target.fat, target.carbs] for target in request.targets]
+    return {"results": substitutes.suggest(request.fdc_ids, targets, k=request.k, diet_type=request.diet_type)}
+
+
+@router.get("/{fdc_id}/substitutes", response_model=FoodSubstitutesResult)
+def get_substitutes(
+    fdc_id: int,
+    k: int = Query(5, ge=1, le=50),
+    diet_type: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Foods with the closest macros to one food"""
+    result = _get_substitutes().suggest([fdc_id], k=k, diet_type=diet_type)[0]
+    if result["target"] is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Food not found"
+        )
+    return result
+
+
+def _get_substitutes():
+    substitutes = get_food_substitutes()
+    if substitutes is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Food substitutions are not available"
+        )
+    return substitutes
+
+
+@router.post("/resolve", response_model=IngredientResolveResponse)
+def resolve_ingredients(
+    request: IngredientResolveRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Map free-text ingredient strings (as in generated meal plans) to foods.
+    Unresolved ingredients come back with a null fdc_id.
+    """
+    if get_food_catalog() is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Food search is not available"
+        )
+    return {"results": ingredient_resolver.resolve(request.ingredients)}
+
+
+@router.put("/aliases")
+def set_ingredient_alias(
+    request: IngredientAliasUpdate,
+    current_user: User = Depends(is_user_admin)
+):
+    """Pin an ingredient string to a food, or to no food with a null fdc_id - admin only"""
+    try:
+        alias = ingredient_resolver.set_alias(request.ingredient, request.fdc_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    return {"alias": alias, "fdc_id": request.fdc_id}
+
+
+@router.get("/stats")
+def get_food_search_stats(
+    current_user: User = Depends(is_user_admin)
+):
+    """Get food search index size, build time and cache counters - admin only"""
+    catalog = get_food_catalog()
+    if catalog is None:
+        return {"foods": 0}
+    substitutes = get_food_substitutes()
+    return {**catalog.stats(), "substitutes": substitutes.stats(), "resolver": ingredient_resolver.stats()}
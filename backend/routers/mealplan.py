@@ -1,28 +1,136 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from database.schemas import MealPlanCreate, MealPlanResponse, MealPlanFullResponse
-from database.database import get_db
-from database.models import MealPlan, MealHistory, User
-from ai.generator import generate_meal_plan
-from ai.pdf_generator import generate_meal_plan_pdf
+from sqlalchemy import select, func, case
+from database.schemas import MealPlanCreate, MealPlanResponse, MealPlanFullResponse, MealPlanJobResponse, MealHistoryResponse
+from database.database import get_db, SessionLocal
+from database.models import MealPlan, MealHistory, User, GenerationJob, LLMCall
+from ai.generator import stream_meal_plan, get_generation_stats
+from ai.job_queue import meal_plan_jobs
+from ai.warm_pool import warm_pool
+from ai.llm_metrics import llm_metrics
+from core.config import settings
+from ai.concurrency import GenerationOverloaded
+from ai.plan_schema import day_total_calories
+from ai.pdf_generator import pdf_cache, plan_content_hash
+from ai.pdf_service import pdf_renderer, PdfRenderOverloaded, PdfRenderTimeout, PdfRenderUnavailable
+from ai.plan_export import stream_plan_export, parse_meals_json
 from routers.auth import get_current_user
 from routers.auth import is_user_admin
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
+from datetime import datetime
+from typing import Optional
+import asyncio
 import json
+import logging
+import threading
 import tempfile
 import os
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/mealplan", tags=["Meal Plan"])
 
 
-@router.post("/", response_model=MealPlanResponse)
+@router.post("/", response_model=MealPlanJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_meal_plan(
-    request: MealPlanCreate, 
+    request: MealPlanCreate,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Queue a meal plan for generation.
+    Returns 202 with a job id; poll GET /mealplan/jobs/{job_id} until the
+    status is "done" and then fetch the plan by its mealplan_id. Popular
+    requests served from the warm pool come back already "done".
+    """
+    plan = warm_pool.take(db, request) if settings.WARM_POOL_ENABLED else None
+    if plan is not None:
+        job = await meal_plan_jobs.record_ready(db, current_user.id, request, plan)
+    else:
+        job = meal_plan_jobs.enqueue(db, current_user.id, request)
+    response.headers["Location"] = f"/api/mealplan/jobs/{job.id}"
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=MealPlanJobResponse)
+def get_meal_plan_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of a meal plan generation job"""
+    job = db.execute(
+        select(GenerationJob).where(
+            GenerationJob.id == job_id,
+            GenerationJob.user_id == current_user.id
+        )
+    ).scalar_one_or_none()
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan job not found"
+        )
+
+    return _job_response(job)
+
+
+def _job_response(job: GenerationJob) -> MealPlanJobResponse:
+    return MealPlanJobResponse(
+        job_id=job.id,
+        status=job.status,
+        mealplan_id=job.mealplan_id,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
+
+def _save_stream_day(stream_db: Session, lock: threading.Lock, mealplan_id: int, day: dict):
+    with lock:
+        stream_db.add(MealHistory(
+            mealplan_id=mealplan_id,
+            day_number=day["day"],
+            meals_json=json.dumps(day),
+            total_calories=day_total_calories(day)
+        ))
+        stream_db.commit()
+
+
+def _close_stream(stream_db: Session, lock: threading.Lock, mealplan_id: int, discard: bool):
+    """Close a stream's session, first removing its plan and partial days if discard"""
+    # Waits for a day write still running in another thread
+    with lock:
+        try:
+            if discard:
+                stream_db.rollback()
+                stream_db.query(MealHistory).filter(MealHistory.mealplan_id == mealplan_id).delete()
+                stream_db.query(MealPlan).filter(MealPlan.id == mealplan_id).delete()
+                stream_db.commit()
+        except Exception as e:
+            logger.error(f"Failed to remove unfinished streamed meal plan {mealplan_id}: {e}")
+        finally:
+            stream_db.close()
+
+
+def _sse_event(event: str, data) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def stream_meal_plan_days(
+    request: MealPlanCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate a meal plan and stream each day over Server-Sent Events.
+    Events: "plan" (the created record), "day" (one per parsed day),
+    "done" when finished, or "error" if generation fails.
+    """
     # Create meal plan record in database
     db_meal_plan = MealPlan(
         user_id=current_user.id,
@@ -33,58 +141,84 @@ async def create_meal_plan(
         macro_carbs=request.macros.carbs,
         macro_fats=request.macros.fats
     )
-    
+
     db.add(db_meal_plan)
     db.commit()
     db.refresh(db_meal_plan)
-    
-    # Generate the meal plan using AI
-    try:
-        generated_plan = await generate_meal_plan(request)
-        
-        # Save the generated plan to MealHistory
-        meal_history = MealHistory(
-            mealplan_id=db_meal_plan.id,
-            day_number=0,  # 0 indicates the full plan
-            meals_json=generated_plan
-        )
-        
-        db.add(meal_history)
-        db.commit()
-        
-        # Return as response model to ensure proper serialization
-        # Use a separate query to fetch only the needed fields without relationships
-        created_plan = db.execute(
-            select(
-                MealPlan.id,
-                MealPlan.goal,
-                MealPlan.diet_type,
-                MealPlan.daily_calories,
-                MealPlan.macro_protein,
-                MealPlan.macro_carbs,
-                MealPlan.macro_fats,
-                MealPlan.created_at
-            ).where(MealPlan.id == db_meal_plan.id)
-        ).first()
-        
-        return MealPlanResponse(
-            id=created_plan.id,
-            goal=created_plan.goal,
-            diet_type=created_plan.diet_type,
-            daily_calories=created_plan.daily_calories,
-            macro_protein=created_plan.macro_protein,
-            macro_carbs=created_plan.macro_carbs,
-            macro_fats=created_plan.macro_fats,
-            created_at=created_plan.created_at
-        )
-    except Exception as e:
-        # If generation fails, remove the meal plan record
-        db.delete(db_meal_plan)
-        db.commit()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate meal plan: {str(e)}"
-        )
+
+    plan_response = MealPlanResponse(
+        id=db_meal_plan.id,
+        goal=db_meal_plan.goal,
+        diet_type=db_meal_plan.diet_type,
+        daily_calories=db_meal_plan.daily_calories,
+        macro_protein=db_meal_plan.macro_protein,
+        macro_carbs=db_meal_plan.macro_carbs,
+        macro_fats=db_meal_plan.macro_fats,
+        created_at=db_meal_plan.created_at
+    )
+    mealplan_id = db_meal_plan.id
+
+    async def event_stream():
+        # The request-scoped session may be closed while the body is still
+        # streaming, so days are persisted through a session owned by the stream,
+        # in worker threads that take turns on it
+        stream_db = SessionLocal()
+        stream_lock = threading.Lock()
+        days_saved = 0
+        done = False
+        try:
+            yield _sse_event("plan", plan_response.model_dump(mode="json"))
+
+            # Days arrive validated, with missing or malformed ones regenerated
+            async for day in stream_meal_plan(request):
+                await asyncio.to_thread(_save_stream_day, stream_db, stream_lock, mealplan_id, day)
+                days_saved += 1
+                yield _sse_event("day", day)
+
+            done = True
+            yield _sse_event("done", {"mealplan_id": mealplan_id, "days": days_saved})
+        except Exception as e:
+            status_code = (
+                status.HTTP_503_SERVICE_UNAVAILABLE
+                if isinstance(e, GenerationOverloaded)
+                else status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+            yield _sse_event("error", {
+                "status_code": status_code,
+                "detail": f"Failed to generate meal plan: {str(e)}"
+            })
+        finally:
+            # Also reached when the client disconnects (GeneratorExit or
+            # cancellation): a plan that never finished is removed with its
+            # partial days. Not awaited, since a cancelled stream cannot await.
+            asyncio.get_running_loop().run_in_executor(
+                None, _close_stream, stream_db, stream_lock, mealplan_id, not done
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/export")
+async def export_meal_plans(
+    start: Optional[datetime] = Query(None, description="Plans created at or after this time"),
+    end: Optional[datetime] = Query(None, description="Plans created before this time"),
+    format: str = Query("json", pattern="^(json|pdf)$"),
+    current_user: User = Depends(is_user_admin)
+):
+    """
+    Export every meal plan created in [start, end) as a streamed ZIP archive
+    with one plans/<id>.json or plans/<id>.pdf entry per plan - admin only
+    """
+    filename = f"meal_plans_{datetime.utcnow():%Y%m%d_%H%M%S}.zip"
+    return StreamingResponse(
+        stream_plan_export(start, end, format),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @router.get("/{mealplan_id}", response_model=MealPlanFullResponse)
@@ -125,8 +259,10 @@ def get_meal_plan(
             MealHistory.id,
             MealHistory.day_number,
             MealHistory.meals_json,
+            MealHistory.total_calories,
             MealHistory.created_at
         ).where(MealHistory.mealplan_id == mealplan_id)
+        .order_by(MealHistory.day_number)
     )
     
     # Convert to response models to ensure proper serialization
@@ -147,6 +283,7 @@ def get_meal_plan(
             id=hist.id,
             day_number=hist.day_number,
             meals_json=hist.meals_json,
+            total_calories=hist.total_calories,
             created_at=hist.created_at
         )
         history_responses.append(history_response)
@@ -157,6 +294,117 @@ def get_meal_plan(
     }
 
 
+@router.get("/{mealplan_id}/days/{day_number}", response_model=MealHistoryResponse)
+def get_meal_plan_day(
+    mealplan_id: int,
+    day_number: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a single day of a meal plan without loading the rest of the week"""
+    history_row = db.execute(
+        select(
+            MealHistory.id,
+            MealHistory.day_number,
+            MealHistory.meals_json,
+            MealHistory.total_calories,
+            MealHistory.created_at
+        ).join(MealPlan, MealPlan.id == MealHistory.mealplan_id)
+        .where(
+            MealHistory.mealplan_id == mealplan_id,
+            MealHistory.day_number == day_number,
+            MealPlan.user_id == current_user.id
+        )
+    ).first()
+
+    if not history_row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan day not found"
+        )
+
+    return MealHistoryResponse(
+        id=history_row.id,
+        day_number=history_row.day_number,
+        meals_json=history_row.meals_json,
+        total_calories=history_row.total_calories,
+        created_at=history_row.created_at
+    )
+
+
+def _load_pdf_content(db: Session, mealplan_id: int, user_id: int) -> Optional[tuple]:
+    """(plan fields, days) a plan's PDF is rendered from, None if the user has no such plan"""
+    plan_row = db.execute(
+        select(
+            MealPlan.id,
+            MealPlan.goal,
+            MealPlan.diet_type,
+            MealPlan.daily_calories,
+            MealPlan.macro_protein,
+            MealPlan.macro_carbs,
+            MealPlan.macro_fats
+        ).where(
+            MealPlan.id == mealplan_id,
+            MealPlan.user_id == user_id
+        )
+    ).first()
+    if not plan_row:
+        return None
+
+    history_rows = db.execute(
+        select(MealHistory.meals_json)
+        .where(MealHistory.mealplan_id == mealplan_id)
+        .order_by(MealHistory.day_number)
+    ).scalars().all()
+    days = [day for meals_json in history_rows for day in parse_meals_json(meals_json)]
+    return dict(plan_row._mapping), days
+
+
+@router.get("/{mealplan_id}/pdf")
+async def download_meal_plan_pdf(
+    mealplan_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Download a meal plan as PDF.
+    The ETag is a hash of the plan content: send it back in If-None-Match
+    to get a 304, or in If-Range to resume a partial download.
+    Returns 503 while the render queue is full or when the render worker
+    went away under the request.
+    """
+    content = await asyncio.to_thread(_load_pdf_content, db, mealplan_id, current_user.id)
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan not found"
+        )
+
+    plan, days = content
+    content_hash = plan_content_hash(plan, days)
+    etag = f'"{content_hash}"'
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    try:
+        path = await pdf_renderer.render(plan, days, content_hash)
+    except (PdfRenderOverloaded, PdfRenderUnavailable) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except PdfRenderTimeout as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=f"meal_plan_{mealplan_id}.pdf",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
 @router.get("/user", response_model=list[MealPlanResponse])
 def get_user_meal_plans(
     current_user: User = Depends(get_current_user),
@@ -238,6 +486,77 @@ def get_all_meal_plans(
     return response_models
 
 
+@router.get("/stats/generation")
+def get_meal_plan_generation_stats(
+    current_user: User = Depends(is_user_admin)
+):
+    """Get meal plan generation counters (cache, concurrency, jobs, warm pool) - admin only"""
+    return {**get_generation_stats(), "jobs": meal_plan_jobs.stats(), "warm_pool": warm_pool.stats()}
+
+
+@router.get("/stats/pdfs")
+def get_pdf_render_stats(
+    current_user: User = Depends(is_user_admin)
+):
+    """PDF render queue depth, render and queue wait times, cache hits (admin only)"""
+    return pdf_renderer.stats()
+
+
+@router.get("/stats/llm")
+def get_llm_metrics(
+    format: str = "json",
+    current_user: User = Depends(is_user_admin)
+):
+    """
+    Get LLM call metrics per model, call kind and diet type - admin only.
+    format=prometheus returns the Prometheus text exposition instead of JSON.
+    """
+    if format == "prometheus":
+        return PlainTextResponse(llm_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+    return {"series": llm_metrics.snapshot()}
+
+
+@router.get("/stats/llm/calls")
+def get_llm_call_summary(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    model: Optional[str] = None,
+    diet_type: Optional[str] = None,
+    current_user: User = Depends(is_user_admin),
+    db: Session = Depends(get_db)
+):
+    """Summarize recorded LLM calls from the llm_calls table, grouped by model, kind and diet type - admin only"""
+    llm_metrics.flush()
+
+    query = select(
+        LLMCall.model,
+        LLMCall.kind,
+        LLMCall.diet_type,
+        func.count().label("calls"),
+        func.sum(case((LLMCall.status == "error", 1), else_=0)).label("errors"),
+        func.sum(case((LLMCall.parse_failure, 1), else_=0)).label("parse_failures"),
+        func.sum(LLMCall.retries).label("retries"),
+        func.avg(LLMCall.queue_wait_ms).label("avg_queue_wait_ms"),
+        func.avg(LLMCall.ttft_ms).label("avg_ttft_ms"),
+        func.avg(LLMCall.latency_ms).label("avg_latency_ms"),
+        func.max(LLMCall.latency_ms).label("max_latency_ms"),
+        func.sum(LLMCall.prompt_tokens).label("prompt_tokens"),
+        func.sum(LLMCall.completion_tokens).label("completion_tokens"),
+        func.sum(LLMCall.cost_usd).label("cost_usd")
+    ).group_by(LLMCall.model, LLMCall.kind, LLMCall.diet_type)
+
+    if since is not None:
+        query = query.where(LLMCall.created_at >= since)
+    if until is not None:
+        query = query.where(LLMCall.created_at < until)
+    if model is not None:
+        query = query.where(LLMCall.model == model)
+    if diet_type is not None:
+        query = query.where(LLMCall.diet_type == diet_type)
+
+    return [dict(row._mapping) for row in db.execute(query)]
+
+
 @router.delete("/{mealplan_id}")
 def delete_meal_plan(
     mealplan_id: int,
@@ -260,6 +579,7 @@ def delete_meal_plan(
     # Perform the deletion
     db.query(MealPlan).filter(MealPlan.id == mealplan_id).delete()
     db.commit()
+    pdf_cache.invalidate(mealplan_id)
     
     return {"message": "Meal plan deleted successfully"}
 
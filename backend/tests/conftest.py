@@ -1,3 +1,5 @@
+import random
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -5,6 +7,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from database.database import Base, get_db
 from database.models import User
+from database.schemas import MealPlanCreate, Macros
 from passlib.context import CryptContext
 from unittest.mock import patch
 
@@ -38,6 +41,92 @@ def test_db():
     connection.close()
 
 
+@pytest.fixture
+def session_factory(tmp_path):
+    """Session factory over a fresh SQLite database file with every table"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def make_request():
+    """Factory of MealPlanCreate requests"""
+    def make(goal="Weight Loss", calories=2000, diet_type="balanced"):
+        return MealPlanCreate(goal=goal, daily_calories=calories, diet_type=diet_type, macros=Macros(protein=30, carbs=40, fats=30))
+    return make
+
+
+FOODS_CSV = """description,calories,protein,fat,carbs
+"Lentils, mature seeds, cooked, boiled",116,9.02,0.38,20.13
+"Teff, cooked",101,3.87,0.65,19.86
+"Rice, white, cooked",130,2.69,0.28,28.17
+"Chicken, breast, roasted",165,31.02,3.57,0
+"Fish, tilapia, cooked",128,26.15,2.65,0
+"Egg, whole, hard-boiled",155,12.58,10.61,1.12
+"Avocados, raw",160,2,14.66,8.53
+"Peanuts, roasted",585,23.68,49.66,21.51
+"Oil, olive",884,0,100,0
+"Bananas, raw",89,1.09,0.33,22.84
+"Tofu, firm",144,17.27,8.72,2.78
+"Cheese, cottage",98,11.12,4.3,3.38
+"Mislabeled entry",900,0,0,0
+"""
+
+
+@pytest.fixture
+def foods_csv(tmp_path):
+    """final_ingredients.csv of a dozen foods (and one mislabeled row) in tmp_path"""
+    path = tmp_path / "final_ingredients.csv"
+    path.write_text(FOODS_CSV)
+    return path
+
+
+@pytest.fixture
+def usda_files(tmp_path):
+    """Writer of synthetic USDA food.csv and food_nutrient.csv files into tmp_path; returns the nutrient row count"""
+    def write(foods=300, seed=7):
+        rng = random.Random(seed)
+        food_lines = ["fdc_id,data_type,description,food_category_id,publication_date"]
+        nutrient_lines = ["id,fdc_id,nutrient_id,amount,data_points,derivation_id,min,max,median,footnote,min_year_acquired"]
+        row_id = 1
+        for fdc_id in range(100000, 100000 + foods):
+            if fdc_id % 17:
+                food_lines.append(f'{fdc_id},sr_legacy_food,"Food {fdc_id}, raw",1,2019-04-01')
+            for nutrient_id in (1003, 1004, 1005, 1008, 1051, 1087):
+                if rng.random() < 0.1:
+                    continue  # nutrient not measured for this food
+                repeats = 2 if rng.random() < 0.05 else 1  # duplicate measurements get averaged
+                for _ in range(repeats):
+                    amount = "" if rng.random() < 0.02 else f"{rng.uniform(0, 900):.3f}"
+                    nutrient_lines.append(f"{row_id},{fdc_id},{nutrient_id},{amount},,,,,,,")
+                    row_id += 1
+        body = nutrient_lines[1:]
+        rng.shuffle(body)
+        nutrient_lines = nutrient_lines[:1] + body
+        (tmp_path / "food.csv").write_text("\n".join(food_lines) + "\n")
+        (tmp_path / "food_nutrient.csv").write_text("\n".join(nutrient_lines) + "\n")
+        return row_id - 1
+    return write
+
+
+@pytest.fixture
+def plan_days():
+    """Seven stored plan days as the PDF renderer and exports read them"""
+    return [
+        {
+            "day": day, "total_calories": 1800,
+            "meals": [
+                {"name": "Lentil stew", "calories": 700, "ingredients": ["150 g lentils", "onion", "berbere"]},
+                {"name": "Injera & shiro", "calories": 900, "ingredients": ["injera", "chickpea flour"]},
+            ],
+            "snacks": [{"name": "Yogurt <plain>", "calories": 200}],
+        }
+        for day in range(1, 8)
+    ]
+
+
 @pytest.fixture(scope="function")
 def client(test_db):
     """Create a test client with rate limiting disabled"""
@@ -0,0 +1,187 @@
+import asyncio
+import pytest
+from ai.circuit_breaker import CircuitBreaker, CircuitOpen, hedged
+from ai.concurrency import GenerationOverloaded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock):
+    return CircuitBreaker(
+        window_seconds=60, min_calls=4, error_rate=0.5, slow_call_seconds=10,
+        slow_call_rate=0.5, open_seconds=30, half_open_calls=2, clock=clock
+    )
+
+
+def test_breaker_trips_on_errors_and_recovers_after_probes():
+    """Test that the breaker opens on a high error rate and closes after successful probes"""
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for ok in (True, False, True, False):
+        breaker.allow()
+        breaker.record(1.0, ok=ok)
+
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    # Callers treat an open circuit like any other overload
+    assert issubclass(CircuitOpen, GenerationOverloaded)
+
+    clock.now += 31
+    breaker.allow()
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()  # only two probes while half-open
+    breaker.record(1.0, ok=True, probe=True)
+    breaker.record(1.0, ok=True, probe=True)
+    assert breaker.state == "closed"
+    assert breaker.stats()["trips"] == 1
+
+
+def test_breaker_trips_on_slow_calls_and_reopens_on_failed_probe():
+    """Test that slow successes trip the breaker and a slow probe re-opens it"""
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for latency in (1.0, 12.0, 15.0, 2.0):
+        breaker.record(latency, ok=True)
+    assert breaker.state == "open"
+
+    clock.now += 31
+    breaker.allow()
+    breaker.record(20.0, ok=True, probe=True)
+    assert breaker.state == "open"
+    assert breaker.stats()["trips"] == 2
+
+
+def test_straggler_outcomes_do_not_decide_half_open():
+    """Test that calls admitted before the trip neither close nor re-open a half-open breaker"""
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    stragglers = [breaker.allow() for _ in range(3)]
+    assert stragglers == [False, False, False]
+    for _ in range(4):
+        breaker.record(1.0, ok=False)
+    clock.now += 31
+    assert breaker.allow()
+
+    breaker.record(1.0, ok=True, probe=stragglers[0])
+    breaker.record(1.0, ok=True, probe=stragglers[1])
+    assert breaker.state == "half_open"
+    breaker.record(1.0, ok=False, probe=stragglers[2])
+    assert breaker.state == "half_open"
+    assert breaker.stats()["trips"] == 1
+
+    breaker.record(1.0, ok=True, probe=True)
+    assert breaker.allow()
+    breaker.record(1.0, ok=True, probe=True)
+    assert breaker.state == "closed"
+
+
+def test_hedged_returns_faster_second_attempt():
+    """Test that a hedge fires after the delay and the first finisher wins"""
+    delays = [1.0, 0.01]
+    started = []
+
+    async def call(hedge):
+        delay = delays[hedge]
+        started.append(delay)
+        await asyncio.sleep(delay)
+        return delay
+
+    result, was_hedged = asyncio.run(hedged(call, 0.05))
+    assert (result, was_hedged) == (0.01, True)
+    assert started == [1.0, 0.01]
+
+
+def test_hedged_skips_hedge_for_fast_calls():
+    """Test that no second attempt is made when the first finishes in time"""
+    calls = []
+
+    async def call(hedge):
+        calls.append(hedge)
+        return "plan"
+
+    assert asyncio.run(hedged(call, 0.5)) == ("plan", False)
+    assert calls == [False]
+
+
+def test_unreported_probes_are_released_or_expire():
+    """Test that a released probe can be retried and stuck probes re-open the breaker"""
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(1.0, ok=False)
+    clock.now += 31
+    assert breaker.allow() and breaker.allow()
+    breaker.release(True)
+    assert breaker.allow()  # the released slot is free again
+
+    # Neither probe ever reports: after open_seconds the breaker opens instead of hanging
+    clock.now += 31
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert breaker.state == "open"
+    clock.now += 31
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+
+
+def test_overloaded_or_cancelled_calls_do_not_use_up_probes(monkeypatch):
+    """Test that gate rejections and cancelled calls leave half-open probes available"""
+    from ai import generator
+    from ai.concurrency import ConcurrencyGate
+    from ai.llm_backends import FakeBackend, FakeCompletionModel
+
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(1.0, ok=False)
+    clock.now += 31
+    monkeypatch.setattr(generator, "llm_breaker", breaker)
+    monkeypatch.setattr(generator.settings, "HEDGE_ENABLED", False)
+    backend = FakeBackend(FakeCompletionModel(latency="fixed:10", error_rate=0.0))
+    monkeypatch.setattr(generator, "get_backend", lambda: backend)
+
+    async def scenario():
+        monkeypatch.setattr(generator, "generation_gate", ConcurrencyGate(limit=0, queue_timeout=0.01))
+        for _ in range(3):
+            with pytest.raises(GenerationOverloaded):
+                await generator._call_llm("prompt", "model", None, "plan", "", str)
+
+        monkeypatch.setattr(generator, "generation_gate", ConcurrencyGate(limit=4))
+        calls = [asyncio.ensure_future(generator._call_llm("prompt", "model", None, "plan", "", str)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert breaker.state == "half_open"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_hedged_cancels_first_attempt_when_cancelled():
+    """Test that cancelling the caller while waiting on the first attempt cancels it"""
+    cancelled = []
+
+    async def call(hedge):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(hedge)
+            raise
+
+    async def scenario():
+        task = asyncio.ensure_future(hedged(call, 5.0))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        return list(cancelled)
+
+    assert asyncio.run(scenario()) == [False]
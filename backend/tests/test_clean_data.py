@@ -0,0 +1,174 @@
+import json
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+from ai.clean_data import run, output_columns, pivot_chunked, shard_ranges  # noqa: E402
+from ai.nutrients import load_catalogue  # noqa: E402
+
+
+def test_chunked_output_matches_in_memory_pivot(tmp_path, usda_files):
+    """Test that the streaming ETL writes the same table as the pandas pivot_table path"""
+    rows = usda_files()
+    food, nutrients = str(tmp_path / "food.csv"), str(tmp_path / "food_nutrient.csv")
+
+    memory_stats = run(food, nutrients, str(tmp_path / "memory.csv"), mode="memory")
+    chunked_stats = run(food, nutrients, str(tmp_path / "chunked.csv"), mode="chunked", chunk_rows=97)
+
+    memory = (tmp_path / "memory.csv").read_bytes()
+    chunked = (tmp_path / "chunked.csv").read_bytes()
+    assert chunked == memory
+    assert chunked_stats["rows"] == memory_stats["rows"] == rows
+    assert chunked_stats["foods"] > 0
+    assert chunked_stats["rows_per_second"] > 0
+
+    table = pd.read_csv(tmp_path / "chunked.csv")
+    assert list(table.columns) == output_columns()
+    assert list(table.columns[:5]) == ["description", "calories", "protein", "fat", "carbs"]
+    assert table["calcium"].gt(0).any()
+
+
+def test_scatter_pivot_matches_pivot_table(tmp_path, usda_files):
+    """Test that the vectorized pivot averages duplicates like pandas pivot_table"""
+    usda_files()
+    catalogue = load_catalogue(None)
+    pivot = pivot_chunked(str(tmp_path / "food_nutrient.csv"), {}, chunk_rows=50)
+    assert pivot.to_numpy().dtype == np.float32
+
+    nutrients = pd.read_csv(tmp_path / "food_nutrient.csv")
+    names = {nutrient.id: nutrient.name for nutrient in catalogue}
+    expected = nutrients[nutrients["nutrient_id"].isin(list(names))].pivot_table(
+        index="fdc_id", columns="nutrient_id", values="amount"
+    ).rename(columns=names).reindex(columns=pivot.columns).fillna(0)
+    assert list(pivot.index) == list(expected.index)
+    np.testing.assert_allclose(pivot.to_numpy(), expected.to_numpy(), rtol=1e-6)
+
+
+def test_custom_catalogue(tmp_path, usda_files):
+    """Test that a JSON catalogue picks the extracted columns and their units"""
+    from ai.food_table import FoodTable
+
+    usda_files()
+    catalogue_file = tmp_path / "catalogue.json"
+    catalogue_file.write_text(json.dumps([
+        {"id": 1008, "name": "calories", "unit": "kcal"},
+        {"id": 1003, "name": "protein", "unit": "g"},
+        {"id": 1004, "name": "fat", "unit": "g"},
+        {"id": 1005, "name": "carbs", "unit": "g"},
+        {"id": 1051, "name": "water", "unit": "g"},
+    ]))
+    catalogue = load_catalogue(str(catalogue_file))
+    output, table_file = tmp_path / "final.csv", tmp_path / "final.foodtable"
+    run(str(tmp_path / "food.csv"), str(tmp_path / "food_nutrient.csv"), str(output), table_file=str(table_file), catalogue=catalogue)
+
+    assert list(pd.read_csv(output).columns) == ["description", "calories", "protein", "fat", "carbs", "water"]
+    with FoodTable(str(table_file)) as table:
+        assert table.nutrients == ["calories", "protein", "fat", "carbs", "water"]
+        assert table.units["water"] == "g"
+
+    catalogue_file.write_text(json.dumps([{"id": 1051, "name": "water"}]))
+    with pytest.raises(ValueError):
+        load_catalogue(str(catalogue_file))
+
+
+def rewrite_release(tmp_path):
+    """Simulate a new USDA release: edit, add and drop a few foods, rename one"""
+    nutrient_lines = (tmp_path / "food_nutrient.csv").read_text().splitlines()
+    kept = [nutrient_lines[0]]
+    for line in nutrient_lines[1:]:
+        fields = line.split(",")
+        if fields[1] == "100003":
+            continue  # food dropped from the release
+        if fields[1] in ("100010", "100011") and fields[3]:
+            fields[3] = f"{float(fields[3]) + 1.5:.3f}"
+        kept.append(",".join(fields))
+    kept.append("999999,100500,1008,123.000,,,,,,,")
+    kept.append("1000000,100500,1003,4.500,,,,,,,")
+    (tmp_path / "food_nutrient.csv").write_text("\n".join(kept) + "\n")
+
+    food = (tmp_path / "food.csv").read_text()
+    food = food.replace('"Food 100020, raw"', '"Food 100020, roasted"')
+    food += '100500,sr_legacy_food,"New food, raw",1,2024-04-01\n'
+    (tmp_path / "food.csv").write_text(food)
+
+
+def test_incremental_run_matches_full_rerun(tmp_path, usda_files):
+    """Test that an incremental update writes the same outputs as reprocessing the new release"""
+    from ai.food_table import FoodTable
+
+    usda_files()
+    food, nutrients = str(tmp_path / "food.csv"), str(tmp_path / "food_nutrient.csv")
+    output, table = str(tmp_path / "final.csv"), str(tmp_path / "final.foodtable")
+    run(food, nutrients, output, chunk_rows=97, table_file=table)
+
+    unchanged = run(food, nutrients, output, chunk_rows=97, table_file=table, incremental=True)
+    assert unchanged["rows"] == 0 and unchanged["changed"] == 0
+
+    rewrite_release(tmp_path)
+    stats = run(food, nutrients, output, chunk_rows=97, table_file=table, incremental=True)
+    assert (stats["changed"], stats["added"], stats["removed"]) == (3, 1, 1)
+    assert stats["patched"] == "rewritten"
+
+    full_output, full_table = str(tmp_path / "full.csv"), str(tmp_path / "full.foodtable")
+    run(food, nutrients, full_output, chunk_rows=97, table_file=full_table)
+    assert (tmp_path / "final.csv").read_bytes() == (tmp_path / "full.csv").read_bytes()
+    with FoodTable(table) as patched, FoodTable(full_table) as fresh:
+        assert patched.fdc_ids.tolist() == fresh.fdc_ids.tolist()
+        assert patched.descriptions() == fresh.descriptions()
+        assert (patched.matrix() == fresh.matrix()).all()
+
+
+def test_incremental_run_patches_food_table_in_place(tmp_path, usda_files):
+    """Test that a release that only changes amounts is patched into the existing table"""
+    from ai.food_table import FoodTable
+
+    usda_files()
+    food, nutrients = str(tmp_path / "food.csv"), str(tmp_path / "food_nutrient.csv")
+    output, table = str(tmp_path / "final.csv"), str(tmp_path / "final.foodtable")
+    run(food, nutrients, output, table_file=table)
+    inode = (tmp_path / "final.foodtable").stat().st_ino
+
+    lines = (tmp_path / "food_nutrient.csv").read_text().splitlines()
+    lines = [line.replace(",100010,1008,", ",100010,1008,1") if ",100010,1008," in line else line for line in lines]
+    (tmp_path / "food_nutrient.csv").write_text("\n".join(lines) + "\n")
+
+    stats = run(food, nutrients, output, table_file=table, incremental=True)
+    assert stats["changed"] == 1 and stats["patched"] == "in_place"
+    assert (tmp_path / "final.foodtable").stat().st_ino == inode
+
+    csv_table = pd.read_csv(output)
+    with FoodTable(table) as patched:
+        assert abs(patched["calories"] - csv_table["calories"].to_numpy()).max() < 1e-3
+
+
+def test_shard_ranges_split_on_line_boundaries(tmp_path, usda_files):
+    """Test that byte-range shards cover every data line exactly once"""
+    usda_files()
+    path = tmp_path / "food_nutrient.csv"
+    data = path.read_bytes()
+    ranges = shard_ranges(str(path), 7)
+
+    assert len(ranges) == 7
+    assert ranges[0][0] == data.index(b"\n") + 1
+    assert ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[start - 1:start] == b"\n"
+    assert b"".join(data[start:end] for start, end in ranges) == data[ranges[0][0]:]
+
+
+def test_parallel_output_matches_serial(tmp_path, usda_files):
+    """Test that the sharded process-pool ETL writes byte-identical outputs"""
+    usda_files(foods=500)
+    food, nutrients = str(tmp_path / "food.csv"), str(tmp_path / "food_nutrient.csv")
+
+    serial = run(food, nutrients, str(tmp_path / "serial.csv"), table_file=str(tmp_path / "serial.foodtable"))
+    parallel = run(
+        food, nutrients, str(tmp_path / "parallel.csv"), mode="parallel", chunk_rows=100,
+        table_file=str(tmp_path / "parallel.foodtable"), workers=3
+    )
+
+    assert parallel["rows"] == serial["rows"]
+    assert (tmp_path / "parallel.csv").read_bytes() == (tmp_path / "serial.csv").read_bytes()
+    assert (tmp_path / "parallel.foodtable").read_bytes() == (tmp_path / "serial.foodtable").read_bytes()
+    assert (tmp_path / "parallel.hashes.npz").exists()
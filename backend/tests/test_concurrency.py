@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from ai.concurrency import ConcurrencyGate, GenerationOverloaded
+
+
+def test_gate_rejects_after_queue_timeout():
+    """Test that a caller waiting longer than the queue timeout is rejected"""
+    gate = ConcurrencyGate(limit=1, queue_timeout=0.05)
+
+    async def scenario():
+        async with gate.slot():
+            with pytest.raises(GenerationOverloaded):
+                async with gate.slot():
+                    pass
+        # The slot is released once the holder exits
+        async with gate.slot():
+            pass
+
+    asyncio.run(scenario())
+    stats = gate.stats()
+    assert stats["rejected"] == 1
+    assert stats["admitted"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_gate_admits_queued_caller_when_slot_frees():
+    """Test that a queued caller gets the slot if it frees up in time"""
+    gate = ConcurrencyGate(limit=1, queue_timeout=1.0)
+    order = []
+
+    async def worker(name, hold):
+        async with gate.slot():
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def scenario():
+        await asyncio.gather(worker("first", 0.05), worker("second", 0))
+
+    asyncio.run(scenario())
+    assert order == ["first", "second"]
+    assert gate.stats()["rejected"] == 0
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import re
+import time
+
+import pytest
+
+from ai import generator
+from ai.circuit_breaker import CircuitBreaker
+from ai.concurrency import ConcurrencyGate, GenerationOverloaded
+from ai.llm_backends import Completion, FakeBackend, FakeCompletionModel
+from ai.plan_cache import normalize_plan_params
+
+
+class ScriptedBackend(FakeBackend):
+    """FakeBackend that counts day prompts and can break chosen days"""
+
+    def __init__(self, latency="fixed:0", invalid_once=(), failing=()):
+        super().__init__(FakeCompletionModel(latency=latency, tokens_per_second=0, error_rate=0.0, seed=1))
+        self.invalid_once = set(invalid_once)
+        self.failing = set(failing)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, prompt, model, response_format=None):
+        day = int(re.search(r"day (\d+) of a 7-day", prompt).group(1))
+        self.calls.append(day)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            completion = await super().complete(prompt, model, response_format)
+        finally:
+            self.in_flight -= 1
+        if day in self.failing:
+            raise RuntimeError(f"day {day} backend error")
+        if day in self.invalid_once:
+            self.invalid_once.discard(day)
+            broken = json.loads(completion.content)
+            broken["meals"] = broken["meals"][:1]
+            return Completion(json.dumps(broken), completion.usage)
+        return completion
+
+
+@pytest.fixture
+def fanout(monkeypatch):
+    monkeypatch.setattr(generator, "llm_breaker", CircuitBreaker())
+    monkeypatch.setattr(generator, "generation_gate", ConcurrencyGate(limit=32))
+    monkeypatch.setattr(generator.settings, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(generator.settings, "PLAN_CACHE_ENABLED", False)
+    monkeypatch.setattr(generator.settings, "PLAN_VERIFY_ENABLED", False)
+    monkeypatch.setattr(generator.settings, "FANOUT_MAX_ATTEMPTS", 3)
+
+    def use(backend):
+        monkeypatch.setattr(generator, "get_backend", lambda: backend)
+        return backend
+
+    return use
+
+
+def run_fanout(request):
+    params = normalize_plan_params(request)
+    content, _ = asyncio.run(generator._complete_fanout(params, "model", "key"))
+    return json.loads(content)
+
+
+def test_day_prompts_run_concurrently(fanout, make_request):
+    """Test that the seven day prompts are in flight at the same time"""
+    backend = fanout(ScriptedBackend(latency="fixed:0.2"))
+    started = time.perf_counter()
+    days = run_fanout(make_request("Fan-out"))
+
+    assert time.perf_counter() - started < 0.2 * 3
+    assert backend.max_in_flight == 7
+    assert [day["day"] for day in days] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_only_failed_or_invalid_days_are_retried(fanout, make_request):
+    """Test that invalid and failed days are regenerated alone, up to FANOUT_MAX_ATTEMPTS"""
+    backend = fanout(ScriptedBackend(invalid_once=[3]))
+    days = run_fanout(make_request("Fan-out"))
+    assert sorted(backend.calls) == [1, 2, 3, 3, 4, 5, 6, 7]
+    assert len(days[2]["meals"]) == 3
+
+    backend = fanout(ScriptedBackend(failing=[5]))
+    with pytest.raises(RuntimeError, match="day 5"):
+        run_fanout(make_request("Fan-out"))
+    assert backend.calls.count(5) == 3
+    assert all(backend.calls.count(day) == 1 for day in (1, 2, 3, 4, 6, 7))
+
+
+def test_all_overloaded_reraises_overload(fanout, monkeypatch, make_request):
+    """Test that days failing only on capacity surface GenerationOverloaded"""
+    fanout(ScriptedBackend())
+    monkeypatch.setattr(generator, "generation_gate", ConcurrencyGate(limit=0, queue_timeout=0.01))
+    with pytest.raises(GenerationOverloaded):
+        run_fanout(make_request("Fan-out"))
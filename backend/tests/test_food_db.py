@@ -0,0 +1,55 @@
+import sqlite3
+
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from ai.food_db import fts_query, import_foods
+from ai.food_table import write_food_table
+from database.database import Base
+from database.models import Food
+
+SEARCH_SQL = (
+    "SELECT foods.description FROM foods_fts JOIN foods ON foods.fdc_id = foods_fts.rowid "
+    "WHERE foods_fts MATCH ? ORDER BY bm25(foods_fts)"
+)
+
+
+def test_import_csv_and_full_text_search(tmp_path, foods_csv):
+    """Test that the CSV is loaded with an FTS index the ORM and raw SQL can query"""
+    database = str(tmp_path / "app.db")
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(bind=engine)
+
+    stats = import_foods(str(foods_csv), database)
+
+    assert stats["foods"] == 13 and stats["nutrients"] == 4
+    conn = sqlite3.connect(database)
+    assert conn.execute(SEARCH_SQL, (fts_query("chick"),)).fetchall() == [("Chicken, breast, roasted",)]
+    assert conn.execute(SEARCH_SQL, (fts_query("rice cooked "),)).fetchall() == [("Rice, white, cooked",)]
+    assert "ix_foods_calories" in {row[1] for row in conn.execute("PRAGMA index_list(foods)")}
+    with sessionmaker(bind=engine)() as db:
+        high_protein = db.execute(select(Food.description).where(Food.protein > 25).order_by(Food.fdc_id)).scalars().all()
+    assert high_protein == ["Chicken, breast, roasted", "Fish, tilapia, cooked"]
+
+
+def test_import_food_table_replaces_previous_import(tmp_path, foods_csv):
+    """Test that fdc_ids and every nutrient come from the .foodtable, replacing older rows"""
+    database = str(tmp_path / "app.db")
+    import_foods(str(foods_csv), database)
+
+    columns = {name: np.array([1.0, 2.0], dtype=np.float32) for name in ("calories", "protein", "fat", "carbs", "calcium")}
+    write_food_table(str(tmp_path / "final_ingredients.foodtable"), [1750, 2001], ["Crème brûlée", "Teff, raw"], columns)
+    stats = import_foods(str(foods_csv), database, batch_rows=1)
+
+    conn = sqlite3.connect(database)
+    assert stats["foods"] == 2
+    assert conn.execute("SELECT fdc_id, calcium FROM foods ORDER BY fdc_id").fetchall() == [(1750, 1.0), (2001, 2.0)]
+    assert conn.execute(SEARCH_SQL, (fts_query("creme"),)).fetchall() == [("Crème brûlée",)]
+
+
+def test_fts_query_escapes_syntax():
+    """Test that user text cannot inject FTS5 operators"""
+    assert fts_query('chicken OR "x" NEAR(') == '"chicken" "or" "x" "near"*'
+    assert fts_query("rice ") == '"rice"'
+    assert fts_query("!!") == ""
@@ -0,0 +1,100 @@
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ai import food_search
+from ai.food_search import FoodCatalog, FoodSearchIndex, load_food_records, normalize
+from routers import foods
+from routers.auth import get_current_user
+
+DESCRIPTIONS = [
+    "Chicken, breast, roasted",
+    "Chickpeas, canned",
+    "Soup, chicken noodle",
+    "Crème fraîche",
+    "Rice, white, cooked",
+    "Rice, brown, cooked",
+    "Chicken, thigh, fried, with a long batter coating description",
+]
+
+
+def docs(index, query, **kwargs):
+    return [doc for doc, _ in index.search(query, **kwargs)[1]]
+
+
+def test_normalize_folds_accents_and_punctuation():
+    """Test that descriptions and queries tokenize the same way"""
+    assert normalize("Crème Fraîche, 2%") == ["creme", "fraiche", "2"]
+
+
+def test_prefix_matching_of_last_token():
+    """Test that the word being typed matches as a prefix, finished words exactly"""
+    index = FoodSearchIndex(DESCRIPTIONS)
+
+    assert set(docs(index, "chick")) == {0, 1, 2, 6}
+    assert docs(index, "chick ", fuzzy=False) == []
+    assert set(docs(index, "rice c")) == {4, 5}
+    assert docs(index, "creme fr") == [3]
+
+
+def test_fuzzy_matching_of_typos():
+    """Test that a misspelt word finds similar vocabulary words unless fuzzy is off"""
+    index = FoodSearchIndex(DESCRIPTIONS)
+
+    assert 0 in docs(index, "chiken breast ")
+    assert docs(index, "chiken breast ", fuzzy=False) == []
+
+
+def test_ranking_prefers_leading_and_short_descriptions():
+    """Test that foods named after the query come first, shorter names before longer"""
+    index = FoodSearchIndex(DESCRIPTIONS)
+
+    ranked = docs(index, "chicken")
+    assert ranked[:2] == [0, 6]
+    assert ranked[-1] == 2
+
+
+def test_limit_and_offset_page_the_ranking():
+    """Test that pages, cached or ranked on demand, slice one ranking"""
+    index = FoodSearchIndex([f"Apple variety {i}" for i in range(500)])
+    total, first = index.search("apple", limit=300)
+
+    assert total == 500
+    assert [doc for doc, _ in first] == list(range(300))
+    assert docs(index, "apple", limit=5, offset=10) == list(range(10, 15))
+    assert docs(index, "apple", limit=5, offset=10) == list(range(10, 15))
+    assert index.cache_hits >= 1
+
+
+def test_food_search_endpoint(tmp_path, monkeypatch, foods_csv):
+    """Test /foods/search returns ranked foods with macros, 503 without a table"""
+    app = FastAPI()
+    app.include_router(foods.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: None
+    client = TestClient(app)
+
+    monkeypatch.setattr(food_search, "_catalog", None)
+    monkeypatch.setattr(food_search.settings, "FOOD_TABLE_PATH", str(tmp_path / "missing.csv"))
+    assert client.get("/api/foods/search", params={"q": "rice"}).status_code == 503
+
+    monkeypatch.setattr(food_search.settings, "FOOD_TABLE_PATH", str(foods_csv))
+    response = client.get("/api/foods/search", params={"q": "chick", "limit": 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 1
+    assert body["results"][0]["description"] == "Chicken, breast, roasted"
+    assert body["results"][0]["calories"] == 165
+    assert client.get("/api/foods/search", params={"q": "x", "limit": 500}).status_code == 422
+
+
+def test_catalog_prefers_food_table(tmp_path, foods_csv):
+    """Test that records come with real fdc_ids from the .foodtable artifact"""
+    from ai.food_table import write_food_table
+
+    columns = {name: np.array([100.0, 200.0], dtype=np.float32) for name in ("calories", "protein", "fat", "carbs")}
+    write_food_table(str(tmp_path / "final_ingredients.foodtable"), [1001, 1002], ["Teff, raw", "Teff flour"], columns)
+
+    catalog = FoodCatalog(*load_food_records(str(foods_csv)))
+    result = catalog.search("teff")
+    assert [food["fdc_id"] for food in result["results"]] == [1001, 1002]
+    assert result["results"][1]["calories"] == 200
@@ -0,0 +1,86 @@
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ai import food_search, food_substitutes
+from ai.food_substitutes import FoodSubstitutes
+from routers import foods
+from routers.auth import get_current_user
+
+
+def make_index(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    nutrients = np.abs(rng.normal([200, 10, 8, 20], [150, 8, 10, 20], (rows, 4))).astype(np.float32)
+    descriptions = [f"{'Chicken' if i % 5 == 0 else 'Beans'} item {i}" for i in range(rows)]
+    fdc_ids = np.arange(rows)[::-1] * 7 + 1000  # unsorted ids
+    return FoodSubstitutes(fdc_ids, descriptions, nutrients)
+
+
+def brute_force(index, target, allowed, exclude=-1, k=5):
+    distances = np.sqrt((((index.nutrients - target) / index.scale) ** 2).sum(axis=1))
+    distances[~allowed] = np.inf
+    if exclude >= 0:
+        distances[exclude] = np.inf
+    return np.argsort(distances, kind="stable")[:k]
+
+
+def test_batch_substitutes_match_brute_force():
+    """Test that a batch of foods gets the exact nearest foods, never itself"""
+    index = make_index()
+    fdc_ids = index.fdc_ids[[3, 10, 250, 1999]]
+
+    rows, distances, found = index.for_foods(fdc_ids, k=5)
+
+    assert rows.tolist() == [3, 10, 250, 1999]
+    for row, substitutes in zip(rows, found):
+        assert substitutes.tolist() == brute_force(index, index.nutrients[row], index.usable, row).tolist()
+    assert (np.diff(distances, axis=1) >= 0).all()
+
+
+def test_diet_filter_and_targets():
+    """Test that diet types exclude foods by description, also for target vectors"""
+    index = make_index()
+    target = np.array([[150, 20, 5, 5]], dtype=np.float32)
+
+    distances, found = index.nearest(target, k=8, diet_type="Vegan balanced")
+
+    allowed = index.usable & np.array(["chicken" not in d.lower() for d in index.descriptions])
+    assert found[0].tolist() == brute_force(index, target[0], allowed, k=8).tolist()
+    assert not any("Chicken" in index.descriptions[row] for row in found[0])
+
+
+def test_unknown_foods_and_small_tables():
+    """Test that unknown ids get no substitutes and k larger than the table is padded"""
+    index = FoodSubstitutes([1, 2, 3], ["Apple", "Pear", "Water"], [[52, 0.3, 0.2, 14], [57, 0.4, 0.1, 15], [0, 0, 0, 0]])
+
+    results = index.suggest([2, 99], [[50, 0, 0, 13]], k=5)
+
+    assert [food["fdc_id"] for food in results[0]["substitutes"]] == [1]
+    assert results[1]["target"] is None and results[1]["substitutes"] == []
+    assert [food["fdc_id"] for food in results[2]["substitutes"]] == [1, 2]
+
+
+def test_substitutes_endpoints(monkeypatch, foods_csv):
+    """Test the batch and single-food substitution endpoints"""
+    monkeypatch.setattr(food_search, "_catalog", None)
+    monkeypatch.setattr(food_substitutes, "_substitutes", None)
+    monkeypatch.setattr(food_search.settings, "FOOD_TABLE_PATH", str(foods_csv))
+    app = FastAPI()
+    app.include_router(foods.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: None
+    client = TestClient(app)
+
+    # The CSV has no fdc_ids, so rows are numbered from 0: 3 is the chicken breast
+    response = client.post("/api/foods/substitutes", json={
+        "fdc_ids": [3], "targets": [{"calories": 130, "protein": 2.7, "fat": 0.3, "carbs": 28}], "k": 2, "diet_type": "vegan"
+    })
+    assert response.status_code == 200
+    chicken, rice = response.json()["results"]
+    assert chicken["description"] == "Chicken, breast, roasted"
+    assert len(chicken["substitutes"]) == 2
+    assert all("Chicken" not in food["description"] and "Fish" not in food["description"] for food in chicken["substitutes"])
+    assert rice["substitutes"][0]["description"] == "Rice, white, cooked"
+
+    response = client.get("/api/foods/3/substitutes", params={"k": 1})
+    assert response.json()["substitutes"][0]["description"] == "Fish, tilapia, cooked"
+    assert client.get("/api/foods/999/substitutes").status_code == 404
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from ai.food_search import load_food_records
+from ai.food_table import FoodTable, get_food_table, write_food_table
+from ai.local_planner import LocalPlanner, load_foods, load_food_csv, NUTRIENT_COLUMNS
+
+
+def test_food_table_roundtrip(tmp_path):
+    """Test that columns and descriptions read back exactly as written"""
+    path = str(tmp_path / "foods.foodtable")
+    descriptions = ["Oats, raw", "", "Jalapeño peppers", "Crème fraîche, 30% fat"]
+    columns = {"calories": [389, 0, 29, 292.5], "protein": [16.9, 0, 0.9, 2.1]}
+    write_food_table(path, [10, 11, 12, 13], descriptions, columns, metadata={"source": "test"})
+
+    with FoodTable(path) as table:
+        assert len(table) == 4
+        assert table.nutrients == ["calories", "protein"]
+        assert table.metadata == {"source": "test"}
+        assert table.fdc_ids.tolist() == [10, 11, 12, 13]
+        assert table["calories"].dtype == np.float32
+        np.testing.assert_array_equal(table["protein"], np.asarray(columns["protein"], dtype=np.float32))
+        assert table.descriptions() == descriptions
+        assert table.description(2) == "Jalapeño peppers"
+        assert table.description_lengths().tolist() == [len(d.encode("utf-8")) for d in descriptions]
+        assert table.matrix().shape == (4, 2)
+        with pytest.raises(KeyError):
+            table.column("sodium")
+
+
+def test_food_table_columns_are_read_only_views(tmp_path):
+    """Test that columns are zero-copy views into the mapping, not loaded copies"""
+    path = str(tmp_path / "foods.foodtable")
+    write_food_table(path, np.arange(1000), [f"Food {i}" for i in range(1000)], {"calories": np.arange(1000)})
+
+    table = FoodTable(path)
+    calories = table["calories"]
+    assert not calories.flags.owndata
+    assert not calories.flags.writeable
+    assert calories.ctypes.data % 64 == 0
+    with pytest.raises(ValueError):
+        calories[0] = 1
+    del calories
+    table.close()
+
+
+def test_food_table_rejects_other_files(tmp_path):
+    """Test that a file without the magic header is refused"""
+    path = tmp_path / "foods.foodtable"
+    path.write_bytes(b"description,calories\n" * 4)
+    with pytest.raises(ValueError):
+        FoodTable(str(path))
+
+
+def test_local_planner_prefers_food_table(tmp_path, foods_csv):
+    """Test that the planner loads the artifact next to the CSV and gets the same foods"""
+    descriptions, nutrients = load_food_csv(str(foods_csv))
+    write_food_table(
+        str(tmp_path / "final_ingredients.foodtable"),
+        np.arange(len(descriptions)),
+        descriptions,
+        {name: nutrients[:, i] for i, name in enumerate(NUTRIENT_COLUMNS)}
+    )
+    foods_csv.unlink()
+
+    loaded_descriptions, loaded_nutrients = load_foods(str(foods_csv))
+    assert list(loaded_descriptions) == descriptions
+    np.testing.assert_array_equal(loaded_nutrients[:], nutrients)
+    assert load_foods(str(tmp_path / "missing.csv")) is None
+
+
+def test_readers_share_one_mapped_table(tmp_path, foods_csv):
+    """Test that the planner and search catalog read views of one shared table, copying only the planner's foods"""
+    descriptions, nutrients = load_food_csv(str(foods_csv))
+    table_path = str(tmp_path / "final_ingredients.foodtable")
+    write_food_table(table_path, np.arange(len(descriptions)), descriptions, {name: nutrients[:, i] for i, name in enumerate(NUTRIENT_COLUMNS)})
+
+    table = get_food_table(table_path)
+    assert get_food_table(table_path) is table
+    assert get_food_table(str(tmp_path / "missing.foodtable")) is None
+
+    fdc_ids, catalog_descriptions, catalog_nutrients, fingerprint = load_food_records(str(foods_csv))
+    assert fingerprint == table.fingerprint
+    assert np.shares_memory(fdc_ids, table.fdc_ids)
+    for i, name in enumerate(NUTRIENT_COLUMNS):
+        assert np.shares_memory(catalog_nutrients[:, i], table.column(name))
+    assert catalog_descriptions[1] == descriptions[1] and len(catalog_descriptions) == len(descriptions)
+    np.testing.assert_array_equal(catalog_nutrients[[2, 0]], nutrients[[2, 0]])
+
+    planner = LocalPlanner(*load_foods(str(foods_csv)))
+    assert len(planner.nutrients) == len(planner.rows) <= len(descriptions)
+    np.testing.assert_array_equal(planner.nutrients, nutrients[planner.rows])
+    assert not np.shares_memory(planner.nutrients, table.column("calories"))
+
+    # A table rewritten in place by the ETL is mapped afresh
+    write_food_table(table_path, [7], ["Teff, raw"], {name: [100.0] for name in NUTRIENT_COLUMNS})
+    assert get_food_table(table_path).fdc_ids.tolist() == [7]
+
+
+def test_clean_data_writes_matching_food_table(tmp_path, usda_files):
+    """Test that the ETL writes a food table with the same rows as the CSV"""
+    pd = pytest.importorskip("pandas")
+    from ai.clean_data import run
+
+    usda_files()
+    output, table_file = tmp_path / "final_ingredients.csv", tmp_path / "final_ingredients.foodtable"
+    run(str(tmp_path / "food.csv"), str(tmp_path / "food_nutrient.csv"), str(output), table_file=str(table_file))
+
+    csv_table = pd.read_csv(output, keep_default_na=False)
+    with FoodTable(str(table_file)) as table:
+        assert len(table) == len(csv_table)
+        assert table.descriptions() == csv_table["description"].tolist()
+        for name in NUTRIENT_COLUMNS:
+            np.testing.assert_allclose(table[name], csv_table[name].to_numpy(), rtol=1e-6)
+        assert np.all(np.diff(table.fdc_ids) > 0)
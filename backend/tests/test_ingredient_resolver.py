@@ -0,0 +1,124 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ai import food_search, ingredient_resolver as resolver_module
+from ai.food_search import FoodCatalog, load_food_records
+from ai.food_table import write_food_table
+from ai.ingredient_resolver import IngredientResolver, alias_key
+from ai.local_planner import NUTRIENT_COLUMNS, load_food_csv
+from routers import foods
+from routers.auth import get_current_user
+
+
+def write_table(foods_csv):
+    """Write the .foodtable artifact next to the CSV, numbering foods by row"""
+    descriptions, nutrients = load_food_csv(str(foods_csv))
+    columns = {name: nutrients[:, i] for i, name in enumerate(NUTRIENT_COLUMNS)}
+    write_food_table(str(foods_csv.with_suffix(".foodtable")), range(len(descriptions)), descriptions, columns)
+
+
+@pytest.fixture
+def foods_table(foods_csv):
+    write_table(foods_csv)
+    return foods_csv
+
+
+def make_resolver(foods_csv, aliases="aliases.db"):
+    return IngredientResolver(FoodCatalog(*load_food_records(str(foods_csv))), str(foods_csv.parent / aliases))
+
+
+def test_alias_key_drops_quantities_and_units():
+    """Test that amounts, units and filler words do not change the alias"""
+    assert alias_key("200 g Boiled eggs (about 2)") == "boiled eggs"
+    assert alias_key("2 tbsp. fresh olive oil") == alias_key("Olive oil") == "olive oil"
+    assert alias_key("Salt to taste") == "salt"
+
+
+def test_batch_resolution(foods_table):
+    """Test typical plan ingredients, typos and unknown foods in one batch"""
+    resolver = make_resolver(foods_table)
+
+    results = resolver.resolve(["1 cup cooked white rice", "2 boiled eggs", "bananna", "Injera (1 piece)", "Rice, white, cooked"])
+
+    assert [result["description"] for result in results] == [
+        "Rice, white, cooked", "Egg, whole, hard-boiled", "Bananas, raw", None, "Rice, white, cooked",
+    ]
+    assert results[0]["fdc_id"] == 2 and results[0]["confidence"] > 0.8
+    assert not any(result["cached"] for result in results)
+
+
+def test_aliases_persist_and_manual_aliases_win(foods_table):
+    """Test that resolutions survive a restart and admin aliases are not overwritten"""
+    resolver = make_resolver(foods_table)
+    resolver.resolve(["boiled egg", "injera"])
+    assert resolver.set_alias("Injera", 1) == "injera"
+
+    restarted = make_resolver(foods_table)
+    egg, injera = restarted.resolve(["2 Boiled egg", "injera (2 pieces)"])
+
+    assert egg["cached"] and egg["description"] == "Egg, whole, hard-boiled"
+    assert injera["cached"] and injera["description"] == "Teff, cooked" and injera["source"] == "manual"
+    restarted.clear()
+    assert not restarted.resolve(["boiled egg"])[0]["cached"]
+    assert restarted.resolve(["injera"])[0]["source"] == "manual"
+    assert restarted.stats()["hits"] == 3
+
+
+def test_new_food_table_drops_resolved_aliases(foods_table):
+    """Test that auto aliases are forgotten when the ETL replaces the table, and CSV row ids are not stored"""
+    resolver = make_resolver(foods_table)
+    resolver.resolve(["boiled egg"])
+    resolver.set_alias("Injera", 1)
+
+    write_table(foods_table)
+    restarted = make_resolver(foods_table)
+    egg, injera = restarted.resolve(["boiled egg", "injera"])
+    assert not egg["cached"]
+    assert injera["cached"] and injera["source"] == "manual"
+
+    foods_table.with_suffix(".foodtable").unlink()
+    fallback = make_resolver(foods_table, "fallback.db")
+    fallback.resolve(["white rice"])
+    assert fallback.resolve(["white rice"])[0]["cached"]
+    restarted = make_resolver(foods_table, "fallback.db")
+    assert not restarted.resolve(["white rice"])[0]["cached"]
+
+
+def test_concurrent_resolution_and_aliases(foods_table):
+    """Test that threads sharing the alias connection store every alias and count every lookup"""
+    from concurrent.futures import ThreadPoolExecutor
+    resolver = make_resolver(foods_table)
+
+    def work(worker):
+        names = [f"food{worker}x{index}" for index in range(25)]
+        resolver.resolve(names + ["boiled egg"])
+        resolver.set_alias(f"pinned{worker}", None)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, range(16)))
+
+    stats = resolver.stats()
+    assert stats["hits"] + stats["misses"] == 16 * 26
+    restarted = make_resolver(foods_table)
+    restarted.resolve(["boiled egg"])
+    assert restarted.stats()["aliases"] == 16 * 25 + 16 + 1
+
+
+def test_resolve_endpoint(tmp_path, monkeypatch, foods_csv):
+    """Test /foods/resolve maps a plan's ingredients to foods"""
+    monkeypatch.setattr(food_search, "_catalog", None)
+    monkeypatch.setattr(food_search.settings, "FOOD_TABLE_PATH", str(foods_csv))
+    monkeypatch.setattr(resolver_module, "ingredient_resolver", IngredientResolver(path=str(tmp_path / "aliases.db")))
+    monkeypatch.setattr(foods, "ingredient_resolver", resolver_module.ingredient_resolver)
+    app = FastAPI()
+    app.include_router(foods.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: None
+    client = TestClient(app)
+
+    response = client.post("/api/foods/resolve", json={"ingredients": ["150 g tofu, firm", "xyzzy"]})
+
+    assert response.status_code == 200
+    tofu, unknown = response.json()["results"]
+    assert tofu["fdc_id"] == 10 and tofu["alias"] == "tofu firm"
+    assert unknown["fdc_id"] is None
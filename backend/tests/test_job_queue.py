@@ -0,0 +1,127 @@
+import asyncio
+import json
+from sqlalchemy import select
+from database.models import GenerationJob, MealPlan, MealHistory
+import ai.job_queue as job_queue
+from ai.job_queue import MealPlanJobQueue
+from ai.llm_backends import canned_completion
+
+
+async def wait_for_jobs(session_factory, count):
+    for _ in range(200):
+        with session_factory() as db:
+            finished = db.execute(
+                select(GenerationJob).where(GenerationJob.status.in_(["done", "failed"]))
+            ).scalars().all()
+        if len(finished) == count:
+            return {job.request_json: job for job in finished}
+        await asyncio.sleep(0.01)
+    raise AssertionError("jobs did not finish")
+
+
+def test_jobs_are_generated_and_persisted(monkeypatch, session_factory, make_request):
+    """Test that workers run queued jobs and record done/failed status"""
+
+    async def fake_generate(request):
+        if request.goal == "broken":
+            raise RuntimeError("LLM unavailable")
+        return canned_completion("Daily Calories: 2000"), None
+
+    monkeypatch.setattr(job_queue, "generate_verified_meal_plan", fake_generate)
+    queue = MealPlanJobQueue(session_factory=session_factory, workers=2, poll_interval=0.05)
+
+    async def scenario():
+        await queue.start()
+        with session_factory() as db:
+            ok_job = queue.enqueue(db, 1, make_request("maintain"))
+            bad_job = queue.enqueue(db, 1, make_request("broken"))
+            assert ok_job.status == "pending"
+        jobs = await wait_for_jobs(session_factory, 2)
+        await queue.stop()
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    done = jobs[make_request("maintain").model_dump_json()]
+    failed = jobs[make_request("broken").model_dump_json()]
+
+    assert done.status == "done"
+    assert failed.status == "failed"
+    assert "LLM unavailable" in failed.error
+
+    with session_factory() as db:
+        plan = db.get(MealPlan, done.mealplan_id)
+        assert plan.goal == "maintain"
+        history = db.execute(
+            select(MealHistory).where(MealHistory.mealplan_id == plan.id).order_by(MealHistory.day_number)
+        ).scalars().all()
+        assert [row.day_number for row in history] == [1, 2, 3, 4, 5, 6, 7]
+        assert all(row.total_calories == 2000 for row in history)
+        assert json.loads(history[0].meals_json)["day"] == 1
+    assert queue.stats()["completed"] == 1
+    assert queue.stats()["failed"] == 1
+
+
+def test_jobs_reuse_the_generator_verification(monkeypatch, session_factory, make_request):
+    """Test that a plan verified while generating is saved without verifying it again"""
+    from ai.plan_verifier import PlanVerification
+    verified = []
+
+    async def fake_generate(request):
+        return canned_completion("Daily Calories: 2000"), PlanVerification([], 0.05)
+
+    monkeypatch.setattr(job_queue, "generate_verified_meal_plan", fake_generate)
+    monkeypatch.setattr(job_queue, "_verify", lambda request, days: verified.append(request))
+    queue = MealPlanJobQueue(session_factory=session_factory, workers=1, poll_interval=0.05)
+
+    async def scenario():
+        await queue.start()
+        with session_factory() as db:
+            queue.enqueue(db, 1, make_request("maintain"))
+            # Warm pool plans were not verified yet; that runs off the event loop
+            ready = await queue.record_ready(db, 1, make_request("ready"), canned_completion("Daily Calories: 2000"))
+        jobs = await wait_for_jobs(session_factory, 2)
+        await queue.stop()
+        return jobs, ready
+
+    jobs, ready = asyncio.run(scenario())
+    with session_factory() as db:
+        plan = db.get(MealPlan, jobs[make_request("maintain").model_dump_json()].mealplan_id)
+        assert plan.deviation == 0.05
+    assert ready.status == "done"
+    assert verified == [make_request("ready")]
+
+
+def test_worker_database_work_runs_off_the_event_loop(monkeypatch, session_factory, make_request):
+    """Test that claiming, saving and failing jobs never touch SQLite on the event loop thread"""
+    import threading
+
+    async def fake_generate(request):
+        if request.goal == "broken":
+            raise RuntimeError("LLM unavailable")
+        return canned_completion("Daily Calories: 2000"), None
+
+    monkeypatch.setattr(job_queue, "generate_verified_meal_plan", fake_generate)
+    monkeypatch.setattr(job_queue, "_verify", lambda request, days: None)
+    queue = MealPlanJobQueue(session_factory=session_factory, workers=1, poll_interval=0.05)
+    threads = []
+    for name in ("_claim", "_complete", "_finish"):
+        original = getattr(queue, name)
+
+        def traced(*args, original=original):
+            threads.append(threading.get_ident())
+            return original(*args)
+
+        monkeypatch.setattr(queue, name, traced)
+
+    async def scenario():
+        await queue.start()
+        with session_factory() as db:
+            queue.enqueue(db, 1, make_request("maintain"))
+            queue.enqueue(db, 1, make_request("broken"))
+        await wait_for_jobs(session_factory, 2)
+        await queue.stop()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert threads and loop_thread not in threads
+    assert (queue.completed, queue.failed) == (1, 1)
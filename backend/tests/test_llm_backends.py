@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import ai.fake_llm_server as fake_llm_server
+import ai.llm_backends as llm_backends
+from ai.llm_backends import FakeBackend, FakeCompletionModel, LLMBackend, OpenAIBackend, get_backend
+
+
+def test_latency_specs():
+    """Test that latency specs parse and invalid ones are rejected"""
+    assert FakeCompletionModel(latency="fixed:0.5").first_token_delay() == 0.5
+    assert FakeCompletionModel(latency="fixed").first_token_delay() == 0.0
+    assert 0.2 <= FakeCompletionModel(latency="uniform:0.2,0.4", seed=1).first_token_delay() <= 0.4
+    delays = [FakeCompletionModel(latency="lognormal:1.0,0.5", seed=seed).first_token_delay() for seed in range(50)]
+    assert all(delay > 0 for delay in delays) and min(delays) < 1.0 < max(delays)
+
+    for spec in ("gamma:1", "uniform:0.2", "fixed:soon", "lognormal:"):
+        with pytest.raises(ValueError):
+            FakeCompletionModel(latency=spec).first_token_delay()
+
+
+def test_fake_backend_error_injection():
+    """Test that the fake backend fails at error_rate and otherwise returns canned plans"""
+    failing = FakeBackend(FakeCompletionModel(latency="fixed:0", error_rate=1.0))
+    with pytest.raises(RuntimeError, match="injected"):
+        asyncio.run(failing.complete("Daily Calories: 1800", "model"))
+
+    async def drain():
+        return [delta async for delta in failing.stream("Daily Calories: 1800", "model")]
+
+    with pytest.raises(RuntimeError, match="injected"):
+        asyncio.run(drain())
+
+    backend = FakeBackend(FakeCompletionModel(latency="fixed:0", tokens_per_second=0, error_rate=0.0))
+    completion = asyncio.run(backend.complete("Daily Calories: 1800", "model"))
+    days = json.loads(completion.content)
+    assert len(days) == 7 and days[0]["total_calories"] == 1800
+    assert completion.usage["completion_tokens"] > 0
+
+
+def test_backends_must_implement_the_interface():
+    """Test that LLMBackend is abstract and a backend missing stream() cannot be created"""
+    class CompleteOnly(LLMBackend):
+        async def complete(self, prompt, model, response_format=None):
+            return None
+
+    for backend in (LLMBackend, CompleteOnly):
+        with pytest.raises(TypeError, match="abstract"):
+            backend()
+    assert isinstance(FakeBackend(FakeCompletionModel()), LLMBackend)
+
+
+def test_backend_selection(monkeypatch):
+    """Test that LLM_BACKEND picks the shared backend and unknown names are rejected"""
+    monkeypatch.setattr(llm_backends, "_backend", None)
+    monkeypatch.setattr(llm_backends.settings, "LLM_BACKEND", "fake")
+    backend = get_backend()
+    assert isinstance(backend, FakeBackend) and get_backend() is backend
+
+    monkeypatch.setattr(llm_backends, "_backend", None)
+    monkeypatch.setattr(llm_backends.settings, "LLM_BACKEND", "openai")
+    assert isinstance(get_backend(), OpenAIBackend)
+
+    monkeypatch.setattr(llm_backends, "_backend", None)
+    monkeypatch.setattr(llm_backends.settings, "LLM_BACKEND", "bogus")
+    with pytest.raises(RuntimeError, match="Unknown LLM_BACKEND"):
+        get_backend()
+
+
+def test_fake_server_chat_completions(monkeypatch):
+    """Test that the fake server answers plain and streamed chat completions like OpenAI"""
+    monkeypatch.setattr(fake_llm_server, "simulator", FakeCompletionModel(latency="fixed:0", tokens_per_second=0, error_rate=0.0))
+    client = TestClient(fake_llm_server.app)
+    body = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Daily Calories: 2200"}]}
+
+    response = client.post("/v1/chat/completions", json=body)
+    assert response.status_code == 200
+    plain = response.json()
+    content = plain["choices"][0]["message"]["content"]
+    assert json.loads(content)[0]["total_calories"] == 2200
+    assert plain["usage"]["total_tokens"] == plain["usage"]["prompt_tokens"] + plain["usage"]["completion_tokens"]
+
+    response = client.post("/v1/chat/completions", json={**body, "stream": True, "stream_options": {"include_usage": True}})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line[len("data: "):] for line in response.text.split("\n\n") if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    streamed = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks if chunk["choices"])
+    assert len(json.loads(streamed)) == 7
+    assert chunks[-1]["choices"] == [] and chunks[-1]["usage"]["completion_tokens"] > 0
+
+    assert client.post("/admin/config", json={"latency": "uniform:1"}).status_code == 400
+    assert client.post("/admin/config", json={"error_rate": 1.0}).json()["error_rate"] == 1.0
+    failed = client.post("/v1/chat/completions", json=body)
+    assert failed.status_code in (429, 500, 503) and "injected" in failed.json()["error"]["message"]
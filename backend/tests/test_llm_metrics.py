@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from sqlalchemy import select
+from database.models import LLMCall
+from ai.llm_metrics import LLMMetrics, CallRecord, Histogram, estimate_cost
+
+
+def make_call(latency, status="ok", diet_type="vegan"):
+    call = CallRecord("gpt-4o-mini", "plan", diet_type)
+    call.latency = latency
+    call.queue_wait = 0.01
+    call.status = status
+    call.set_usage({"prompt_tokens": 1000, "completion_tokens": 2000})
+    return call
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    """Test that percentiles resolve to the bucket holding the observation"""
+    histogram = Histogram(buckets=(1.0, 5.0, 10.0))
+    for value in [0.5] * 90 + [4.0] * 9 + [30.0]:
+        histogram.observe(value)
+    assert histogram.percentile(50) == 1.0
+    assert histogram.percentile(95) == 5.0
+    assert histogram.percentile(100) == float("inf")
+
+
+def test_cost_uses_pricing_table():
+    """Test that cost is priced per million prompt and completion tokens"""
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 1_000_000) == 0.15 + 0.60
+    assert estimate_cost("unknown-model", 1000, 1000) == 0.0
+
+
+def test_calls_are_aggregated_and_persisted(session_factory):
+    """Test that calls feed per-series aggregates and are written in batches"""
+    metrics = LLMMetrics(session_factory=session_factory, persist=True, flush_size=2)
+
+    metrics.record(make_call(1.2))
+    with session_factory() as db:
+        assert db.execute(select(LLMCall)).scalars().all() == []
+    metrics.record(make_call(3.0, status="error"))
+    metrics.record(make_call(2.0, diet_type="keto"))
+    metrics.flush()
+
+    with session_factory() as db:
+        rows = db.execute(select(LLMCall).order_by(LLMCall.id)).scalars().all()
+    assert [row.status for row in rows] == ["ok", "error", "ok"]
+    assert rows[0].latency_ms == 1200
+    assert abs(rows[0].cost_usd - estimate_cost("gpt-4o-mini", 1000, 2000)) < 1e-12
+
+    vegan = next(series for series in metrics.snapshot() if series["diet_type"] == "vegan")
+    assert vegan["calls"] == 2
+    assert vegan["errors"] == 1
+    assert vegan["prompt_tokens"] == 2000
+    assert vegan["latency_seconds"]["count"] == 1
+
+    text = metrics.render_prometheus()
+    assert 'llm_calls_total{model="gpt-4o-mini",kind="plan",diet_type="vegan"} 2' in text
+    assert 'llm_latency_seconds_bucket{model="gpt-4o-mini",kind="plan",diet_type="keto",le="+Inf"} 1' in text
+
+
+def test_batches_filled_on_the_event_loop_are_written_off_it(session_factory):
+    """Test that a full batch recorded from a coroutine is written in a worker thread"""
+    writers = []
+
+    def tracking_factory():
+        writers.append(threading.get_ident())
+        return session_factory()
+
+    metrics = LLMMetrics(session_factory=tracking_factory, persist=True, flush_size=2)
+
+    async def scenario():
+        metrics.record(make_call(1.0))
+        metrics.record(make_call(2.0))
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    metrics.flush()
+
+    assert writers and loop_thread not in writers
+    with session_factory() as db:
+        assert len(db.execute(select(LLMCall)).scalars().all()) == 2
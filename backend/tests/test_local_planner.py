@@ -0,0 +1,66 @@
+import asyncio
+import json
+from ai import generator
+from ai.local_planner import LocalPlanner, diet_key, load_food_csv
+from ai.plan_schema import validate_day
+
+
+def make_planner(foods_csv):
+    descriptions, nutrients = load_food_csv(str(foods_csv))
+    return LocalPlanner(descriptions, nutrients)
+
+
+def test_local_plan_matches_prompt_schema_and_calories(foods_csv):
+    """Test that the offline plan validates and hits the daily calories"""
+    planner = make_planner(foods_csv)
+    params = {"goal": "maintain", "calories": 2000, "diet_type": "balanced", "protein": 30, "carbs": 40, "fats": 30}
+
+    plan = planner.generate(params, seed=7)
+
+    assert [day["day"] for day in plan] == list(range(1, 8))
+    for day in plan:
+        validate_day(day)
+        assert abs(day["total_calories"] - 2000) <= 10
+    assert "Mislabeled" not in str(plan)
+
+
+def test_local_plan_respects_diet_type(foods_csv):
+    """Test that vegan plans exclude animal products"""
+    planner = make_planner(foods_csv)
+    params = {"goal": "maintain", "calories": 1800, "diet_type": "vegan", "protein": 25, "carbs": 50, "fats": 25}
+
+    text = str(planner.generate(params, seed=3)).lower()
+
+    for word in ("chicken", "fish", "egg", "cheese"):
+        assert word not in text
+
+
+def test_diet_types_match_whole_words():
+    """Test that negated or embedded diet names do not pick up that diet's exclusions"""
+    assert diet_key("Vegan") == "vegan"
+    assert diet_key("lacto-ovo vegetarian") == "vegetarian"
+    assert diet_key("non-vegetarian") == ""
+    assert diet_key("not vegan") == ""
+    assert diet_key("pescatarianish") == ""
+    assert diet_key(None) == ""
+
+
+def test_non_vegetarian_plans_keep_meat_available(foods_csv):
+    """Test that a non-vegetarian diet is planned from the full food table"""
+    planner = make_planner(foods_csv)
+
+    assert planner._allowed("non-vegetarian").tolist() == planner._allowed("balanced").tolist()
+    assert not planner._allowed("vegetarian").all()
+
+
+def test_warm_pool_variants_use_local_planner_in_local_mode(monkeypatch, foods_csv):
+    """Test that warm pool variants come from the local planner instead of the LLM"""
+    planner = make_planner(foods_csv)
+    monkeypatch.setattr(generator.settings, "GENERATION_MODE", "local")
+    monkeypatch.setattr(generator, "get_local_planner", lambda: planner)
+    monkeypatch.setattr(generator, "get_backend", lambda: None)
+    params = {"goal": "maintain", "calories": 2000, "diet_type": "balanced", "protein": 30, "carbs": 40, "fats": 30}
+
+    plan = json.loads(asyncio.run(generator.generate_plan_variant(params)))
+
+    assert [day["day"] for day in plan] == list(range(1, 8))
@@ -0,0 +1,252 @@
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import ai.pdf_service as pdf_service
+import routers.mealplan as mealplan_router
+from ai.pdf_generator import PdfCache, plan_content_hash, render_meal_plan_pdf
+from ai.pdf_service import PdfRenderService, PdfRenderOverloaded, PdfRenderTimeout, PdfRenderUnavailable
+from database.database import get_db
+from database.models import MealPlan, MealHistory, User
+from routers.auth import get_current_user
+
+PLAN = {
+    "id": 7, "goal": "Weight loss", "diet_type": "vegetarian", "daily_calories": 1800,
+    "macro_protein": 30, "macro_carbs": 40, "macro_fats": 30,
+}
+
+
+def render(plan, days):
+    out = io.BytesIO()
+    render_meal_plan_pdf(plan, days, out)
+    return out.getvalue()
+
+
+def hang(*args):
+    time.sleep(60)
+
+
+def test_rendering_is_deterministic(plan_days):
+    """Test that rendering the same plan twice gives identical bytes"""
+    first = render(PLAN, plan_days)
+    assert first.startswith(b"%PDF")
+    assert render(PLAN, plan_days) == first
+    # Legacy rows with raw model output still render
+    assert render(PLAN, ["Day 1: eggs & toast"]).startswith(b"%PDF")
+
+
+def test_cache_renders_once_per_content(tmp_path, plan_days):
+    """Test that the cache renders once per content hash and drops stale or invalidated PDFs"""
+    cache = PdfCache(str(tmp_path), max_files=10)
+    path = cache.get_or_render(PLAN, plan_days)
+    assert cache.get_or_render(PLAN, plan_days) == path
+    assert (cache.renders, cache.hits) == (1, 1)
+
+    changed = [dict(plan_days[0], total_calories=1750)] + plan_days[1:]
+    new_path = cache.get_or_render(PLAN, changed)
+    assert new_path != path and not os.path.exists(path)
+    assert os.listdir(tmp_path) == [os.path.basename(new_path)]
+
+    cache.invalidate(PLAN["id"])
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_keeps_at_most_max_files(tmp_path, plan_days):
+    """Test that the cache evicts down to max_files PDFs"""
+    cache = PdfCache(str(tmp_path), max_files=2)
+    for plan_id in range(1, 5):
+        cache.get_or_render(dict(PLAN, id=plan_id), plan_days[:1])
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_render_service_runs_in_a_bounded_pool(tmp_path, plan_days):
+    """Test that the render service shares renders, rejects past its bound and hits the cache"""
+    service = PdfRenderService(PdfCache(str(tmp_path)), workers=1, queue_size=0, timeout=60)
+
+    async def scenario():
+        try:
+            # Same PDF twice shares one render; a different plan has no room left
+            first = asyncio.ensure_future(service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days)))
+            second = asyncio.ensure_future(service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days)))
+            await asyncio.sleep(0)
+            other = dict(PLAN, id=8)
+            try:
+                await service.render(other, plan_days, plan_content_hash(other, plan_days))
+                raise AssertionError("render queue is bounded")
+            except PdfRenderOverloaded:
+                pass
+            paths = await asyncio.gather(first, second)
+            # Cached now: no trip to the pool
+            paths.append(await service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days)))
+            return paths
+        finally:
+            await service.stop()
+
+    paths = asyncio.run(scenario())
+    assert len(set(paths)) == 1 and open(paths[0], "rb").read(4) == b"%PDF"
+    stats = service.stats()
+    assert (stats["submitted"], stats["rendered"], stats["rejected"], stats["cache_hits"]) == (1, 1, 1, 1)
+    assert stats["render_seconds"]["count"] == 1 and stats["running"] == 0
+
+
+def test_render_timeout_keeps_the_slot_until_done(tmp_path, plan_days):
+    """Test that without a pool a timed-out render keeps its slot until it finishes"""
+    service = PdfRenderService(PdfCache(str(tmp_path)), workers=0, queue_size=0, timeout=0.001)
+
+    async def scenario():
+        try:
+            await service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days))
+            raise AssertionError("render should time out")
+        except PdfRenderTimeout:
+            pass
+        # A thread cannot be stopped: the render carries on and still counts against the queue bound
+        assert service.stats()["running"] == 1
+        while service.stats()["running"]:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert (service.timeouts, service.rendered, service.recycled) == (1, 1, 0)
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_render_timeout_recycles_the_pool(tmp_path, monkeypatch, plan_days):
+    """Test that a render hanging past the timeout has its worker killed and its slot freed"""
+    service = PdfRenderService(PdfCache(str(tmp_path)), workers=1, queue_size=0, timeout=0.5)
+    original = pdf_service._render
+
+    async def scenario():
+        try:
+            monkeypatch.setattr(pdf_service, "_render", hang)
+            with pytest.raises(PdfRenderTimeout):
+                await service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days))
+            monkeypatch.setattr(pdf_service, "_render", original)
+            # The fresh pool has to spawn its worker first
+            service.timeout = 30
+            for _ in range(500):
+                if not service.stats()["running"]:
+                    break
+                await asyncio.sleep(0.01)
+            assert service.stats()["running"] == 0
+            # The next render gets a fresh pool instead of queueing behind the hung one
+            return await service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days))
+        finally:
+            await service.stop()
+
+    path = asyncio.run(scenario())
+    assert open(path, "rb").read(4) == b"%PDF"
+    assert (service.timeouts, service.recycled, service.failures, service.rendered) == (1, 1, 1, 1)
+
+
+def test_renders_caught_in_a_recycle_are_resubmitted(tmp_path, monkeypatch, plan_days):
+    """Test that a render queued behind a hung one finishes on the fresh pool instead of failing"""
+    service = PdfRenderService(PdfCache(str(tmp_path)), workers=1, queue_size=1, timeout=0.5)
+    original = pdf_service._render
+    innocent = dict(PLAN, id=8)
+
+    async def scenario():
+        try:
+            monkeypatch.setattr(pdf_service, "_render", hang)
+            hung = asyncio.ensure_future(service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days)))
+            await asyncio.sleep(0)
+            monkeypatch.setattr(pdf_service, "_render", original)
+            service.timeout = 30
+            path = await service.render(innocent, plan_days, plan_content_hash(innocent, plan_days))
+            with pytest.raises(PdfRenderTimeout):
+                await hung
+            return path
+        finally:
+            await service.stop()
+
+    path = asyncio.run(scenario())
+    assert open(path, "rb").read(4) == b"%PDF"
+    assert (service.recycled, service.resubmitted, service.rendered) == (1, 1, 1)
+
+
+def test_exports_share_one_render_window(tmp_path, monkeypatch, plan_days):
+    """Test that concurrent exports share one render window and count against the bound"""
+    service = PdfRenderService(PdfCache(str(tmp_path)), workers=0, queue_size=0, timeout=60)
+    release = threading.Event()
+    active = []
+
+    def blocked_render(plan, days):
+        active.append(plan["id"])
+        release.wait(5)
+        return b"%PDF", 0.0, 0.0
+
+    monkeypatch.setattr(pdf_service, "_render_bytes", blocked_render)
+
+    async def scenario():
+        exports = [
+            asyncio.ensure_future(service.render_many([(dict(PLAN, id=plan_id), plan_days)] * 2))
+            for plan_id in (1, 2)
+        ]
+        while not active:
+            await asyncio.sleep(0.01)
+        stats = service.stats()
+        with pytest.raises(PdfRenderOverloaded):
+            await service.render(PLAN, plan_days, plan_content_hash(PLAN, plan_days))
+        release.set()
+        results = await asyncio.gather(*exports)
+        return stats, results
+
+    stats, results = asyncio.run(scenario())
+    assert (stats["exporting"], stats["export_waiting"], stats["running"]) == (1, 3, 1)
+    assert results == [[b"%PDF", b"%PDF"]] * 2
+    assert service.exported == 4 and service.rejected == 1 and service.stats()["running"] == 0
+
+
+def test_pdf_endpoint_etag_and_range(tmp_path, monkeypatch, session_factory, plan_days):
+    """Test that the PDF endpoint serves ETags, 304s and byte ranges to the plan owner only"""
+    with session_factory() as db:
+        user = User(name="pdf", email="pdf@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        plan = MealPlan(user_id=user.id, **{key: value for key, value in PLAN.items() if key != "id"})
+        db.add(plan)
+        db.flush()
+        for day in plan_days:
+            db.add(MealHistory(mealplan_id=plan.id, day_number=day["day"], meals_json=json.dumps(day)))
+        db.commit()
+        user_id, plan_id = user.id, plan.id
+
+    cache = PdfCache(str(tmp_path / "pdfs"))
+    monkeypatch.setattr(mealplan_router, "pdf_renderer", PdfRenderService(cache, workers=0))
+    app = FastAPI()
+    app.include_router(mealplan_router.router, prefix="/api")
+
+    def override_get_db():
+        with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: User(id=user_id)
+    client = TestClient(app)
+
+    response = client.get(f"/api/mealplan/{plan_id}/pdf")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    etag = response.headers["etag"]
+
+    assert client.get(f"/api/mealplan/{plan_id}/pdf", headers={"If-None-Match": etag}).status_code == 304
+    partial = client.get(f"/api/mealplan/{plan_id}/pdf", headers={"Range": "bytes=0-99", "If-Range": etag})
+    assert partial.status_code == 206
+    assert partial.content == response.content[:100]
+    assert mealplan_router.pdf_renderer.rendered == 1
+
+    async def broken_render(*args):
+        raise PdfRenderUnavailable("A PDF render worker died, please retry shortly")
+
+    monkeypatch.setattr(mealplan_router.pdf_renderer, "render", broken_render)
+    unavailable = client.get(f"/api/mealplan/{plan_id}/pdf")
+    assert unavailable.status_code == 503 and unavailable.headers["retry-after"] == "5"
+
+    app.dependency_overrides[get_current_user] = lambda: User(id=user_id + 1)
+    assert client.get(f"/api/mealplan/{plan_id}/pdf").status_code == 404
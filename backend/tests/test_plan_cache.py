@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from ai.plan_cache import PlanCache, normalize_plan_params, render_prompt, make_cache_key
+
+
+def test_normalize_plan_params_folds_equivalent_requests(make_request):
+    """Test that case, whitespace and nearby calorie values share a cache key"""
+    first = normalize_plan_params(make_request("Weight Loss", 1810, "Vegetarian"))
+    second = normalize_plan_params(make_request("  weight   loss ", 1790, "vegetarian"))
+
+    assert first == second
+    assert first["calories"] == 1800
+    assert make_cache_key(render_prompt(first), "gpt-4o-mini") == make_cache_key(render_prompt(second), "gpt-4o-mini")
+    assert make_cache_key(render_prompt(first), "gpt-4o-mini") != make_cache_key(render_prompt(first), "gpt-4o")
+
+
+def test_plan_cache_memory_and_disk_tiers(tmp_path):
+    """Test that plans are served from memory first and survive a new process via SQLite"""
+    path = str(tmp_path / "cache.db")
+    cache = PlanCache(path=path, ttl_seconds=60, max_entries=10, memory_entries=2)
+
+    assert cache.get("key") is None
+    cache.set("key", "[]", "gpt-4o-mini")
+    assert cache.get("key") == "[]"
+
+    fresh_cache = PlanCache(path=path, ttl_seconds=60, max_entries=10, memory_entries=2)
+    assert fresh_cache.get("key") == "[]"
+    assert fresh_cache.get("key") == "[]"
+
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert fresh_cache.stats()["disk_hits"] == 1
+    assert fresh_cache.stats()["memory_hits"] == 1
+
+
+def test_plan_cache_ttl_expiry(tmp_path):
+    """Test that expired plans are not returned"""
+    cache = PlanCache(path=str(tmp_path / "cache.db"), ttl_seconds=0, max_entries=10, memory_entries=2)
+    cache.set("key", "[]", "gpt-4o-mini")
+    time.sleep(0.01)
+
+    assert cache.get("key") is None
+
+
+def test_plan_cache_size_eviction(tmp_path):
+    """Test that the least recently used plans are evicted over the size limit"""
+    path = str(tmp_path / "cache.db")
+    cache = PlanCache(path=path, ttl_seconds=60, max_entries=2, memory_entries=1)
+    cache.set("a", "[1]", "gpt-4o-mini")
+    time.sleep(0.01)
+    cache.set("b", "[2]", "gpt-4o-mini")
+    time.sleep(0.01)
+    cache.set("c", "[3]", "gpt-4o-mini")
+
+    fresh_cache = PlanCache(path=path, ttl_seconds=60, max_entries=2, memory_entries=1)
+    assert fresh_cache.get("a") is None
+    assert fresh_cache.get("b") == "[2]"
+    assert fresh_cache.get("c") == "[3]"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_async_access_keeps_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    """Test that aget/aset serve memory hits inline and run the SQLite tier in a worker thread"""
+    path = str(tmp_path / "cache.db")
+    cache = PlanCache(path=path, ttl_seconds=60, max_entries=10, memory_entries=2)
+    disk_threads = []
+    for name in ("_get_disk", "_set_disk"):
+        original = getattr(cache, name)
+
+        def traced(*args, original=original):
+            disk_threads.append(threading.get_ident())
+            return original(*args)
+
+        monkeypatch.setattr(cache, name, traced)
+
+    async def scenario():
+        assert await cache.aget("key") is None
+        await cache.aset("key", "[]", "gpt-4o-mini")
+        assert await cache.aget("key") == "[]"
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert len(disk_threads) == 2 and loop_thread not in disk_threads
+    assert PlanCache(path=path, ttl_seconds=60, max_entries=10, memory_entries=2).get("key") == "[]"
+    assert (cache.stats()["misses"], cache.stats()["memory_hits"]) == (1, 1)
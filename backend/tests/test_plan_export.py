@@ -0,0 +1,75 @@
+import asyncio
+import io
+import json
+import zipfile
+from datetime import datetime
+
+from ai.pdf_generator import PdfCache
+from ai.pdf_service import PdfRenderService
+from ai.plan_export import fetch_plan_batch, stream_plan_export
+from database.models import MealPlan, MealHistory
+
+
+def seed_plans(session_factory, days, count=5):
+    with session_factory() as db:
+        for index in range(count):
+            plan = MealPlan(
+                user_id=1, goal="Maintenance", diet_type="omnivore", daily_calories=1800 + index,
+                macro_protein=30, macro_carbs=40, macro_fats=30, created_at=datetime(2026, 1, 1 + index)
+            )
+            db.add(plan)
+            db.flush()
+            for day in days[:2]:
+                db.add(MealHistory(mealplan_id=plan.id, day_number=day["day"], meals_json=json.dumps(day)))
+        # A legacy plan with the whole week in one row
+        db.add(MealHistory(mealplan_id=plan.id, day_number=3, meals_json=json.dumps(days[2:4])))
+        db.commit()
+
+
+def export(**kwargs) -> tuple:
+    async def collect():
+        return [chunk async for chunk in stream_plan_export(**kwargs)]
+
+    chunks = asyncio.run(collect())
+    return chunks, zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_keyset_batches(session_factory, plan_days):
+    """Test that plan batches page by id and filter by creation date"""
+    seed_plans(session_factory, plan_days)
+    with session_factory() as db:
+        first = fetch_plan_batch(db, limit=2)
+        second = fetch_plan_batch(db, after_id=first[-1][0]["id"], limit=10)
+        assert [plan["id"] for plan, _ in first + second] == [1, 2, 3, 4, 5]
+        assert [len(days) for _, days in first + second] == [2, 2, 2, 2, 4]
+        in_range = fetch_plan_batch(db, start=datetime(2026, 1, 2), end=datetime(2026, 1, 4))
+        assert [plan["id"] for plan, _ in in_range] == [2, 3]
+
+
+def test_json_export_streams_in_batches(session_factory, plan_days):
+    """Test that the JSON export streams one chunk per batch into a valid ZIP"""
+    seed_plans(session_factory, plan_days)
+    chunks, archive = export(session_factory=session_factory, batch_size=2)
+
+    # One chunk per batch of two plans, then the central directory
+    assert len(chunks) == 4
+    assert archive.testzip() is None
+    assert archive.namelist() == [f"plans/{plan_id}.json" for plan_id in range(1, 6)]
+    plan = json.loads(archive.read("plans/5.json"))
+    assert plan["daily_calories"] == 1804 and [day["day"] for day in plan["days"]] == [1, 2, 3, 4]
+    assert archive.getinfo("plans/1.json").date_time[:3] == (2026, 1, 1)
+
+    _, archive = export(session_factory=session_factory, batch_size=2, start=datetime(2026, 1, 4))
+    assert archive.namelist() == ["plans/4.json", "plans/5.json"]
+
+
+def test_pdf_export(tmp_path, session_factory, plan_days):
+    """Test that the PDF export renders every plan without filling the PDF cache"""
+    seed_plans(session_factory, plan_days, count=3)
+    renderer = PdfRenderService(PdfCache(str(tmp_path / "pdfs")), workers=0)
+    _, archive = export(session_factory=session_factory, fmt="pdf", batch_size=2, renderer=renderer)
+
+    assert archive.namelist() == [f"plans/{plan_id}.pdf" for plan_id in range(1, 4)]
+    assert all(archive.read(name).startswith(b"%PDF") for name in archive.namelist())
+    # Exports do not fill the interactive PDF cache
+    assert renderer.exported == 3 and not (tmp_path / "pdfs").exists()
@@ -0,0 +1,73 @@
+import json
+import re
+import pytest
+from ai.llm_backends import canned_completion
+from ai.plan_schema import DAY_JSON_SCHEMA, PlanValidationError, extract_days, parse_plan, parse_json_with_repair, day_total_calories, validate_day
+
+
+def make_plan_text(**kwargs):
+    return canned_completion("Daily Calories: 2000", **kwargs)
+
+
+def test_parse_plan_accepts_array_and_structured_output():
+    """Test that a bare array and the {"days": [...]} structured output parse the same"""
+    days = json.loads(make_plan_text())
+    wrapped = json.dumps({"days": days})
+
+    assert parse_plan(json.dumps(days)) == parse_plan(wrapped)
+    assert [day["day"] for day in parse_plan(wrapped)] == list(range(1, 8))
+    assert day_total_calories(days[0]) == 2000
+
+
+def test_repair_recovers_prose_and_truncated_output():
+    """Test that surrounding prose is ignored and a truncated tail only loses the last day"""
+    text = make_plan_text()
+    assert parse_json_with_repair(f"Here is your plan:\n{text}\nEnjoy!") == json.loads(text)
+
+    truncated = text[:text.rindex('"snacks"')]
+    days, problems = extract_days(truncated)
+    assert sorted(days) == [1, 2, 3, 4, 5, 6]
+    assert problems == ["entry 7: Day must have exactly 2 snacks", "missing days [7]"]
+
+
+def test_invalid_days_are_reported_not_returned():
+    """Test that malformed days are dropped and listed as problems"""
+    days = json.loads(make_plan_text())
+    days[2]["meals"] = days[2]["meals"][:1]
+    del days[5]
+
+    valid, problems = extract_days(json.dumps(days))
+    assert sorted(valid) == [1, 2, 4, 5, 7]
+    assert "missing days [3, 6]" in problems
+    with pytest.raises(PlanValidationError):
+        parse_plan(json.dumps(days))
+
+
+def test_validate_day_rejects_bad_shapes():
+    """Test that days with the wrong structure are rejected and valid ones canonicalized"""
+    day = json.loads(canned_completion("Create day 2 of a 7-day meal plan"))
+    assert validate_day(dict(day, extra="ignored")) == day
+    assert validate_day(dict(day, day=9), expected_day=4)["day"] == 4
+
+    bad_days = [
+        [day],
+        dict(day, meals=day["meals"][:2]),
+        dict(day, snacks=[]),
+        dict(day, meals=day["meals"][:2] + [{"name": "Tibs", "calories": "lots"}]),
+        dict(day, meals=day["meals"][:2] + [{"name": "Tibs", "calories": 300, "ingredients": "beef"}]),
+        dict(day, snacks=[{"name": "Banana", "calories": True}, day["snacks"][1]]),
+        dict(day, day=8),
+        dict(day, day="2"),
+    ]
+    for bad in bad_days:
+        with pytest.raises(PlanValidationError):
+            validate_day(bad)
+
+
+def test_structured_output_requires_gram_amounts():
+    """Test that the day schema only accepts ingredients and snacks that start with grams"""
+    meal = DAY_JSON_SCHEMA["properties"]["meals"]["items"]["properties"]
+    snack = DAY_JSON_SCHEMA["properties"]["snacks"]["items"]["properties"]
+    for pattern in (meal["ingredients"]["items"]["pattern"], snack["name"]["pattern"]):
+        assert re.match(pattern, "150 g lentils") and re.match(pattern, "12.5g olive oil")
+        assert not re.match(pattern, "lentils") and not re.match(pattern, "2 boiled eggs")
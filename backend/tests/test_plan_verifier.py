@@ -0,0 +1,123 @@
+import asyncio
+import copy
+import functools
+
+from sqlalchemy import select
+
+import ai.generator as generator
+from ai.food_search import FoodCatalog, load_food_records
+from ai.ingredient_resolver import IngredientResolver
+from ai.job_queue import _save_plan
+from ai.local_planner import LocalPlanner, load_food_csv
+from ai.plan_verifier import parse_grams, verify_plan
+from database.models import MealPlan, MealHistory
+
+PARAMS = {"goal": "maintain", "calories": 2000, "diet_type": "balanced", "protein": 30, "carbs": 40, "fats": 30}
+
+
+def make_fixtures(foods_csv):
+    catalog = FoodCatalog(*load_food_records(str(foods_csv)))
+    resolver = IngredientResolver(catalog, str(foods_csv.parent / "aliases.db"))
+    plan = LocalPlanner(*load_food_csv(str(foods_csv))).generate(PARAMS, seed=7)
+    return catalog, resolver, plan
+
+
+def oily_day(day):
+    """A day that claims 2000 kcal but is mostly olive oil"""
+    day = copy.deepcopy(day)
+    for meal in day["meals"]:
+        meal["ingredients"] = ["60 g Oil, olive", "20 g Rice, white, cooked"]
+    return day
+
+
+def test_parse_grams():
+    """Test that explicit amounts are converted to grams and counts are left unknown"""
+    assert parse_grams("150 g Lentils, cooked") == 150
+    assert parse_grams("Rice (1.5 cups)") == 360
+    assert parse_grams("2 tbsp olive oil") == 30
+    assert parse_grams("2 boiled eggs") != parse_grams("2 boiled eggs")  # NaN
+
+
+def test_optimizer_plans_verify_within_tolerance(foods_csv):
+    """Test that measured plans from the local planner match their targets"""
+    catalog, resolver, plan = make_fixtures(foods_csv)
+
+    verification = verify_plan(plan, PARAMS, catalog, resolver)
+
+    assert verification.offending_days == []
+    assert all(day.coverage == 1.0 and abs(day.calories - 2000) < 20 for day in verification.days)
+    assert all(day.calorie_coverage == 1.0 and day.calorie_deviation is not None for day in verification.days)
+    assert verification.deviation < 0.1
+
+
+def test_off_target_and_unverifiable_days(foods_csv):
+    """Test that a wrong macro split is flagged and unresolvable days are not judged"""
+    catalog, resolver, plan = make_fixtures(foods_csv)
+    unknown = copy.deepcopy(plan[1])
+    for entry in unknown["meals"] + unknown["snacks"]:
+        entry["ingredients"] = ["mystery stew"]
+        entry["name"] = "Mystery"
+
+    verification = verify_plan([oily_day(plan[0]), unknown], PARAMS, catalog, resolver)
+
+    oily, mystery = verification.days
+    assert not oily.within_tolerance and oily.macro_deviation > 0.3
+    assert mystery.within_tolerance and mystery.deviation is None and mystery.coverage == 0
+    assert verification.offending_days == [1]
+
+
+def test_unmeasured_calories_are_not_judged(foods_csv):
+    """Test that on-target calories stated for ingredients without amounts are not taken as verified"""
+    catalog, resolver, plan = make_fixtures(foods_csv)
+    # Without amounts, any portion size fits the stated calories
+    unmeasured = copy.deepcopy(plan[0])
+    for meal in unmeasured["meals"]:
+        meal["ingredients"] = [item.split(" g ", 1)[1] for item in meal["ingredients"]]
+    for snack in unmeasured["snacks"]:
+        snack["name"] = snack["name"].split(" g ", 1)[1]
+
+    day = verify_plan([unmeasured], PARAMS, catalog, resolver).days[0]
+
+    assert day.coverage == 1.0 and day.calorie_coverage == 0
+    assert day.calorie_deviation is None
+    assert day.deviation == day.macro_deviation
+
+
+def test_only_offending_days_are_regenerated(foods_csv, monkeypatch):
+    """Test that off-target days are regenerated and replaced when closer to the targets"""
+    catalog, resolver, plan = make_fixtures(foods_csv)
+    days = {day["day"]: day for day in plan}
+    days[3] = oily_day(days[3])
+    requested = []
+
+    async def fake_complete_day(params, day, model):
+        requested.append(day)
+        return plan[day - 1]
+
+    monkeypatch.setattr(generator, "verify_plan", functools.partial(verify_plan, catalog=catalog, resolver=resolver))
+    monkeypatch.setattr(generator, "_complete_day", fake_complete_day)
+
+    repaired, verification = asyncio.run(generator._verify_days(PARAMS, "model", days))
+
+    assert requested == [3]
+    assert repaired[3] == plan[2]
+    assert all(repaired[day] is days[day] for day in days if day != 3)
+    # The returned verification describes the repaired days, so callers need not verify again
+    assert verification.offending_days == []
+    assert verification == verify_plan([repaired[day] for day in sorted(repaired)], PARAMS, catalog, resolver)
+
+
+def test_deviation_is_stored_with_the_plan(foods_csv, session_factory, make_request):
+    """Test that plan and day rows carry the verification results"""
+    catalog, resolver, plan = make_fixtures(foods_csv)
+    verification = verify_plan(plan, PARAMS, catalog, resolver)
+
+    with session_factory() as db:
+        mealplan_id = _save_plan(db, 1, make_request("maintain"), plan, verification)
+        db.commit()
+        saved = db.get(MealPlan, mealplan_id)
+        history = db.execute(select(MealHistory).order_by(MealHistory.day_number)).scalars().all()
+
+        assert saved.deviation == verification.deviation
+        assert [row.verified_calories for row in history] == [round(day.calories) for day in verification.days]
+        assert history[0].deviation == verification.days[0].deviation
@@ -0,0 +1,43 @@
+import asyncio
+from ai.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    """Test that identical concurrent calls are coalesced onto one call"""
+    flight = SingleFlight()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "plan"
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("same-key", generate) for _ in range(5)])
+
+    results = asyncio.run(scenario())
+    assert results == ["plan"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_failures_propagate_and_are_not_remembered():
+    """Test that every waiter sees the failure and the next call retries"""
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def succeeding():
+        return "plan"
+
+    async def scenario():
+        results = await asyncio.gather(
+            flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        return await flight.do("key", succeeding)
+
+    assert asyncio.run(scenario()) == "plan"
+    assert flight.stats()["leaders"] == 2
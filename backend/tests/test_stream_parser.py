@@ -0,0 +1,121 @@
+import json
+from ai.stream_parser import DayStreamParser
+
+
+PLAN = [
+    {
+        "day": day,
+        "meals": [{"name": "Shiro {wat}", "calories": 450, "ingredients": ['chickpea "flour" \\ mix', "berbere"]}],
+        "snacks": [{"name": "Roasted [kolo]", "calories": 150}],
+        "total_calories": 1800
+    }
+    for day in range(1, 8)
+]
+
+
+def test_parser_emits_each_day_once_complete():
+    """Test that days are emitted as soon as their closing brace arrives"""
+    text = "```json\n" + json.dumps(PLAN, indent=2) + "\n```"
+    first_day_end = text.index("\n  }") + 4
+
+    parser = DayStreamParser()
+    assert parser.feed(text[:first_day_end - 1]) == []
+    assert parser.feed(text[first_day_end - 1:first_day_end]) == [PLAN[0]]
+    assert parser.feed(text[first_day_end:]) == PLAN[1:]
+
+
+def test_parser_handles_token_sized_chunks():
+    """Test that splitting the completion into tiny chunks yields the same days"""
+    text = json.dumps(PLAN)
+    parser = DayStreamParser()
+    days = []
+    for i in range(0, len(text), 3):
+        days.extend(parser.feed(text[i:i + 3]))
+
+    assert days == PLAN
+
+
+def test_parser_skips_malformed_days():
+    """Test that a day object that does not decode is skipped and counted"""
+    text = json.dumps(PLAN[:2])
+    broken = text.replace('"total_calories": 1800}', '"total_calories": 1800,}', 1)
+    parser = DayStreamParser()
+    days = []
+    for i in range(0, len(broken), 5):
+        days.extend(parser.feed(broken[i:i + 5]))
+
+    assert days == [PLAN[1]]
+    assert parser.malformed == 1
+
+
+def test_stream_regenerates_malformed_day(monkeypatch, make_request):
+    """Test that a malformed day mid-stream is regenerated instead of failing the stream"""
+    import asyncio
+    from ai import generator
+    from ai.circuit_breaker import CircuitBreaker
+    from ai.llm_backends import FakeBackend, FakeCompletionModel, canned_completion
+
+    class BrokenStreamBackend(FakeBackend):
+        async def stream(self, prompt, model, response_format=None, usage=None):
+            content = canned_completion(prompt, self.model.rng)
+            # Trailing comma at the end of day 3
+            end = content.index('{"day": 4') - 3
+            content = content[:end] + "," + content[end:]
+            for i in range(0, len(content), 7):
+                yield content[i:i + 7]
+
+    backend = BrokenStreamBackend(FakeCompletionModel(latency="fixed:0", tokens_per_second=0, error_rate=0.0))
+    monkeypatch.setattr(generator, "get_backend", lambda: backend)
+    monkeypatch.setattr(generator, "llm_breaker", CircuitBreaker())
+    monkeypatch.setattr(generator.settings, "PLAN_CACHE_ENABLED", False)
+    monkeypatch.setattr(generator.settings, "HEDGE_ENABLED", False)
+
+    async def collect():
+        return [day async for day in generator.stream_meal_plan(make_request("Stream repair"))]
+
+    invalid_before = generator.get_generation_stats()["validation"]["invalid_stream_days"]
+    days = asyncio.run(collect())
+    assert [day["day"] for day in days] == [1, 2, 4, 5, 6, 7, 3]
+    assert generator.get_generation_stats()["validation"]["invalid_stream_days"] == invalid_before + 1
+
+
+def test_stream_endpoint_discards_unfinished_plan(monkeypatch, session_factory, make_request):
+    """Test that a client leaving mid-stream removes the plan and its partial days"""
+    import asyncio
+    import time
+    import routers.mealplan as mealplan_router
+    from database.models import MealHistory, MealPlan, User
+
+    async def two_days(request):
+        for day in PLAN:
+            yield day
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(mealplan_router, "stream_meal_plan", two_days)
+    monkeypatch.setattr(mealplan_router, "SessionLocal", session_factory)
+
+    def count_rows():
+        with session_factory() as db:
+            return db.query(MealPlan).count(), db.query(MealHistory).count()
+
+    async def scenario():
+        with session_factory() as db:
+            user = User(name="stream", email="stream@example.com", password_hash="x")
+            db.add(user)
+            db.commit()
+            response = await mealplan_router.stream_meal_plan_days(make_request("maintain"), user, db)
+            events = response.body_iterator
+            received = [await events.__anext__() for _ in range(1 + len(PLAN))]
+            during = count_rows()
+            # The client disconnects before "done"
+            await events.aclose()
+        return received, during
+
+    received, during = asyncio.run(scenario())
+    assert [event.split("\n")[0] for event in received] == ["event: plan"] + ["event: day"] * len(PLAN)
+    assert during == (1, len(PLAN))
+    for _ in range(200):
+        if count_rows() == (0, 0):
+            break
+        time.sleep(0.01)
+    assert count_rows() == (0, 0)
@@ -0,0 +1,62 @@
+import asyncio
+import json
+from sqlalchemy import select, func
+from database.models import MealPlan, WarmPlan
+import ai.warm_pool as warm_pool_module
+from ai.warm_pool import WarmPool, popular_params
+from ai.llm_backends import canned_completion
+
+
+def seed_plans(session_factory):
+    with session_factory() as db:
+        # "Lose Weight " and "lose weight" normalize to the same prompt
+        for goal, count in [("lose weight", 3), ("Lose Weight ", 2), ("gain muscle", 4), ("maintain", 1)]:
+            for _ in range(count):
+                db.add(MealPlan(
+                    user_id=1, goal=goal, diet_type="balanced", daily_calories=2000,
+                    macro_protein=30, macro_carbs=40, macro_fats=30
+                ))
+        db.commit()
+
+
+def test_popular_params_merges_equivalent_requests(session_factory):
+    """Test that mining groups requests by their normalized parameters"""
+    seed_plans(session_factory)
+    with session_factory() as db:
+        popular = popular_params(db, 2)
+    assert [params["goal"] for params in popular] == ["lose weight", "gain muscle"]
+
+
+def test_pool_serves_distinct_variants_and_replenishes(monkeypatch, session_factory, make_request):
+    """Test that pre-generated variants are claimed once each and topped back up"""
+    seed_plans(session_factory)
+    generated = []
+
+    async def fake_variant(params):
+        generated.append(params["goal"])
+        return canned_completion(f"Daily Calories: {params['calories']}")
+
+    monkeypatch.setattr(warm_pool_module, "generate_plan_variant", fake_variant)
+    pool = WarmPool(session_factory=session_factory, variants=2, top_n=2, concurrency=2)
+
+    async def scenario():
+        summary = await pool.pregenerate()
+        with session_factory() as db:
+            first = pool.take(db, make_request("LOSE weight"))
+            second = pool.take(db, make_request("lose weight"))
+            third = pool.take(db, make_request("lose weight"))
+            missing = pool.take(db, make_request("maintain"))
+        await pool.drain()
+        return summary, first, second, third, missing
+
+    summary, first, second, third, missing = asyncio.run(scenario())
+
+    assert summary["combinations"] == 2
+    assert summary["generated"] == 4
+    assert first and second and first != second
+    assert len(json.loads(first)) == 7
+    assert third is None and missing is None
+    with session_factory() as db:
+        assert db.execute(select(func.count()).select_from(WarmPlan)).scalar() == 4
+    assert generated.count("lose weight") == 4
+    assert pool.stats()["hits"] == 2